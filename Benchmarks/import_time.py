@@ -0,0 +1,57 @@
+'''
+Measures how long `from PLL_Lib import Picoscope` takes, not counting numpy which any use of PLL_Lib needs, and checks
+that it stays within import_budget_ms and imports none of the modules which should only be loaded when used.
+Run from the repository root with: python Benchmarks/import_time.py
+Exits with status 1 if the import is over budget or imports something it should not.
+'''
+import os
+import subprocess
+import sys
+
+import_budget_ms = 25
+runs = 7
+statement = 'from PLL_Lib import Picoscope'
+# Modules which importing PLL_Lib should not load, as only the display, the Arduino, archives or a connected scope
+# need them
+forbidden_modules = ('pyglet', 'serial', 'importlib.metadata', 'PLL_Lib.display', 'PLL_Lib.arduino', 'PLL_Lib.archive')
+
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def measure_import_time():
+    '''
+    Import PLL_Lib once in a new interpreter, after numpy.
+    :return: The total import time in ms of every module imported after numpy, and the names of those modules.
+    '''
+    code = (f'import numpy, sys; {statement}; import PLL_Lib.ps2000 as p; '
+            f'print(int(p.ps2000.loaded)); print(*sys.modules)')
+    env = dict(os.environ, PYTHONPATH=src_dir + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, capture_output=True,
+                            text=True, check=True)
+    lines = result.stderr.splitlines()
+    after_numpy = lines[next(i for i, line in enumerate(lines) if line.endswith('| numpy')) + 1:]
+    total_us = sum(int(line.split('|')[0].split(':')[1]) for line in after_numpy if line.startswith('import time:'))
+    loaded, modules = result.stdout.splitlines()
+    return total_us / 1e3, modules.split(), loaded == '1'
+
+
+def main():
+    times = []
+    for _ in range(runs):
+        ms, modules, driver_loaded = measure_import_time()
+        times.append(ms)
+    median = sorted(times)[len(times) // 2]
+    imported = [name for name in forbidden_modules if any(m == name or m.startswith(name + '.') for m in modules)]
+    print(f'{statement}: median {median:.1f}ms over {runs} runs (budget {import_budget_ms}ms), not counting numpy')
+    ok = median <= import_budget_ms
+    if not ok:
+        print('Over budget!')
+    if imported:
+        print(f'Imported modules which should be lazy: {", ".join(imported)}')
+    if driver_loaded:
+        print('The ps2000 driver was loaded on import')
+    return 0 if ok and not imported and not driver_loaded else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+'''
+Benchmarks of the parts of PLL_Lib where speed matters, run against the simulated picoscope and an offscreen window,
+so no hardware is needed. Run from the repository root with:
+    python Benchmarks/run_benchmarks.py [--output results.json] [--baseline baseline.json] [--tolerance 0.2]
+The results are written as JSON. If a baseline from an earlier run is given, each result is compared with it, and the
+exit status is 1 if any is worse by more than the tolerance, a fraction of the baseline.
+Use --only to run some of the benchmarks: captures, conversion, display, arduino, analysis and import.
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+# Without a screen, such as on a CI machine, pyglet draws to an offscreen surface
+if sys.platform != 'win32' and not os.environ.get('DISPLAY'):
+    import pyglet
+    pyglet.options['headless'] = True
+import numpy as np
+import PLL_Lib
+from PLL_Lib import Picoscope, SimulatedPs2000, Trace
+import import_time
+
+timebases = ('1micro_s', '5micro_s', '20micro_s')
+captures = 200
+conversion_samples = 8000
+conversion_repeats = 2000
+frame_sample_counts = (1000, 8000, 32000, 128000)
+frames = 100
+arduino_codes = 20000
+arduino_batch = 256
+analysis_traces = 512
+default_tolerance = 0.2
+
+
+def per_call(function, repeats, warmup=5):
+    '''
+    :return: The median time in seconds of repeats calls of function, after some calls to warm up.
+    '''
+    for _ in range(warmup):
+        function()
+    times = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter_ns()
+        function()
+        times[i] = time.perf_counter_ns() - start
+    return float(np.median(times)) * 1e-9
+
+
+def bench_captures(results):
+    for timebase in timebases:
+        backend = SimulatedPs2000(realtime=False, seed=0)
+        with Picoscope(time_per_sample=timebase, show_display=False, backend=backend) as scope:
+            results[f'get_trace_per_second_{timebase}'] = (1 / per_call(scope.get_trace, captures), 'captures/s', True)
+            start = time.perf_counter()
+            scope.get_traces(captures)
+            results[f'get_traces_per_second_{timebase}'] = (captures / (time.perf_counter() - start), 'captures/s', True)
+            stats = scope.stats()['phases']
+            # Time spent in PLL_Lib itself for each capture, rather than in the simulated driver
+            results[f'capture_overhead_{timebase}'] = (
+                sum(stats[phase]['p50_us'] for phase in ('ping', 'convert') if phase in stats), 'μs', False)
+
+
+def bench_conversion(results):
+    raw = np.random.default_rng(0).integers(-32767, 32767, conversion_samples, dtype=np.int16)
+    raw_times = np.arange(conversion_samples, dtype=np.int32)
+    out = np.empty(conversion_samples), np.empty(conversion_samples)
+
+    def convert(dtype):
+        def function():
+            trace = Trace(raw, raw, 1e-4, raw_times, 1e-9, dtype=dtype)
+            return trace.volts_a, trace.volts_b
+        return function
+
+    def convert_into():
+        Trace(raw, raw, 1e-4, raw_times, 1e-9).convert_into(*out)
+
+    for name, function in (('float64', convert(np.float64)), ('float32', convert(np.float32)),
+                           ('convert_into', convert_into)):
+        ns = per_call(function, conversion_repeats) * 1e9 / (2 * conversion_samples)
+        results[f'conversion_{name}'] = (ns, 'ns/sample', False)
+
+
+def bench_display(results):
+    import pyglet
+    from PLL_Lib.display import _ScopeWindow, ScopeDisplay
+    for n in frame_sample_counts:
+        times = np.linspace(0, 0.04, n)
+        volts_a, volts_b = np.sin(times * 1e3), np.cos(times * 1e3)
+
+        class Owner:
+            def key_pressed(self, symbol):
+                pass
+
+        window = _ScopeWindow(Owner(), -1, 1, 0, 0.04, '5micro_s', n, 1, None, 0)
+        window.window.on_resize(window.window.width, window.window.height)
+
+        def frame():
+            window.set_trace(times, volts_a, volts_b, False)
+            window.redraw()
+            pyglet.gl.glFinish()
+
+        results[f'frame_time_{n}_samples'] = (per_call(frame, frames) * 1e3, 'ms', False)
+        window.close()
+
+        display = ScopeDisplay(-1, 1, 0, 0.04, '5micro_s', n, 1, None, 0)
+        update = lambda: display.update(times, volts_a, volts_b, 0.01, False)
+        results[f'display_update_{n}_samples'] = (per_call(update, frames) * 1e6, 'μs', False)
+        display.close()
+
+
+def bench_arduino(results):
+    from PLL_Lib import Arduino
+    # The loop:// stand in only holds a few kB until it is read, so is emptied after every batch of codes
+    with Arduino('loop://', timeout=0) as arduino:
+        start = time.perf_counter()
+        for code in range(arduino_codes):
+            arduino.send_code(code)
+            if code % arduino_batch == arduino_batch - 1:
+                arduino.arduino.reset_input_buffer()
+        results['arduino_send_code_per_second'] = (arduino_codes / (time.perf_counter() - start), 'codes/s', True)
+        start = time.perf_counter()
+        for code in range(arduino_codes):
+            arduino.send_code(code)
+            arduino.readline()
+        results['arduino_round_trips_per_second'] = (arduino_codes / (time.perf_counter() - start), 'codes/s', True)
+
+
+def bench_analysis(results):
+    from PLL_Lib.analysis import analyse_lock
+    from PLL_Lib.edges import measure_edges
+    with Picoscope(show_display=False, backend=SimulatedPs2000(realtime=False, seed=0)) as scope:
+        batch = scope.get_traces(64, raw=True)
+    repeats = analysis_traces // len(batch.voltages_a)
+    volts_a, volts_b = np.tile(batch.voltages_a, (repeats, 1)), np.tile(batch.voltages_b, (repeats, 1))
+    sample_interval = batch.times[1] - batch.times[0]
+    for method in ('analytic', 'crossings'):
+        seconds = per_call(lambda: analyse_lock(volts_a, volts_b, sample_interval, method), 3, warmup=1)
+        results[f'analyse_lock_{method}_per_second'] = (len(volts_a) / seconds, 'traces/s', True)
+    seconds = per_call(lambda: measure_edges(volts_b, sample_interval), 3, warmup=1)
+    results['measure_edges_per_second'] = (len(volts_b) / seconds, 'traces/s', True)
+    # A single trace at a time, as when measuring each trace from get_trace as it is captured
+    results['measure_edges_single_trace'] = (per_call(lambda: measure_edges(volts_b[0], sample_interval), 50) * 1e6,
+                                             'μs', False)
+
+
+def bench_import(results):
+    times = sorted(import_time.measure_import_time()[0] for _ in range(import_time.runs))
+    results['import_time'] = (times[len(times) // 2], 'ms', False)
+
+
+benchmarks = {
+    'captures': bench_captures,
+    'conversion': bench_conversion,
+    'display': bench_display,
+    'arduino': bench_arduino,
+    'analysis': bench_analysis,
+    'import': bench_import,
+}
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Print each result next to its baseline.
+    :return: The names of the results worse than the baseline by more than the tolerance.
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['value'], result['value']
+        change = (new - old) / old if old else 0.0
+        worse = -change if result['higher_is_better'] else change
+        flag = ''
+        if worse > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:40} {old:12.4g} -> {new:12.4g} {result["unit"]:10} {change:+7.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='benchmark_results.json', help='The file to write the results to.')
+    parser.add_argument('--baseline', help='A results file from an earlier run to compare with.')
+    parser.add_argument('--tolerance', type=float, default=default_tolerance,
+                        help='The fraction by which a result can be worse than the baseline. Default is 0.2.')
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks), help='The benchmarks to run. Default is all.')
+    args = parser.parse_args()
+
+    measured = {}
+    for name in args.only or benchmarks:
+        print(f'Running {name} benchmarks...')
+        try:
+            benchmarks[name](measured)
+        except Exception as e:
+            # For example when there is no way to open a window, the other benchmarks are still run
+            print(f'Skipped {name} benchmarks: {type(e).__name__}: {e}')
+    results = {name: {'value': value, 'unit': unit, 'higher_is_better': higher}
+               for name, (value, unit, higher) in measured.items()}
+    output = {
+        'metadata': {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'PLL_Lib': PLL_Lib.package_version(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.baseline is None:
+        for name, result in results.items():
+            print(f'{name:40} {result["value"]:12.4g} {result["unit"]}')
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f)['results'], args.tolerance)
+    if regressions:
+        print(f'{len(regressions)} results are more than {args.tolerance:.0%} worse than the baseline.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
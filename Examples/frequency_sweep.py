@@ -0,0 +1,17 @@
+import numpy as np
+from PLL_Lib import Picoscope, measure_edges
+
+# Measure how the VCO on channel B follows the signal generator on channel A from 500 Hz to 5 kHz, in a single sweep
+# run by the signal generator itself rather than setting each frequency in turn
+with Picoscope(show_display=False) as scope:
+    sweep = scope.set_signal_generator_sweep(500, 5000, 250, 0.5, sweeps=1)
+    batch = scope.get_traces(int(sweep.sweep_time / scope.capture_duration))
+    # The frequency of the generator during each trace, NaN for traces taken as it changed frequency
+    frequencies = scope.sweep_frequencies(batch.timestamps, margin=0.005)
+    # After the sweep the generator returns to its first frequency, so leave out the traces taken after it
+    frequencies[batch.timestamps > sweep.end_time] = np.nan
+
+vco_frequencies = measure_edges(batch.voltages_b, batch.times[1] - batch.times[0]).frequency
+for frequency in sweep.frequencies:
+    traces = frequencies == frequency
+    print(f'{frequency:.0f} Hz: VCO at {np.nanmean(vco_frequencies[traces]):.1f} Hz over {traces.sum()} traces')
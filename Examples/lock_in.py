@@ -0,0 +1,14 @@
+from PLL_Lib import Picoscope, LockIn
+
+# Measure the part of channel B at the frequency of the reference on channel A, however noisy channel B is
+sample_interval = 1e-5
+lock_in = LockIn(sample_interval, time_constant=0.1)
+
+with Picoscope(show_display=False) as scope:
+    for times, volts_a, volts_b in scope.stream(sample_interval, 10000):
+        # Channel A is used as the reference, so its frequency need not be known
+        lock_in.update(volts_b, reference=volts_a)
+        if lock_in.settled:
+            break
+
+print(f'Amplitude {lock_in.amplitude:.4f} V, leading the reference by {lock_in.phase:.3f} radians')
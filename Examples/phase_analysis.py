@@ -0,0 +1,16 @@
+from PLL_Lib import Picoscope, analyse_lock
+from matplotlib import pyplot as plt
+
+N = 1000
+
+with Picoscope(time_per_sample='5micro_s', trigger_channel='a', show_display=False) as scope:
+    # Raw ADC counts are enough to measure phases, and use a quarter of the memory of voltages
+    batch = scope.get_traces(N, raw=True)
+
+# The reference on channel A and the VCO on channel B are compared in every trace at once
+lock = analyse_lock(batch.voltages_a, batch.voltages_b, batch.times[1] - batch.times[0])
+print(f'VCO frequency {lock.frequency_b.mean():.2f} Hz, lock quality {lock.lock_quality.mean():.3f}')
+
+plt.plot(batch.timestamps - batch.timestamps[0], lock.phase_difference)
+plt.xlabel('Time/s'), plt.ylabel('Phase of reference ahead of VCO/rad')
+plt.show()
@@ -0,0 +1,16 @@
+from PLL_Lib import Picoscope
+from matplotlib import pyplot as plt
+
+# The number of traces to average. Only their running mean, spread, minimum and maximum are kept, so this can be
+# as large as you like without running out of memory.
+N = 100000
+
+with Picoscope(time_per_sample='1micro_s', probe_10x=True, trigger_channel='a') as scope:
+    scope.wait_for_key('s', 'Press to start averaging')
+    averages = scope.accumulate(N)
+
+plt.plot(averages.times, averages.mean('b'), label='Mean')
+plt.fill_between(averages.times, averages.min('b'), averages.max('b'), alpha=0.3, label='Min to max')
+plt.xlabel('Times/s'), plt.ylabel('B Voltage/V')
+plt.legend()
+plt.show()
@@ -0,0 +1,25 @@
+from PLL_Lib import Picoscope, Arduino, Dataset
+import matplotlib.pyplot as plt
+
+# The codes to send to the arduino, and the number of traces to record for each
+codes = [0, 100, 200]
+N = 500
+
+with Picoscope(time_per_sample='1micro_s', probe_10x=True, trigger_channel='a') as scope, Arduino() as arduino:
+    for code in codes:
+        arduino.send_code(code)
+        # The code is saved with each trace, so the traces can be selected by it later
+        scope.record(f'Sweep_{code}.npy', N, code=code)
+
+# Open all the recordings together. The traces are only read from the hard drive when they are used.
+dataset = Dataset('Sweep_*.npy')
+for code in dataset.code_values:
+    traces = dataset.select(code=code)
+    # The mean and spread are worked out a few hundred traces at a time, so need little memory
+    mean_b, std_b = traces.mean('b'), traces.std('b')
+    plt.plot(dataset.times, mean_b, label=f'Code {code}')
+    plt.fill_between(dataset.times, mean_b - std_b, mean_b + std_b, alpha=0.3)
+plt.xlabel('Time (s)')
+plt.ylabel('Channel B (V)')
+plt.legend()
+plt.show()
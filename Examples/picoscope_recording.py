@@ -0,0 +1,20 @@
+from PLL_Lib import Picoscope, Dataset, load_recording
+
+# The number of traces to save
+N = 1000
+
+with Picoscope(time_per_sample='1micro_s', probe_10x=True, trigger_channel='a') as scope:
+    scope.wait_for_key('s', 'Press to start experiment')
+    # Each trace is written to the hard drive as soon as it is captured, so the traces captured so far are kept
+    # even if the program stops early, and recordings can be much larger than the computer's memory.
+    # Be sure to change the name if you run an experiment twice, or it will overwrite the existing recording!
+    scope.record('Recording.npy', N)
+
+# Open the recording, which can also be done while it is still being made, for example in another program
+recording = load_recording('Recording.npy')
+print(f'{len(recording)} traces were recorded.')
+# Each trace unpacks in the same way as those from get_trace
+times, voltages_a, voltages_b = recording[0]
+# Averages over the whole recording are calculated a few hundred traces at a time, so only those are ever in memory
+dataset = Dataset('Recording.npy')
+mean_a, std_a = dataset.mean('a'), dataset.std('a')
@@ -1,3 +1,56 @@
-from .picoscope import Picoscope
-from .arduino import Arduino
-__version__ = '0.0.11'
\ No newline at end of file
+__version__ = '0.0.11'
+
+# The classes are only imported when first used, so that for example using Picoscope without a display never
+# imports pyglet, and using the Picoscope never imports pyserial
+_lazy_imports = {
+    'Picoscope': 'picoscope',
+    'TraceBatch': 'picoscope',
+    'Arduino': 'arduino',
+    'Trace': 'trace',
+    'AsyncPicoscope': 'asynchronous',
+    'AsyncArduino': 'asynchronous',
+    'SimulatedPs2000': 'simulator',
+    'Recording': 'recording',
+    'load_recording': 'recording',
+    'ArchiveWriter': 'archive',
+    'ArchiveReader': 'archive',
+    'Dataset': 'dataset',
+    'TraceAccumulator': 'accumulator',
+    'analyse_lock': 'analysis',
+    'measure_edges': 'edges',
+    'LockIn': 'lockin',
+    'Spectrum': 'spectrum',
+    'get_spectrum': 'spectrum',
+    'SweepSchedule': 'sweep',
+}
+
+__all__ = list(_lazy_imports)
+
+_package_version = None
+
+
+def __getattr__(name):
+    if name not in _lazy_imports:
+        raise AttributeError(f"module 'PLL_Lib' has no attribute '{name}'")
+    import importlib
+    value = getattr(importlib.import_module(f'PLL_Lib.{_lazy_imports[name]}'), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_imports))
+
+
+def package_version():
+    '''
+    :return: The installed version of PLL_Lib, which is only looked up the first time it is needed as this is slow.
+    '''
+    global _package_version
+    if _package_version is None:
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            _package_version = version('PLL_Lib')
+        except PackageNotFoundError:
+            _package_version = __version__
+    return _package_version
@@ -0,0 +1,134 @@
+import threading
+import numpy as np
+
+channel_indices = {'a': 0, 'b': 1}
+
+
+class TraceAccumulator:
+    def __init__(self, samples, volts_per_adc, times=None, channels=2):
+        '''
+        The pointwise mean, variance, minimum and maximum of every trace added, using the memory of a few traces however
+        many are added. The mean and variance are updated with Welford's method, which stays accurate over millions of
+        traces, and the minimum and maximum are kept as raw ADC counts. The results can be read at any time, including
+        from another thread while traces are being added.
+        Normally created by Picoscope.accumulate rather than directly.
+        :param samples: The number of samples in each trace.
+        :param volts_per_adc: The factor converting raw ADC counts to volts.
+        :param times: (Optional) The sample times in seconds.
+        :param channels: The number of channels in each trace. Default is 2.
+        '''
+        self.samples, self.channels = samples, channels
+        self.volts_per_adc, self.times = volts_per_adc, times
+        self._lock = threading.Lock()
+        # Scratch space for the updates, so adding a trace allocates nothing
+        self._delta = np.empty((channels, samples))
+        self._scratch = np.empty((channels, samples))
+        self.reset()
+
+    def reset(self):
+        '''
+        Forget every trace added so far.
+        '''
+        with self._lock:
+            self.count = 0
+            self.overflow_count = 0
+            # The mean and the sum of squared differences from it, in ADC counts
+            self._mean = np.zeros((self.channels, self.samples))
+            self._m2 = np.zeros((self.channels, self.samples))
+            self._min = np.full((self.channels, self.samples), np.iinfo(np.int16).max, dtype=np.int16)
+            self._max = np.full((self.channels, self.samples), np.iinfo(np.int16).min, dtype=np.int16)
+
+    def add(self, *channels, overflow=False):
+        '''
+        Add a trace.
+        :param channels: An int16 array of the raw ADC counts of each channel, such as trace.raw_a, trace.raw_b.
+        :param overflow: Whether the trace went outside the voltage range.
+        '''
+        with self._lock:
+            self.count += 1
+            self.overflow_count += bool(overflow)
+            for channel, raw in enumerate(channels):
+                mean, d, scratch = self._mean[channel], self._delta[channel], self._scratch[channel]
+                np.subtract(raw, mean, out=d)
+                mean += np.divide(d, self.count, out=scratch)
+                # m2 += (x - old mean) * (x - new mean)
+                d *= np.subtract(raw, mean, out=scratch)
+                self._m2[channel] += d
+                np.minimum(self._min[channel], raw, out=self._min[channel])
+                np.maximum(self._max[channel], raw, out=self._max[channel])
+
+    def add_trace(self, trace):
+        '''
+        Add a Trace, such as one returned by Picoscope.get_trace.
+        '''
+        self.add(trace.raw_a, trace.raw_b, overflow=trace.overflow)
+
+    def add_batch(self, *channels, overflow=None):
+        '''
+        Add many traces at once, such as those from Picoscope.get_traces(n, raw=True).
+        :param channels: An int16 array of shape (traces, samples) for each channel.
+        :param overflow: (Optional) Whether each trace went outside the voltage range.
+        '''
+        n = len(channels[0])
+        if n == 0:
+            return
+        with self._lock:
+            total = self.count + n
+            for channel, raw in enumerate(channels):
+                # The mean and m2 of the batch are combined with those so far (Chan et al.'s parallel update)
+                batch_mean = self._scratch[channel]
+                raw.mean(axis=0, out=batch_mean)
+                batch_m2 = np.square(raw - batch_mean).sum(axis=0)
+                delta = np.subtract(batch_mean, self._mean[channel], out=self._delta[channel])
+                self._m2[channel] += batch_m2 + delta ** 2 * (self.count * n / total)
+                self._mean[channel] += delta * (n / total)
+                np.minimum(self._min[channel], raw.min(axis=0), out=self._min[channel])
+                np.maximum(self._max[channel], raw.max(axis=0), out=self._max[channel])
+            self.count = total
+            if overflow is not None:
+                self.overflow_count += int(np.count_nonzero(overflow))
+
+    def _channel(self, channel):
+        return channel_indices[channel.lower()] if isinstance(channel, str) else channel
+
+    def mean(self, channel):
+        '''
+        :param channel: 'a' or 'b'.
+        :return: The mean voltage of the traces at each sample time.
+        '''
+        with self._lock:
+            return self._mean[self._channel(channel)] * self.volts_per_adc
+
+    def variance(self, channel):
+        '''
+        :param channel: 'a' or 'b'.
+        :return: The variance of the voltages of the traces at each sample time, or NaN if fewer than two have been added.
+        '''
+        with self._lock:
+            if self.count < 2:
+                return np.full(self.samples, np.nan)
+            return self._m2[self._channel(channel)] * (self.volts_per_adc ** 2 / (self.count - 1))
+
+    def std(self, channel):
+        '''
+        :param channel: 'a' or 'b'.
+        :return: The standard deviation of the voltages of the traces at each sample time, or NaN if fewer than two have
+        been added.
+        '''
+        return np.sqrt(self.variance(channel))
+
+    def min(self, channel):
+        '''
+        :param channel: 'a' or 'b'.
+        :return: The lowest voltage of the traces at each sample time.
+        '''
+        with self._lock:
+            return self._min[self._channel(channel)] * self.volts_per_adc
+
+    def max(self, channel):
+        '''
+        :param channel: 'a' or 'b'.
+        :return: The highest voltage of the traces at each sample time.
+        '''
+        with self._lock:
+            return self._max[self._channel(channel)] * self.volts_per_adc
@@ -0,0 +1,259 @@
+'''
+Measurements of the phase relationship between the signals on channels A and B, such as the reference and VCO of a
+phase locked loop, for whole batches of traces at once.
+
+Every function takes the voltages of one trace as an array of shape (samples,), or of many traces as arrays of shape
+(traces, samples), such as from Picoscope.get_traces or Recording.raw[:, 0]. Raw int16 ADC counts can be given
+directly, since only the shape of each signal matters, not its scale. The traces are processed chunk_traces at a time,
+so memory-mapped recordings larger than memory can be analysed.
+'''
+import collections
+import functools
+from numbers import Integral, Number
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+
+default_chunk_traces = 256
+default_hysteresis = 0.1
+# The fraction of samples at each end of a trace left out by the analytic signal method, where it is inaccurate
+default_edge_fraction = 0.05
+# The analytic signal method only keeps the frequencies between these multiples of the strongest in each trace
+band_limits = (0.5, 1.5)
+min_analytic_samples = 64
+method_options = ('analytic', 'crossings')
+
+"""LockAnalysis: The result of analyse_lock.
+"""
+LockAnalysis = collections.namedtuple('LockAnalysis', ['phase_difference', 'frequency_a', 'frequency_b',
+                                                       'lock_quality'])
+
+
+def _level(x, level, round_to):
+    # A threshold of each trace as an array of x's type, so comparisons need not convert x. For integer samples the
+    # threshold is rounded, with np.floor for > and <= or np.ceil for < and >=, which gives the same result.
+    if x.dtype.kind not in 'iu':
+        return level.astype(x.dtype)
+    info = np.iinfo(x.dtype)
+    return np.clip(round_to(level), info.min, info.max).astype(x.dtype)
+
+
+def _events(mask):
+    # The positions, as trace * samples + sample, where each row of mask becomes True after being False
+    samples = mask.shape[-1]
+    flat = np.flatnonzero(np.greater(mask[:, 1:], mask[:, :-1]))
+    rows, columns = np.divmod(flat, samples - 1)
+    return rows * samples + columns + 1
+
+
+def crossings(x, threshold=0.0, hysteresis=0.0, rising=True):
+    '''
+    Find where each trace crosses a threshold, to a fraction of a sample. After crossing, a trace must move hysteresis
+    past the threshold on the other side before another crossing in the same direction is counted, so noise near the
+    threshold does not give extra crossings. Only the crossings are ever handled one by one, so this takes little
+    more time than a few comparisons of every sample.
+    :param x: (Non-optional) The traces, as an array of shape (traces, samples). Raw int16 samples are compared
+    without being converted.
+    :param threshold: The level crossed, a number or an array with one entry per trace. Default is 0.
+    :param hysteresis: How far either side of the threshold a trace must go to count as above or below it, a number
+    or an array with one entry per trace. Default is 0.
+    :param rising: True (Default) for crossings upwards, False for crossings downwards.
+    :return: A tuple of two arrays with one entry per crossing, ordered by trace and then time: the index of the trace,
+    and the time of the crossing in samples, between the samples either side of it.
+    '''
+    x = np.asarray(x)
+    n, samples = x.shape
+    threshold = np.broadcast_to(np.reshape(np.asarray(threshold, dtype=np.float64), (-1, 1)), (n, 1))
+    hysteresis = np.broadcast_to(np.reshape(np.asarray(hysteresis, dtype=np.float64), (-1, 1)), (n, 1))
+    if rising:
+        past = x > _level(x, threshold + hysteresis, np.floor)
+        before = x < _level(x, threshold - hysteresis, np.ceil)
+        reached = x >= _level(x, threshold, np.ceil)
+    else:
+        past = x < _level(x, threshold - hysteresis, np.ceil)
+        before = x > _level(x, threshold + hysteresis, np.floor)
+        reached = x <= _level(x, threshold, np.floor)
+    # Each time a trace goes past the band is a crossing if it was last before the band, rather than past it.
+    # A trace starting before the band counts as having gone there at its first sample.
+    past_events, before_events = _events(past), _events(before)
+    starts_before = np.flatnonzero(before[:, 0]) * samples
+    before_events = np.sort(np.concatenate([before_events, starts_before]))
+    last_before = np.searchsorted(before_events, past_events) - 1
+    last_before = np.where(last_before >= 0, before_events[np.maximum(last_before, 0)], -1)
+    last_past = np.concatenate([[-1], past_events[:-1]])
+    row_start = past_events - past_events % samples
+    counted = past_events[(last_before > last_past) & (last_before >= row_start)]
+    # Each is timed where the trace last reached the threshold itself before going past the band
+    reached_events = _events(reached)
+    steps = reached_events[np.searchsorted(reached_events, counted, side='right') - 1]
+    rows, columns = np.divmod(steps, samples)
+    level = threshold[rows, 0]
+    start, end = x[rows, columns - 1].astype(np.float64), x[rows, columns].astype(np.float64)
+    return rows, columns - 1 + (level - start) / (end - start)
+
+
+def _crossing_frequency(rows, times, n, sample_interval):
+    # The mean frequency of each trace from its first and last crossings, or NaN if it has fewer than two
+    counts = np.bincount(rows, minlength=n)
+    starts = np.searchsorted(rows, np.arange(n))
+    has_two = counts >= 2
+    frequency = np.full(n, np.nan)
+    first, last = times[starts[has_two]], times[starts[has_two] + counts[has_two] - 1]
+    frequency[has_two] = (counts[has_two] - 1) / ((last - first) * sample_interval)
+    return frequency
+
+
+def _middle_and_band(x, hysteresis):
+    # The mean of each trace, and hysteresis as a fraction of half its peak to peak
+    return x.mean(axis=-1), hysteresis * (x.max(axis=-1).astype(np.float64) - x.min(axis=-1)) / 2
+
+
+def _analyse_crossings(a, b, sample_interval, hysteresis):
+    n, samples = a.shape
+    rows_a, times_a = crossings(a, *_middle_and_band(a, hysteresis))
+    rows_b, times_b = crossings(b, *_middle_and_band(b, hysteresis))
+    frequency_a = _crossing_frequency(rows_a, times_a, n, sample_interval)
+    frequency_b = _crossing_frequency(rows_b, times_b, n, sample_interval)
+    # For each crossing of B, the crossing of A before it in the same trace. Sorting keys combine trace and time.
+    key_a, key_b = rows_a * samples + times_a, rows_b * samples + times_b
+    previous = np.searchsorted(key_a, key_b, side='right') - 1
+    valid = previous >= 0
+    valid[valid] = rows_a[previous[valid]] == rows_b[valid]
+    rows = rows_b[valid]
+    delay = (times_b[valid] - times_a[previous[valid]]) * sample_interval
+    # A leads B by the fraction of A's period between their crossings
+    phases = 2 * np.pi * delay * frequency_a[rows]
+    return (frequency_a, frequency_b) + _circular_mean(rows, phases, n)
+
+
+def _circular_mean(rows, phases, n):
+    # The mean direction of the phases of each trace, in (-pi, pi], and their resultant length, 1 when all are equal
+    counts = np.bincount(rows, minlength=n)
+    cos, sin = np.bincount(rows, np.cos(phases), n), np.bincount(rows, np.sin(phases), n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.arctan2(sin, cos), np.hypot(cos, sin) / counts
+
+
+def hilbert(x):
+    '''
+    :param x: (Non-optional) The traces, as an array of shape (traces, samples), with their mean removed.
+    :return: The Hilbert transform of each trace, the imaginary part of its analytic signal x + 1j * hilbert(x), whose
+    angle is the instantaneous phase of the trace.
+    '''
+    samples = x.shape[-1]
+    spectrum = np.fft.rfft(x, axis=-1)
+    # Shifting the phase of every positive frequency back by 90 degrees, and dropping the zero and Nyquist frequencies
+    spectrum *= -1j
+    spectrum[..., 0] = 0
+    if samples % 2 == 0:
+        spectrum[..., -1] = 0
+    return np.fft.irfft(spectrum, n=samples, axis=-1)
+
+
+@functools.lru_cache(maxsize=16)
+def _slope_weights(samples):
+    # Weights w such that, for phase steps s between samples, s @ w is the least squares slope of the phase
+    # cumsum(s) against sample number. Least squares is much less affected by errors at the ends of the trace than
+    # the overall change of phase.
+    t = np.arange(samples) - (samples - 1) / 2
+    weights = np.cumsum(t[::-1])[::-1][1:] / np.sum(t ** 2)
+    weights.flags.writeable = False
+    return weights
+
+
+def _analytic_spectra(x):
+    # The one sided spectrum of each trace, and the bin of its strongest frequency other than zero
+    spectrum = np.fft.rfft(x, axis=-1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    power[:, 0] = 0
+    return spectrum, np.argmax(power, axis=-1)
+
+
+def _analytic_signal(spectrum, peak, length):
+    # The analytic signal of each trace at length evenly spaced times, from only the frequencies in band_limits of its
+    # strongest, which leaves out the harmonics of square waves. The narrow band needs far fewer samples than the trace.
+    bins = np.arange(spectrum.shape[-1])
+    low, high = np.ceil(band_limits[0] * peak), np.floor(band_limits[1] * peak)
+    keep = (bins >= low[:, None]) & (bins <= high[:, None])
+    top = int(high.max()) + 1
+    z = np.zeros((len(spectrum), length), dtype=np.complex128)
+    z[:, :top] = np.where(keep[:, :top], spectrum[:, :top], 0)
+    return np.fft.ifft(z, axis=-1)
+
+
+def _analyse_analytic(a, b, sample_interval, edge_fraction):
+    samples = a.shape[-1]
+    (spectrum_a, peak_a), (spectrum_b, peak_b) = _analytic_spectra(a), _analytic_spectra(b)
+    # Enough samples for the phase to change by at most a quarter turn between them
+    top = max(int(peak_a.max()), int(peak_b.max())) * band_limits[1] + 1
+    length = max(min_analytic_samples, 1 << int(np.ceil(np.log2(4 * top))))
+    interval = sample_interval * samples / length
+    edge = int(length * edge_fraction)
+    kept = slice(edge, length - edge)
+    z_a = _analytic_signal(spectrum_a, peak_a, length)[:, kept]
+    z_b = _analytic_signal(spectrum_b, peak_b, length)[:, kept]
+    weights = _slope_weights(z_a.shape[-1])
+    frequencies = []
+    for z in (z_a, z_b):
+        # The change of phase between samples, already within (-pi, pi) as it is at most a quarter turn
+        steps = np.angle(z[:, 1:] * np.conj(z[:, :-1]))
+        frequencies.append(steps @ weights / (2 * np.pi * interval))
+    # z_a * conj(z_b) at each sample, whose angle is the phase difference, is averaged as a unit vector
+    product = z_a * np.conj(z_b)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (product / np.abs(product)).mean(axis=-1)
+    return frequencies[0], frequencies[1], np.angle(mean), np.abs(mean)
+
+
+def analyse_lock(volts_a, volts_b, sample_interval, method='crossings', hysteresis=default_hysteresis,
+                 edge_fraction=default_edge_fraction, chunk_traces=default_chunk_traces):
+    '''
+    Measure the phase difference between channels A and B, the frequency of each, and how steady their phase
+    difference is, for every trace. No loop over the traces is run in Python.
+    :param volts_a: (Non-optional) The channel A voltages or raw ADC counts, of shape (samples,) or (traces, samples).
+    :param volts_b: (Non-optional) The channel B voltages or raw ADC counts, of the same shape.
+    :param sample_interval: (Non-optional) The time between samples in seconds, such as times[1] - times[0].
+    :param method: 'crossings' (Default) uses the times at which each trace rises through its mean, which suits square
+    waves and is fast enough to keep up with capturing. 'analytic' uses the analytic signal of the frequencies around
+    the strongest in each trace, made with an FFT, which leaves out harmonics and noise so is the more accurate for
+    noisy sine waves, but takes around three times as long.
+    :param hysteresis: For the 'crossings' method, how far a trace must go past its mean to count as above or below
+    it, as a fraction of half its peak to peak voltage. Default is 0.1.
+    :param edge_fraction: For the 'analytic' method, the fraction of samples left out at each end of a trace, where the
+    analytic signal is inaccurate. Default is 0.05.
+    :param chunk_traces: The number of traces processed at a time. Default is 256.
+    :return: A LockAnalysis named tuple of arrays with one entry per trace, or numbers if a single trace was given:
+    phase_difference, the phase by which A leads B in radians, between -pi and pi; frequency_a and frequency_b in Hz;
+    and lock_quality, between 0 and 1, which is 1 when the phase difference is the same throughout the trace, as when
+    the loop is locked, and near 0 when it drifts through every value, as when it is not.
+    '''
+    if method not in method_options:
+        raise er.InvalidAnalysisMethodException(method, method_options)
+    if not (isinstance(sample_interval, Number) and sample_interval > 0):
+        raise er.InvalidPositiveArgumentException('sample_interval', sample_interval)
+    if not (isinstance(chunk_traces, Integral) and chunk_traces > 0):
+        raise er.InvalidPositiveArgumentException('chunk_traces', chunk_traces, integer=True)
+    single = np.ndim(volts_a) == 1
+    volts_a, volts_b = np.atleast_2d(volts_a), np.atleast_2d(volts_b)
+    if volts_a.shape != volts_b.shape:
+        raise er.MismatchedChannelsException(volts_a.shape, volts_b.shape)
+    n = len(volts_a)
+    results = [np.empty(n) for _ in LockAnalysis._fields]
+    for start in range(0, n, chunk_traces):
+        a, b = volts_a[start:start + chunk_traces], volts_b[start:start + chunk_traces]
+        if method == 'analytic':
+            frequency_a, frequency_b, phase, quality = _analyse_analytic(a, b, sample_interval, edge_fraction)
+        else:
+            frequency_a, frequency_b, phase, quality = _analyse_crossings(a, b, sample_interval, hysteresis)
+        for result, values in zip(results, (phase, frequency_a, frequency_b, quality)):
+            result[start:start + chunk_traces] = values
+    if single:
+        return LockAnalysis(*(float(result[0]) for result in results))
+    return LockAnalysis(*results)
+
+
+def phase_difference(volts_a, volts_b, sample_interval, method='crossings', **kwargs):
+    '''
+    :return: The phase by which A leads B in radians, between -pi and pi, for each trace. See analyse_lock for the
+    arguments.
+    '''
+    return analyse_lock(volts_a, volts_b, sample_interval, method, **kwargs).phase_difference
@@ -0,0 +1,274 @@
+'''
+A compressed file format for large numbers of raw traces, which can be read back one trace at a time.
+
+The traces are stored in chunks of chunk_traces traces. In each chunk the samples of every trace are delta encoded (each
+sample is stored as the difference from the one before, which for a slowly changing signal is small), the low and high
+bytes are separated, and the result is compressed with zlib or lzma. The file is laid out as:
+    magic, header length (uint32), header (JSON), chunk, chunk, ..., index (JSON), index offset (uint64), magic
+where the index holds the position of each chunk and the timestamp and overflow of each trace.
+'''
+import json
+import lzma
+import os
+import struct
+import zlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib.trace import Trace
+
+magic = b'PLLARCH1'
+default_chunk_traces = 64
+codecs = {
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+default_levels = {'zlib': 1, 'lzma': 0}
+
+
+def encode_chunk(raw, codec, level):
+    '''
+    :param raw: An int16 array of shape (traces, channels, samples).
+    :return: The compressed bytes of the chunk.
+    '''
+    deltas = np.empty_like(raw)
+    deltas[..., 0] = raw[..., 0]
+    # Differences wrap around in int16, and are undone exactly by a cumulative sum which wraps in the same way
+    np.subtract(raw[..., 1:], raw[..., :-1], out=deltas[..., 1:])
+    shuffled = np.ascontiguousarray(deltas.reshape(-1).view(np.uint8).reshape(-1, 2).T)
+    return codecs[codec][0](shuffled.tobytes(), level)
+
+
+def decode_chunk(data, codec, out):
+    '''
+    Decompress a chunk into out, an int16 array of shape (traces, channels, samples).
+    '''
+    shuffled = np.frombuffer(codecs[codec][1](data), dtype=np.uint8)
+    n = out.size
+    if len(shuffled) != 2 * n:
+        raise er.DamagedArchiveException()
+    flat = out.reshape(-1).view(np.uint8).reshape(-1, 2)
+    flat[:, 0], flat[:, 1] = shuffled[:n], shuffled[n:]
+    np.cumsum(out, axis=-1, dtype=np.int16, out=out)
+
+
+class ArchiveWriter:
+    def __init__(self, path, samples, channels=2, chunk_traces=default_chunk_traces, codec='zlib', level=None,
+                 workers=None, metadata=None):
+        '''
+        Write raw traces to a compressed archive, to be read with ArchiveReader. Chunks are compressed in a pool of
+        threads while more traces are added. Use in a 'with' statement, or call close() when done.
+        :param path: (Non-optional) The file to write. An existing file is overwritten.
+        :param samples: (Non-optional) The number of samples in each trace.
+        :param channels: The number of channels in each trace. Default is 2.
+        :param chunk_traces: The number of traces compressed together. Reading a single trace decompresses its whole
+        chunk, so smaller chunks are faster to read from but compress less. Default is 64.
+        :param codec: 'zlib' (Default), or 'lzma' which is smaller but slower.
+        :param level: The compression level. Default is 1 for zlib and 0 for lzma, the fastest.
+        :param workers: The number of threads compressing chunks. Default is the number of CPUs.
+        :param metadata: (Optional) A dictionary saved with the traces, such as from Picoscope.archive_writer. If it has
+        volts_per_adc, raw_times and time_unit, the reader can give Traces.
+        '''
+        if codec not in codecs:
+            raise er.InvalidCodecException(codec, codecs)
+        self.samples, self.channels, self.chunk_traces = samples, channels, chunk_traces
+        self.codec, self.level = codec, default_levels[codec] if level is None else level
+        self._file = open(path, 'wb')
+        header = json.dumps({'samples': samples, 'channels': channels, 'chunk_traces': chunk_traces, 'codec': codec,
+                             'metadata': metadata or {}}).encode()
+        self._file.write(magic + struct.pack('<I', len(header)) + header)
+        self._workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(self._workers)
+        # Chunks being compressed, in order. Each is written as soon as it and all before it are done.
+        self._pending = collections.deque()
+        self._chunk = np.empty((chunk_traces, channels, samples), dtype=np.int16)
+        self._filled = 0
+        self._chunks, self._timestamps, self._overflow = [], [], []
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def append(self, *channels, timestamp=float('nan'), overflow=False):
+        '''
+        Add a trace.
+        :param channels: An int16 array of the raw ADC counts of each channel, such as trace.raw_a, trace.raw_b.
+        :param timestamp: The time.time() at which the trace was captured.
+        :param overflow: Whether the trace went outside the voltage range.
+        '''
+        for channel, samples in enumerate(channels):
+            self._chunk[self._filled, channel] = samples
+        self._timestamps.append(float(timestamp))
+        self._overflow.append(bool(overflow))
+        self._filled += 1
+        if self._filled == self.chunk_traces:
+            self._submit()
+
+    def append_trace(self, trace):
+        '''
+        Add a Trace, such as one returned by Picoscope.get_trace.
+        '''
+        self.append(trace.raw_a, trace.raw_b, timestamp=trace.timestamp, overflow=trace.overflow)
+
+    def append_batch(self, *channels, timestamps=None, overflow=None):
+        '''
+        Add many traces at once, such as those from Picoscope.get_traces(n, raw=True).
+        :param channels: An int16 array of shape (traces, samples) for each channel.
+        :param timestamps: (Optional) The time.time() each trace was captured.
+        :param overflow: (Optional) Whether each trace went outside the voltage range.
+        '''
+        n = len(channels[0])
+        timestamps = np.full(n, np.nan) if timestamps is None else timestamps
+        overflow = np.zeros(n, dtype=bool) if overflow is None else overflow
+        i = 0
+        while i < n:
+            # Copy as many traces as fit in the current chunk at once
+            k = min(n - i, self.chunk_traces - self._filled)
+            for channel, samples in enumerate(channels):
+                self._chunk[self._filled:self._filled + k, channel] = samples[i:i + k]
+            self._timestamps.extend(float(t) for t in timestamps[i:i + k])
+            self._overflow.extend(bool(o) for o in overflow[i:i + k])
+            self._filled += k
+            i += k
+            if self._filled == self.chunk_traces:
+                self._submit()
+
+    def _submit(self):
+        chunk, n = self._chunk[:self._filled], self._filled
+        self._pending.append((self._executor.submit(encode_chunk, chunk, self.codec, self.level), n))
+        self._chunk = np.empty_like(self._chunk)
+        self._filled = 0
+        self._write_done(block=len(self._pending) > 2 * self._workers)
+
+    def _write_done(self, block=False):
+        # Write the finished chunks at the front of the queue. If block, wait until there are few enough pending
+        # that memory use stays bounded when compression falls behind.
+        while self._pending and (self._pending[0][0].done() or block):
+            future, n = self._pending.popleft()
+            data = future.result()
+            self._chunks.append((self._file.tell(), len(data), n))
+            self._file.write(data)
+            block = block and len(self._pending) > self._workers
+
+    def close(self):
+        '''
+        Compress the remaining traces, and write the index. The archive cannot be read until this has been called.
+        '''
+        if self.closed:
+            return
+        if self._filled:
+            self._submit()
+        while self._pending:
+            self._write_done(block=True)
+        self._executor.shutdown()
+        index = json.dumps({'chunks': self._chunks, 'timestamps': self._timestamps, 'overflow': self._overflow})
+        index_offset = self._file.tell()
+        self._file.write(index.encode() + struct.pack('<Q', index_offset) + magic)
+        self._file.close()
+        self.closed = True
+
+
+class ArchiveReader:
+    def __init__(self, path):
+        '''
+        Read traces from an archive made by ArchiveWriter. Any trace can be read without decompressing the others,
+        apart from those in its chunk. Use in a 'with' statement, or call close() when done.
+        :param path: (Non-optional) The archive file.
+        '''
+        self._file = open(path, 'rb')
+        if self._file.read(len(magic)) != magic:
+            raise er.NotAnArchiveException(path)
+        header = json.loads(self._file.read(struct.unpack('<I', self._file.read(4))[0]))
+        self.samples, self.channels = header['samples'], header['channels']
+        self.chunk_traces, self.codec, self.metadata = header['chunk_traces'], header['codec'], header['metadata']
+        self._file.seek(-8 - len(magic), os.SEEK_END)
+        index_offset, end = struct.unpack('<Q', self._file.read(8))[0], self._file.read(len(magic))
+        if end != magic:
+            raise er.UnfinishedArchiveException(path)
+        index_length = self._file.seek(0, os.SEEK_END) - 8 - len(magic) - index_offset
+        self._file.seek(index_offset)
+        index = json.loads(self._file.read(index_length))
+        self._chunks = index['chunks']
+        self.timestamps = np.array(index['timestamps'], dtype=np.float64)
+        self.overflow = np.array(index['overflow'], dtype=bool)
+        self._cached_chunk, self._cache = None, np.empty((self.chunk_traces, self.channels, self.samples), np.int16)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _read_chunk(self, chunk, out):
+        offset, length, n = self._chunks[chunk]
+        self._file.seek(offset)
+        decode_chunk(self._file.read(length), self.codec, out[:n])
+
+    def read(self, i, out=None):
+        '''
+        :param i: The index of the trace.
+        :param out: (Optional) An int16 array of shape (channels, samples) to write the trace into.
+        :return: The raw ADC counts of the trace, as an int16 array of shape (channels, samples).
+        '''
+        if not -len(self) <= i < len(self):
+            raise er.ArchiveIndexException(i, len(self))
+        i %= len(self)
+        chunk = i // self.chunk_traces
+        if chunk != self._cached_chunk:
+            self._read_chunk(chunk, self._cache)
+            self._cached_chunk = chunk
+        if out is None:
+            return self._cache[i % self.chunk_traces].copy()
+        out[...] = self._cache[i % self.chunk_traces]
+        return out
+
+    def read_range(self, start=0, stop=None, out=None):
+        '''
+        Read many traces one after another, decompressing each whole chunk straight into the output.
+        :param start: The index of the first trace. Default is 0.
+        :param stop: The index after the last trace. Default is the end of the archive.
+        :param out: (Optional) An int16 array of shape (stop - start, channels, samples) to write the traces into.
+        :return: The raw ADC counts of the traces, as an int16 array of shape (stop - start, channels, samples).
+        '''
+        stop = len(self) if stop is None else min(stop, len(self))
+        if out is None:
+            out = np.empty((max(stop - start, 0), self.channels, self.samples), dtype=np.int16)
+        elif not (out.dtype == np.int16 and out.shape == (stop - start, self.channels, self.samples)
+                  and out.flags.c_contiguous):
+            raise er.InvalidArchiveOutException((stop - start, self.channels, self.samples))
+        i = start
+        while i < stop:
+            chunk, first = divmod(i, self.chunk_traces)
+            n = min(self._chunks[chunk][2] - first, stop - i)
+            if first == 0 and n == self._chunks[chunk][2]:
+                self._read_chunk(chunk, out[i - start:i - start + n])
+            else:
+                self.read(i)
+                out[i - start:i - start + n] = self._cache[first:first + n]
+            i += n
+        return out
+
+    def __getitem__(self, i):
+        '''
+        :return: The i-th trace as a Trace, if the archive was written with the scope's metadata.
+        '''
+        raw = self.read(i)
+        return Trace(raw[0], raw[1], self.metadata['volts_per_adc'], np.array(self.metadata['raw_times']),
+                     self.metadata['time_unit'], bool(self.overflow[i]), float(self.timestamps[i]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self._file.close()
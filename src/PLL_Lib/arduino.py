@@ -2,11 +2,12 @@ import serial
 import serial.tools.list_ports
 import PLL_Lib.arduinoerrorhelp as er
 import time
-from importlib.metadata import version
-version = version('PLL_Lib')
+from PLL_Lib import package_version
 
 MAX_INT = 2147483647  # 2^31 - 1
 MIN_INT = -2147483647
+# The arduino resets when a serial connection is opened, so is given this many seconds to start up again
+reset_wait = 3
 
 
 class Arduino:
@@ -23,16 +24,20 @@ class Arduino:
         '''
         Create a wrapper for the serial interface to an arduino.
         :param port: (Optional) The name of the serial port the arduino is connected to, eg 'COM5'.
-        Otherwise the program will attempt to find this automatically.
+        Otherwise the program will attempt to find this automatically. A pySerial URL such as 'loop://' can also be
+        given, to test code without an arduino.
+        :param baudrate: The baud rate of the serial connection. Default is 9600.
+        :param timeout: The time in seconds to wait when reading from the arduino. Default is 0.1.
         '''
         self.port = port
+        self.baudrate, self.timeout = baudrate, timeout
         self._used_in_with = False
 
     def __enter__(self):
         self._used_in_with = True
         if self.port is not None:
             try:
-                self.arduino = serial.Serial(port=self.port, baudrate=baudrate, timeout=timeout)
+                self.arduino = serial.serial_for_url(self.port, baudrate=self.baudrate, timeout=self.timeout)
             except Exception as e:
                 if "PermissionError" in e.args[0]:
                     raise er.PortInUseException(self.port)
@@ -47,7 +52,7 @@ class Arduino:
                 if 'arduino' in p.description.lower() or 'serial' in p.description.lower():
                     self.port = p.device
                     try:
-                        self.arduino = serial.Serial(port=self.port, baudrate=9600, timeout=.1)
+                        self.arduino = serial.serial_for_url(self.port, baudrate=self.baudrate, timeout=self.timeout)
                         break
                     except Exception as e:
                         if "PermissionError" in e.args[0]:
@@ -56,8 +61,9 @@ class Arduino:
                             raise er.UnexpectedConnectionException(self.port)
             else:
                 raise er.CouldNotFindArduinoException()
-        print(f'PLL_Lib version {version}: Connecting to Arduino on port {self.port}.')
-        time.sleep(3)
+        print(f'PLL_Lib version {package_version()}: Connecting to Arduino on port {self.port}.')
+        if '://' not in self.port:
+            time.sleep(reset_wait)
         print(f'Connected to Arduino!')
         return self
 
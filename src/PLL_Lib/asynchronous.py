@@ -0,0 +1,163 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from PLL_Lib.picoscope import Picoscope
+from PLL_Lib.arduino import Arduino
+
+
+class _AsyncDevice:
+    # Runs every call to the wrapped device on its own single thread, one at a time, so the event loop is never
+    # blocked and calls to different devices can overlap.
+    def __init__(self, device, thread_name):
+        self._device = device
+        self._thread_name = thread_name
+        self._executor = None
+
+    async def _run(self, f, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(f, *args, **kwargs))
+
+    async def __aenter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self._thread_name)
+        try:
+            await self._run(self._device.__enter__)
+        except BaseException:
+            self._executor.shutdown(wait=False)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            await self._run(self._device.__exit__, exc_type, exc_val, exc_tb)
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+class AsyncPicoscope(_AsyncDevice):
+    def __init__(self, **kwargs):
+        '''
+        A version of Picoscope for use with asyncio. Takes the same arguments as Picoscope, and should be used inside
+        an 'async with' statement:
+        async with AsyncPicoscope(trigger_channel='a') as scope:
+            times, voltages_A, voltages_B = await scope.get_trace()
+        Calls to the scope run in a separate thread, so other tasks, such as an AsyncArduino, keep running meanwhile.
+        '''
+        super().__init__(Picoscope(**kwargs), 'PLL_Lib Picoscope')
+
+    @property
+    def volts_per_adc(self):
+        '''See Picoscope.volts_per_adc.'''
+        return self._device.volts_per_adc
+
+    @property
+    def capture_duration(self):
+        '''See Picoscope.capture_duration.'''
+        return self._device.capture_duration
+
+    def stats(self):
+        '''See Picoscope.stats.'''
+        return self._device.stats()
+
+    async def stats_json(self, path=None):
+        '''See Picoscope.stats_json. Runs on the scope's thread, as it may write a file.'''
+        return await self._run(self._device.stats_json, path)
+
+    async def get_trace(self, *args, **kwargs):
+        '''See Picoscope.get_trace.'''
+        return await self._run(self._device.get_trace, *args, **kwargs)
+
+    async def get_traces(self, *args, **kwargs):
+        '''See Picoscope.get_traces.'''
+        return await self._run(self._device.get_traces, *args, **kwargs)
+
+    async def wait_for_key(self, *args, **kwargs):
+        '''See Picoscope.wait_for_key.'''
+        return await self._run(self._device.wait_for_key, *args, **kwargs)
+
+    async def set_signal_generator(self, *args, **kwargs):
+        '''See Picoscope.set_signal_generator.'''
+        return await self._run(self._device.set_signal_generator, *args, **kwargs)
+
+    async def start_acquisition(self, *args, **kwargs):
+        '''See Picoscope.start_acquisition.'''
+        return await self._run(self._device.start_acquisition, *args, **kwargs)
+
+    async def stop_acquisition(self):
+        '''See Picoscope.stop_acquisition.'''
+        return await self._run(self._device.stop_acquisition)
+
+    async def record(self, *args, **kwargs):
+        '''See Picoscope.record.'''
+        return await self._run(self._device.record, *args, **kwargs)
+
+    async def archive_writer(self, *args, **kwargs):
+        '''See Picoscope.archive_writer.'''
+        return await self._run(self._device.archive_writer, *args, **kwargs)
+
+    async def accumulate(self, *args, **kwargs):
+        '''See Picoscope.accumulate.'''
+        return await self._run(self._device.accumulate, *args, **kwargs)
+
+    async def spectrum(self, *args, **kwargs):
+        '''See Picoscope.spectrum.'''
+        return await self._run(self._device.spectrum, *args, **kwargs)
+
+    async def set_signal_generator_sweep(self, *args, **kwargs):
+        '''See Picoscope.set_signal_generator_sweep.'''
+        return await self._run(self._device.set_signal_generator_sweep, *args, **kwargs)
+
+    def sweep_frequencies(self, *args, **kwargs):
+        '''See Picoscope.sweep_frequencies.'''
+        return self._device.sweep_frequencies(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        '''
+        See Picoscope.stream. Use with 'async for':
+        async for times, volts_A, volts_B in scope.stream(1e-5, 10000): ...
+        '''
+        async for chunk in self._iterate(self._device.stream(*args, **kwargs)):
+            yield chunk
+
+    async def stream_envelope(self, *args, **kwargs):
+        '''See Picoscope.stream_envelope. Use with 'async for'.'''
+        async for envelope in self._iterate(self._device.stream_envelope(*args, **kwargs)):
+            yield envelope
+
+    async def _iterate(self, generator):
+        done = object()
+        try:
+            while True:
+                item = await self._run(next, generator, done)
+                if item is done:
+                    return
+                yield item
+        finally:
+            await self._run(generator.close)
+
+
+class AsyncArduino(_AsyncDevice):
+    def __init__(self, port=None, baudrate=9600, timeout=0.1):
+        '''
+        A version of Arduino for use with asyncio. Takes the same arguments as Arduino, and should be used inside
+        an 'async with' statement:
+        async with AsyncArduino() as arduino:
+            await arduino.send_code(25)
+        Calls to the arduino run in a separate thread, so other tasks, such as an AsyncPicoscope, keep running meanwhile.
+        '''
+        super().__init__(Arduino(port, baudrate, timeout), 'PLL_Lib Arduino')
+
+    @property
+    def port(self):
+        return self._device.port
+
+    async def send_code(self, code: int):
+        '''See Arduino.send_code.'''
+        return await self._run(self._device.send_code, code)
+
+    async def send_string(self, string: str):
+        '''See Arduino.send_string.'''
+        return await self._run(self._device.send_string, string)
+
+    async def readline(self):
+        '''See Arduino.readline.'''
+        return await self._run(self._device.readline)
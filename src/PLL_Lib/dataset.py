@@ -0,0 +1,170 @@
+import glob
+from numbers import Integral
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib.recording import Recording, no_code
+
+# Reductions read this many traces from disk at a time, so use a bounded amount of memory however large the dataset
+default_chunk_traces = 256
+channel_indices = {'a': 0, 'b': 1}
+
+
+class Dataset:
+    def __init__(self, paths):
+        '''
+        The traces of one or more recordings made with Picoscope.record, read from disk only as they are used.
+        Traces can be selected by the Arduino code they were recorded with, when they were captured, and the trigger
+        settings of their recording, and averaged without reading them all into memory:
+        dataset = Dataset('run*.npy')
+        mean_a = dataset.select(code=100).mean('a')
+        All the recordings must have the same sample times.
+        :param paths: (Non-optional) The path given to Picoscope.record, a list of them, or a pattern such as 'run*.npy'.
+        '''
+        given = paths
+        if isinstance(paths, str):
+            # A pattern such as 'run*.npy' also matches the index files of the recordings, which are left out
+            paths = [path for path in sorted(glob.glob(paths)) if not path.endswith('.index.npy')] \
+                if glob.has_magic(paths) else [paths]
+        if not paths:
+            raise er.NoRecordingsException(given)
+        self.recordings = [Recording(path) for path in paths]
+        first = self.recordings[0]
+        for recording in self.recordings[1:]:
+            if not np.array_equal(recording.raw_times, first.raw_times) or recording.time_unit != first.time_unit:
+                raise er.MismatchedRecordingsException('all the recordings in a Dataset must have the same sample times.')
+        self.times = first.times
+        # The combined index: which recording each trace is in, and where
+        self._recording = np.concatenate([np.full(len(r), i) for i, r in enumerate(self.recordings)]).astype(np.intp)
+        self._row = np.concatenate([np.arange(len(r)) for r in self.recordings]).astype(np.intp)
+        self.timestamps = np.concatenate([r.timestamps for r in self.recordings])
+        self.overflow = np.concatenate([r.overflow for r in self.recordings])
+        self.codes = np.concatenate([r.codes for r in self.recordings])
+
+    def _subset(self, selection):
+        subset = object.__new__(Dataset)
+        subset.recordings, subset.times = self.recordings, self.times
+        for name in ('_recording', '_row', 'timestamps', 'overflow', 'codes'):
+            setattr(subset, name, getattr(self, name)[selection])
+        return subset
+
+    def __len__(self):
+        return len(self._row)
+
+    def __getitem__(self, selection):
+        '''
+        :param selection: An integer, giving that trace as a Trace, or a slice, array of indices or boolean mask,
+        giving a Dataset of those traces.
+        '''
+        if isinstance(selection, Integral):
+            return self.recordings[self._recording[selection]][self._row[selection]]
+        return self._subset(selection)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, code=None, start_time=None, end_time=None, overflow=None, **settings):
+        '''
+        Select traces. Only the conditions given are used.
+        :param code: An Arduino code, or a list of them, that the traces were recorded with.
+        :param start_time: The earliest time.time() at which the traces were captured.
+        :param end_time: The latest time.time() at which the traces were captured.
+        :param overflow: True for only the traces which overflowed the voltage range, False for those which did not.
+        :param settings: Settings of the recordings, as saved by Picoscope.record, such as trigger_channel='a',
+        trigger_voltage=0.5, rising_edge=True, trigger_offset=10 or time_per_sample='5micro_s'.
+        :return: A Dataset of the selected traces.
+        '''
+        mask = np.ones(len(self), dtype=bool)
+        if code is not None:
+            mask &= np.isin(self.codes, np.atleast_1d(code))
+        if start_time is not None:
+            mask &= self.timestamps >= start_time
+        if end_time is not None:
+            mask &= self.timestamps <= end_time
+        if overflow is not None:
+            mask &= self.overflow == overflow
+        if settings:
+            matching = [all(recording.metadata.get(key) == value for key, value in settings.items())
+                        for recording in self.recordings]
+            mask &= np.array(matching)[self._recording]
+        return self._subset(mask)
+
+    @property
+    def code_values(self):
+        '''The different Arduino codes the traces were recorded with, not including traces recorded without one.'''
+        codes = np.unique(self.codes)
+        return codes[codes != no_code]
+
+    def _chunks(self, channel, chunk_traces):
+        # The raw samples of one channel of the traces, chunk_traces at a time and one recording at a time, with the
+        # positions in the dataset of the traces and the volts per ADC count of their recording
+        if not (isinstance(channel, str) and channel.lower() in channel_indices):
+            raise er.InvalidChannelException(channel, channel_indices)
+        channel = channel_indices[channel.lower()]
+        for i, recording in enumerate(self.recordings):
+            positions = np.flatnonzero(self._recording == i)
+            for start in range(0, len(positions), chunk_traces):
+                chunk = positions[start:start + chunk_traces]
+                yield chunk, recording.raw[self._row[chunk], channel], recording.volts_per_adc
+
+    def volts(self, channel, chunk_traces=default_chunk_traces):
+        '''
+        :param channel: 'a' or 'b'.
+        :param chunk_traces: The number of traces read from disk at a time. Default is 256.
+        :return: The voltages of every trace as an array of shape (traces, samples). This reads the whole selection into
+        memory, so select the traces needed first.
+        '''
+        out = np.empty((len(self), len(self.times)))
+        for positions, raw, volts_per_adc in self._chunks(channel, chunk_traces):
+            out[positions] = raw * volts_per_adc
+        return out
+
+    def _sums(self, channel, chunk_traces):
+        # Exact integer sums of the samples and their squares, and the minimum and maximum, of all traces
+        n, samples = 0, len(self.times)
+        total, total_squares = np.zeros(samples, dtype=np.int64), np.zeros(samples, dtype=np.int64)
+        lowest, highest = np.full(samples, np.inf), np.full(samples, -np.inf)
+        scales = {self.recordings[i].volts_per_adc for i in np.unique(self._recording)}
+        if len(scales) > 1:
+            raise er.MismatchedRecordingsException('reductions need all the recordings to have the same voltage range and probe.')
+        for _, raw, _ in self._chunks(channel, chunk_traces):
+            wide = raw.astype(np.int32)
+            total += wide.sum(axis=0, dtype=np.int64)
+            total_squares += (wide * wide).sum(axis=0, dtype=np.int64)
+            np.minimum(lowest, raw.min(axis=0), out=lowest)
+            np.maximum(highest, raw.max(axis=0), out=highest)
+            n += len(raw)
+        if n == 0:
+            raise er.NoTracesException()
+        return n, total, total_squares, lowest, highest, scales.pop()
+
+    def mean(self, channel, chunk_traces=default_chunk_traces):
+        '''
+        :param channel: 'a' or 'b'.
+        :param chunk_traces: The number of traces read into memory at a time. Default is 256.
+        :return: The mean voltage of the traces at each sample time.
+        '''
+        n, total, _, _, _, volts_per_adc = self._sums(channel, chunk_traces)
+        return total / n * volts_per_adc
+
+    def std(self, channel, chunk_traces=default_chunk_traces):
+        '''
+        :param channel: 'a' or 'b'.
+        :param chunk_traces: The number of traces read into memory at a time. Default is 256.
+        :return: The standard deviation of the voltages of the traces at each sample time, or NaN if there are fewer
+        than two traces, as for TraceAccumulator.std.
+        '''
+        n, total, total_squares, _, _, volts_per_adc = self._sums(channel, chunk_traces)
+        if n < 2:
+            return np.full(len(self.times), np.nan)
+        variance = (total_squares - total.astype(np.float64) * total / n) / (n - 1)
+        return np.sqrt(np.maximum(variance, 0)) * volts_per_adc
+
+    def envelope(self, channel, chunk_traces=default_chunk_traces):
+        '''
+        :param channel: 'a' or 'b'.
+        :param chunk_traces: The number of traces read into memory at a time. Default is 256.
+        :return: A tuple of the minimum and maximum voltages of the traces at each sample time.
+        '''
+        _, _, _, lowest, highest, volts_per_adc = self._sums(channel, chunk_traces)
+        return lowest * volts_per_adc, highest * volts_per_adc
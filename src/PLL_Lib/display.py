@@ -3,8 +3,10 @@ import pyglet.gl as gl
 import os
 import numpy as np
 import ctypes
-from importlib.metadata import version
-version = version('PLL_Lib')
+import threading
+import time
+import collections
+from PLL_Lib import package_version
 
 border = 20
 
@@ -33,6 +35,8 @@ font_name = 'Ebrima'
 
 captime_samples = 100
 
+default_max_fps = 30
+
 
 def get_spacing(min, max, screenspace, ideal):
     rnge = max - min
@@ -45,22 +49,59 @@ def get_spacing(min, max, screenspace, ideal):
     return np.concatenate([np.arange(0, min * 1.0001, -best_base)[:0:-1],np.arange(0, max * 1.0001, best_base)])
 
 
-class ScopeDisplay:
-    def __init__(self, min_v, max_v, min_t, max_t, time_per_sample_text, no_samples, probe_comp, trigger_voltage,
+def minmax_indices(values, columns):
+    '''
+    Find the samples of a trace needed to draw it across the given number of pixel columns: the minimum and maximum
+    of each column, in the order they occur, so that no spikes are lost.
+    :param values: A 1D array of the samples, evenly spaced in time.
+    :param columns: The number of pixel columns the trace is drawn across.
+    :return: An array of at most 2 * columns indices into values, in increasing order.
+    '''
+    n = len(values)
+    if n <= 2 * columns:
+        return np.arange(n)
+    per_column = -(-n // columns)
+    n_columns = -(-n // per_column)
+    # Pad the last column by repeating the last sample, so every column is the same length
+    padded = np.empty(n_columns * per_column, dtype=values.dtype)
+    padded[:n], padded[n:] = values, values[-1]
+    padded = padded.reshape(n_columns, per_column)
+    lowest, highest = padded.argmin(axis=1), padded.argmax(axis=1)
+    indices = np.empty((n_columns, 2), dtype=np.intp)
+    indices[:, 0], indices[:, 1] = np.minimum(lowest, highest), np.maximum(lowest, highest)
+    indices += np.arange(0, n_columns * per_column, per_column)[:, None]
+    return np.minimum(indices.ravel(), n - 1)
+
+
+def envelope_columns(x, maxima, minima, columns):
+    '''
+    Combine the windows of a min/max envelope so there is at most one per pixel column.
+    :return: A tuple of arrays of the x position, maximum and minimum of each combined window.
+    '''
+    per_column = -(-len(x) // columns)
+    starts = np.arange(0, len(x), per_column)
+    return x[starts], np.maximum.reduceat(maxima, starts), np.minimum.reduceat(minima, starts)
+
+
+class _ScopeWindow:
+    # The pyglet window itself. Only ever used from the ScopeDisplay's render thread.
+    def __init__(self, owner, min_v, max_v, min_t, max_t, time_per_sample_text, no_samples, probe_comp, trigger_voltage,
                  trigger_time, width=1000,
                  height=500):
-        self._waiting_key = None
+        self.needs_redraw = True
         self.max_v, self.min_v = max_v, min_v
         self.max_t, self.min_t = max_t, min_t
         self.draw_width = width - 2 * border
         self.draw_height = height - 2 * border
         window = pyglet.window.Window(width=width, height=height)
         self.window = window
-        self.points_x = np.array([])
-        self.points_y_a, self.points_y_b = np.array([]), np.array([])
+        self.trace_mode = gl.GL_LINE_STRIP
+        # Decimated traces and envelopes never have more than two vertices per pixel column
+        self.trace_a = _VertexBuffer(2 * self.draw_width, 2, gl.GL_DYNAMIC_DRAW)
+        self.trace_b = _VertexBuffer(2 * self.draw_width, 2, gl.GL_DYNAMIC_DRAW)
         self.setup_grid()
         self.labels = pyglet.graphics.Batch()
-        pyglet.text.Label(f'PLL_Lib PycoScope version {version}. Press q to quit.',
+        pyglet.text.Label(f'PLL_Lib PycoScope version {package_version()}. Press q to quit.',
                           font_name=font_name,
                           font_size=11,
                           x=border, y=window.height,
@@ -93,6 +134,13 @@ class ScopeDisplay:
                           x=border+5, y=border + self.draw_height, color=status_color,
                           anchor_x='left', anchor_y='top')
 
+        self.overlay_label = pyglet.text.Label('',
+                          font_name=font_name,
+                          font_size=9,
+                          x=border + self.draw_width - 5, y=border + self.draw_height - 5,
+                          width=self.draw_width // 2, multiline=True, color=status_color,
+                          anchor_x='right', anchor_y='top', align='right', batch=self.labels)
+
         self.rectA = pyglet.shapes.Rectangle(1.5 * border, 2.5 * border, 10, 10, chA_color * 255, batch=self.labels)
         pyglet.text.Label('Channel A',
                           font_name=font_name,
@@ -100,84 +148,74 @@ class ScopeDisplay:
                           x=1.5 * border + 15, y=2.5 * border + 5,
                           color=(255 * chA_color[0], 255 * chA_color[1], 255 * chA_color[2], 255),
                           anchor_x='left', anchor_y='center', batch=self.labels)
-        self.rectB = pyglet.shapes.Rectangle(1.5 * border, 1.5 * border, 10, 10, chB_color * 255)
+        self.rectB = pyglet.shapes.Rectangle(1.5 * border, 1.5 * border, 10, 10, chB_color * 255, batch=self.labels)
         pyglet.text.Label('Channel B',
                           font_name=font_name,
                           font_size=8,
                           x=1.5 * border + 15, y=1.5 * border + 5,
                           color=(255 * chB_color[0], 255 * chB_color[1], 255 * chB_color[2], 255),
                           anchor_x='left', anchor_y='center', batch=self.labels)
-        self.trigger = None
         if trigger_voltage is not None:
-            self.trigger = pyglet.graphics.Batch()
             trigger_x = border + (trigger_time - self.min_t)*self.draw_width/(self.max_t - self.min_t)
             trigger_y = border + (trigger_voltage - self.min_v)*self.draw_height/(self.max_v - self.min_v)
             self.trigger_rect = pyglet.shapes.Rectangle(trigger_x, trigger_y, trigger_size, trigger_size, color=trigger_color, batch=self.labels)
             self.trigger_rect.anchor_position = trigger_size//2, trigger_size//2
             self.trigger_rect.rotation = 45
         self.overflow = False
-        self.captimes = []
-
-        @self.window.event
-        def on_draw():
-            self.window.clear()
-            gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
-            gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
-            gl.glEnableClientState(gl.GL_COLOR_ARRAY)
-            self.draw_grid()
-            self.draw_line(self.points_x, self.points_y_a, chA_color)
-            self.draw_line(self.points_x, self.points_y_b, chB_color)
-            self.draw_border()
-            self.labels.draw()
-            if self.trigger is not None: self.trigger_rect.draw()
-            self.rectA.draw(),self.rectB.draw()
-            if self.overflow: self.overflow_label.draw()
 
         @self.window.event
         def on_key_press(symbol, modifiers):
-            if symbol == 113:  # q key
-                print('q key pressed. Stopping...')
-                os._exit(1)
-            if self._waiting_key is not None:
-                if symbol == self._waiting_key:
-                    self._waiting_key = None
-        self.set_status('Waiting for first capture...')
-        self.update(np.array([]), np.array([]), np.array([]), None, False)
-        self.update(np.array([]), np.array([]), np.array([]), None, False) # Have to do this twice the first time. Don't know why...
+            owner.key_pressed(symbol)
 
-    def av_captime(self, captime):
-        if len(self.captimes) == captime_samples:
-            self.captimes.pop()
-        self.captimes.insert(0,captime)
-        return np.mean(self.captimes)
+        @self.window.event
+        def on_expose():
+            self.needs_redraw = True
 
-    def update(self, times, voltages_a, voltages_b, captime, overflow):
-        pyglet.clock.tick()
+    def set_trace(self, times, voltages_a, voltages_b, overflow):
         self.overflow = overflow
-        if captime is not None and captime > 0: self.rate_label.text = f'Approx {np.round(1 / self.av_captime(captime), 1)} captures per second.'
-        self.points_x = (times - self.min_t) * self.draw_width / (self.max_t - self.min_t) + border
-        self.points_y_a = (voltages_a - self.min_v) * self.draw_height / (self.max_v - self.min_v) + border
-        self.points_y_b = (voltages_b - self.min_v) * self.draw_height / (self.max_v - self.min_v) + border
+        # Only the samples which can be seen at the window's resolution are kept, so drawing costs the same however
+        # many samples there are
+        indices_a = minmax_indices(voltages_a, self.draw_width)
+        indices_b = minmax_indices(voltages_b, self.draw_width)
+        self.trace_a.set((times[indices_a] - self.min_t) * self.draw_width / (self.max_t - self.min_t) + border,
+                         (voltages_a[indices_a] - self.min_v) * self.draw_height / (self.max_v - self.min_v) + border)
+        self.trace_b.set((times[indices_b] - self.min_t) * self.draw_width / (self.max_t - self.min_t) + border,
+                         (voltages_b[indices_b] - self.min_v) * self.draw_height / (self.max_v - self.min_v) + border)
+        self.trace_mode = gl.GL_LINE_STRIP
+        self.needs_redraw = True
+
+    def set_envelope(self, size, max_a, min_a, max_b, min_b):
+        x = np.arange(len(max_a)) * self.draw_width / max(size - 1, 1) + border
+        if len(x) > self.draw_width:
+            # Both channels are reduced against the same, original window positions
+            columns, max_a, min_a = envelope_columns(x, max_a, min_a, self.draw_width)
+            _, max_b, min_b = envelope_columns(x, max_b, min_b, self.draw_width)
+            x = columns
+        x = np.repeat(x, 2)
+        self.trace_a.set(x, (np.stack([min_a, max_a], axis=1).ravel() - self.min_v) * self.draw_height / (self.max_v - self.min_v) + border)
+        self.trace_b.set(x, (np.stack([min_b, max_b], axis=1).ravel() - self.min_v) * self.draw_height / (self.max_v - self.min_v) + border)
+        self.trace_mode = gl.GL_LINES
+        self.needs_redraw = True
+
+    def redraw(self):
+        # Drawn directly rather than with dispatch_event('on_draw'), which outside pyglet's own event loop is only
+        # queued until the next dispatch_events, so would show each frame one frame late
         self.window.switch_to()
-        self.window.dispatch_events()
-        self.window.dispatch_event('on_draw')
+        self.draw()
         self.window.flip()
+        self.needs_redraw = False
 
-    def draw_line(self, points_x, points_y, color):
-        vertPoints = np.stack([points_x, points_y]).flatten(order="F").astype(ctypes.c_float)
-        vertices_gl = vertPoints.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-        color_array = np.ones((len(points_x), 3)) * color
-        vertColors = color_array.flatten().astype(ctypes.c_float)
-        colors_gl = vertColors.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-
-        gl.glVertexPointer(2, gl.GL_FLOAT, 0, vertices_gl)
-        gl.glColorPointer(3, gl.GL_FLOAT, 0, colors_gl)
-        gl.glDrawArrays(gl.GL_LINE_STRIP, 0, len(vertPoints) // 2)
-
-    def draw_border(self):
-        self.draw_line(np.array([border, border + self.draw_width, border + self.draw_width, border, border]),
-                       np.array([border, border, border + self.draw_height, border + self.draw_height, border]),
-                       np.array([1, 1, 1]))
+    def draw(self):
+        self.window.clear()
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        self.grid_labels.draw()
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        self.static_lines.draw(gl.GL_LINES)
+        self.trace_a.draw(self.trace_mode, chA_color)
+        self.trace_b.draw(self.trace_mode, chB_color)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        self.labels.draw()
+        if self.overflow: self.overflow_label.draw()
 
     def setup_grid(self):
         self.x_grid_spacing = get_spacing(self.min_t, self.max_t, self.draw_width, ideal_grid)
@@ -199,15 +237,187 @@ class ScopeDisplay:
                               x=2 * border, y=y_screen,
                               anchor_x='left', anchor_y='bottom', batch=self.grid_labels)
 
-    def draw_grid(self):
-        self.grid_labels.draw()
-        for x_screen in self.x_grid_screen:
-            self.draw_line(np.array([x_screen, x_screen]), np.array([border, border + self.draw_height]), grid_color)
-        for y_screen in self.y_grid_screen:
-            self.draw_line(np.array([border, border + self.draw_width]), np.array([y_screen, y_screen]), grid_color)
+        # The grid and border never change, so are uploaded once as pairs of line ends and drawn in a single call
+        left, right, bottom, top = border, border + self.draw_width, border, border + self.draw_height
+        n_x, n_y = len(self.x_grid_screen), len(self.y_grid_screen)
+        x = np.concatenate([np.repeat(self.x_grid_screen, 2), np.tile([left, right], n_y),
+                            [left, right, right, right, right, left, left, left]])
+        y = np.concatenate([np.tile([bottom, top], n_x), np.repeat(self.y_grid_screen, 2),
+                            [bottom, bottom, bottom, top, top, top, top, bottom]])
+        colors = np.concatenate([np.tile(grid_color, (2 * (n_x + n_y), 1)), np.ones((8, 3))])
+        self.static_lines = _VertexBuffer(len(x), 5, gl.GL_STATIC_DRAW)
+        self.static_lines.set(x, y, *colors.T)
+
+    def set_status(self, status):
+        text = f'Status: {status}'
+        if self.status_label.text != text:
+            self.status_label.text = text
+            self.needs_redraw = True
+
+    def set_rate(self, text):
+        if self.rate_label.text != text:
+            self.rate_label.text = text
+            self.needs_redraw = True
+
+    def set_overlay(self, text):
+        if self.overlay_label.text != text:
+            self.overlay_label.text = text
+            self.needs_redraw = True
+
+    def close(self):
+        for vertex_buffer in (self.static_lines, self.trace_a, self.trace_b):
+            vertex_buffer.delete()
+        self.window.close()
+
+
+class _VertexBuffer:
+    # A vertex buffer object kept on the GPU for the life of the window, holding up to capacity vertices.
+    # Each vertex is x, y and, if components is 5, an r, g, b colour.
+    def __init__(self, capacity, components, usage):
+        self.vertices = np.zeros((capacity, components), dtype=np.float32)
+        self.count, self._changed = 0, False
+        self.id = gl.GLuint()
+        gl.glGenBuffers(1, ctypes.byref(self.id))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.id)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.vertices.nbytes, None, usage)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def set(self, *columns):
+        self.count = len(columns[0])
+        for i, column in enumerate(columns):
+            self.vertices[:self.count, i] = column
+        self._changed = True
+
+    def draw(self, mode, color=None):
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.id)
+        if self._changed:
+            # Only the vertices in use are uploaded, into the existing buffer
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, self.count * self.vertices.strides[0], self.vertices.ctypes.data)
+            self._changed = False
+        stride = self.vertices.strides[0]
+        gl.glVertexPointer(2, gl.GL_FLOAT, stride, 0)
+        if color is None:
+            gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+            gl.glColorPointer(3, gl.GL_FLOAT, stride, 2 * self.vertices.itemsize)
+        else:
+            gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+            gl.glColor3f(*(float(c) for c in color))
+        gl.glDrawArrays(mode, 0, self.count)
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        gl.glDeleteBuffers(1, ctypes.byref(self.id))
+
+
+class ScopeDisplay:
+    def __init__(self, *args, max_fps=default_max_fps, **kwargs):
+        '''
+        The window showing the traces. It is drawn by its own thread at up to max_fps frames per second, always
+        showing the latest trace given to update, so capturing never waits for the display.
+        Takes the same arguments as _ScopeWindow, created by Picoscope.
+        '''
+        self._waiting_key = None
+        self._frame_time = 1 / max_fps
+        self._lock = threading.Lock()
+        self._latest, self._new_data = None, False
+        # The latest trace is copied into here by update, and read from here by the render thread
+        self._shared_trace = np.zeros((3, 0))
+        self._status, self._rate, self._overlay = 'Waiting for first capture...', None, ''
+        self.captimes = collections.deque(maxlen=captime_samples)
+        self._captime_total = 0.0
+        self._ready, self._closing = threading.Event(), threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=args, kwargs=kwargs, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self, *args, **kwargs):
+        # The render thread. The pyglet window is created, drawn and closed here only.
+        try:
+            window = _ScopeWindow(self, *args, **kwargs)
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()
+        while not self._closing.is_set():
+            frame_start = time.perf_counter()
+            pyglet.clock.tick()
+            window.window.dispatch_events()
+            with self._lock:
+                if self._new_data:
+                    if self._latest[0] == 'trace':
+                        window.set_trace(*self._shared_trace, self._latest[1])
+                    else:
+                        window.set_envelope(*self._latest[1:])
+                    self._new_data = False
+                status, rate, overlay = self._status, self._rate, self._overlay
+            window.set_status(status)
+            window.set_overlay(overlay)
+            if rate is not None:
+                window.set_rate(rate)
+            if window.needs_redraw:
+                window.redraw()
+            time.sleep(max(0.0, self._frame_time - (time.perf_counter() - frame_start)))
+        window.close()
+
+    def key_pressed(self, symbol):
+        if symbol == 113:  # q key
+            print('q key pressed. Stopping...')
+            os._exit(1)
+        if self._waiting_key is not None:
+            if symbol == self._waiting_key:
+                self._waiting_key = None
+
+    def av_captime(self, captime):
+        # Running mean of the last captime_samples capture times
+        if len(self.captimes) == captime_samples:
+            self._captime_total -= self.captimes[0]
+        self.captimes.append(captime)
+        self._captime_total += captime
+        return self._captime_total / len(self.captimes)
+
+    def update(self, times, voltages_a, voltages_b, captime, overflow):
+        '''
+        Show a new trace. Only stores it to be drawn by the render thread, so returns immediately.
+        The arrays are copied, so may be reused by the caller.
+        '''
+        rate = None
+        if captime is not None and captime > 0:
+            rate = f'Approx {np.round(1 / self.av_captime(captime), 1)} captures per second.'
+        with self._lock:
+            if self._shared_trace.shape[1] != len(times):
+                self._shared_trace = np.zeros((3, len(times)))
+            self._shared_trace[0], self._shared_trace[1], self._shared_trace[2] = times, voltages_a, voltages_b
+            self._latest, self._new_data = ('trace', overflow), True
+            if rate is not None:
+                self._rate = rate
+
+    def update_envelope(self, envelope):
+        '''
+        Draw the min/max envelope held in an EnvelopeBuffer in place of the traces, as one vertical line per window
+        spanning the full width of the plot, oldest on the left. The time axis labels do not apply in this mode.
+        '''
+        times, max_a, min_a, max_b, min_b = envelope.envelope()
+        latest = ('envelope', envelope.size, max_a, min_a, max_b, min_b)
+        with self._lock:
+            self._latest, self._new_data = latest, True
+            self._status = f'Envelope of the last {len(times) * envelope.time_per_window:.3g}s, ' \
+                           f'{envelope.time_per_window:.3g}s per window.'
 
     def set_status(self, status):
-        self.status_label.text = f'Status: {status}'
+        with self._lock:
+            self._status = status
+
+    def set_overlay(self, text):
+        '''
+        Show some lines of text, such as capture timings, in the top right of the plot. An empty string hides it.
+        '''
+        with self._lock:
+            self._overlay = text
 
     def wait_for_keycode(self, keycode):
         self._waiting_key = keycode
@@ -217,4 +427,5 @@ class ScopeDisplay:
         return self._waiting_key is None
 
     def close(self):
-        self.window.close()
\ No newline at end of file
+        self._closing.set()
+        self._thread.join()
\ No newline at end of file
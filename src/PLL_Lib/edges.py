@@ -0,0 +1,169 @@
+'''
+Timing measurements of square waves, such as those driven by the Arduino, for whole batches of traces at once.
+
+Each trace is split at the middle of its low and high levels into edges, found with hysteresis and timed to a fraction
+of a sample by linear interpolation. Only the edges are handled individually, so a trace costs little more than a few
+comparisons of each sample, and measure_edges can keep up with get_trace.
+'''
+import collections
+from numbers import Integral, Number
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib.analysis import crossings
+
+default_chunk_traces = 256
+default_hysteresis = 0.1
+# Rise and fall times are measured between these fractions of the way from the low level to the high level
+rise_levels = (0.1, 0.9)
+
+"""EdgeMeasurement: The result of measure_edges.
+"""
+EdgeMeasurement = collections.namedtuple('EdgeMeasurement', [
+    'period', 'frequency', 'duty_cycle', 'period_jitter', 'edge_jitter', 'rise_time', 'fall_time', 'low', 'high',
+    'edges'])
+
+
+def _levels(x):
+    # The low and high levels of each trace, the means of the samples in the bottom and top quarters of its range,
+    # which leaves out the samples on its edges
+    bottom, top = x.min(axis=-1).astype(np.float64), x.max(axis=-1).astype(np.float64)
+    levels = []
+    for part in (x <= (0.75 * bottom + 0.25 * top)[:, None], x >= (0.25 * bottom + 0.75 * top)[:, None]):
+        levels.append(np.where(part, x, 0).sum(axis=-1, dtype=np.float64) / np.count_nonzero(part, axis=-1))
+    return levels
+
+
+def _per_trace(rows, values, n):
+    # The sum of values for each trace
+    return np.bincount(rows, values, minlength=n)
+
+
+def _nearest(keys, rows, targets, target_rows, samples, after):
+    # For each target, the key in the same trace just after it (or just before it if not after), or NaN
+    index = np.searchsorted(keys, targets, side='left' if after else 'right') - (0 if after else 1)
+    valid = (index >= 0) & (index < len(keys))
+    valid[valid] = rows[index[valid]] == target_rows[valid]
+    found = np.full(len(targets), np.nan)
+    found[valid] = keys[index[valid]] - target_rows[valid] * samples
+    return found
+
+
+def _level_steps(x, level):
+    # The times, as trace * samples + sample, at which each trace rises through level and falls through it, without
+    # hysteresis, interpolated between samples
+    samples = x.shape[-1]
+    above = x >= level[:, None]
+    times = []
+    for steps in (np.greater(above[:, 1:], above[:, :-1]), np.less(above[:, 1:], above[:, :-1])):
+        rows, columns = np.divmod(np.flatnonzero(steps), samples - 1)
+        start, end = x[rows, columns].astype(np.float64), x[rows, columns + 1].astype(np.float64)
+        times.append(rows * samples + columns + (level[rows] - start) / (end - start))
+    return times
+
+
+def _transition_times(rows, keys, starts, ends, n, samples):
+    # The mean time taken by the edges of each trace at keys, from the last time before each through the start level
+    # to the first time after it through the end level
+    durations = np.full(len(keys), np.nan)
+    before = np.searchsorted(starts, keys, side='right') - 1
+    after = np.searchsorted(ends, keys, side='left')
+    valid = (before >= 0) & (after < len(ends))
+    found_before, found_after = starts[before[valid]], ends[after[valid]]
+    # Both must be in the same trace as the edge
+    same = (found_before // samples == rows[valid]) & (found_after // samples == rows[valid])
+    durations[np.flatnonzero(valid)[same]] = (found_after - found_before)[same]
+    valid = np.isfinite(durations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _per_trace(rows[valid], durations[valid], n) / np.bincount(rows[valid], minlength=n)
+
+
+def _measure(x, sample_interval, threshold, hysteresis):
+    n, samples = x.shape
+    low, high = _levels(x)
+    middle = (low + high) / 2 if threshold is None else np.broadcast_to(np.asarray(threshold, np.float64), n)
+    band = hysteresis * (high - low) / 2
+    rise_rows, rise_times = crossings(x, middle, band, rising=True)
+    fall_rows, fall_times = crossings(x, middle, band, rising=False)
+
+    # Each rising edge's number within its trace, and the number of rising edges in each trace
+    edges = np.bincount(rise_rows, minlength=n)
+    firsts = np.searchsorted(rise_rows, np.arange(n))
+    number = np.arange(len(rise_rows)) - firsts[rise_rows]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # A least squares straight line through each trace's rising edge times against their number. Its slope is the
+        # period, and the edges' distances from it are their timing jitter.
+        k, t = number.astype(np.float64), rise_times
+        sum_k, sum_t = _per_trace(rise_rows, k, n), _per_trace(rise_rows, t, n)
+        sum_kk, sum_kt = _per_trace(rise_rows, k * k, n), _per_trace(rise_rows, k * t, n)
+        slope = (edges * sum_kt - sum_k * sum_t) / (edges * sum_kk - sum_k ** 2)
+        intercept = (sum_t - slope * sum_k) / edges
+        residual = t - (intercept[rise_rows] + slope[rise_rows] * k)
+        edge_jitter = np.sqrt(_per_trace(rise_rows, residual ** 2, n) / np.maximum(edges - 2, 0)) * sample_interval
+        period = slope * sample_interval
+
+        # The spread of the times between consecutive rising edges
+        consecutive = rise_rows[1:] == rise_rows[:-1]
+        period_rows, periods = rise_rows[1:][consecutive], np.diff(rise_times)[consecutive]
+        mean_period = _per_trace(period_rows, periods, n) / (edges - 1)
+        variance = (_per_trace(period_rows, periods ** 2, n) - (edges - 1) * mean_period ** 2) / (edges - 2)
+        period_jitter = np.where(edges >= 3, np.sqrt(np.maximum(variance, 0)), np.nan) * sample_interval
+
+        # The time from each rising edge to the next falling edge, as a fraction of the period
+        high_time = _nearest(fall_rows * samples + fall_times, fall_rows, rise_rows * samples + rise_times, rise_rows,
+                             samples, after=True) - rise_times
+        valid = np.isfinite(high_time)
+        duty_cycle = _per_trace(rise_rows[valid], high_time[valid], n) / np.bincount(rise_rows[valid], minlength=n) \
+            * sample_interval / period
+
+        (bottom_rises, bottom_falls), (top_rises, top_falls) = (
+            _level_steps(x, low + fraction * (high - low)) for fraction in rise_levels)
+        rise_time = _transition_times(rise_rows, rise_rows * samples + rise_times, bottom_rises, top_rises, n,
+                                      samples) * sample_interval
+        fall_time = _transition_times(fall_rows, fall_rows * samples + fall_times, top_falls, bottom_falls, n,
+                                      samples) * sample_interval
+    return period, 1 / period, duty_cycle, period_jitter, edge_jitter, rise_time, fall_time, low, high, edges
+
+
+def measure_edges(x, sample_interval, volts_per_adc=1.0, threshold=None, hysteresis=default_hysteresis,
+                  chunk_traces=default_chunk_traces):
+    '''
+    Measure the timing of the square wave in each trace. No loop over the traces or edges is run in Python.
+    :param x: (Non-optional) The voltages or raw ADC counts of one channel, of shape (samples,) or (traces, samples),
+    such as trace.raw_b or the voltages_b of Picoscope.get_traces.
+    :param sample_interval: (Non-optional) The time between samples in seconds, such as times[1] - times[0].
+    :param volts_per_adc: If x is raw ADC counts, scope.volts_per_adc, so that the levels are given in volts.
+    Default is 1.
+    :param threshold: The level at which edges are timed, in the units of x, either a number used for every trace or
+    an array with one per trace. Default is None, half way between the low and high levels of each trace.
+    :param hysteresis: How far a trace must go past the threshold to count as high or low, as a fraction of half the
+    difference between its levels, so that noise on an edge does not give extra edges. Default is 0.1.
+    :param chunk_traces: The number of traces processed at a time. Default is 256.
+    :return: An EdgeMeasurement named tuple of arrays with one entry per trace, or numbers if a single trace was given,
+    all times being in seconds and NaN where a trace has too few edges:
+    period, the mean time between rising edges, and frequency, its inverse;
+    duty_cycle, the fraction of each period which is high;
+    period_jitter, the standard deviation of the times between consecutive rising edges;
+    edge_jitter, the root mean square distance of the rising edges from a perfectly regular square wave;
+    rise_time and fall_time, the mean time taken by the edges to go between 10% and 90% of the way between the levels;
+    low and high, the mean voltages of the low and high parts of the wave;
+    and edges, the number of rising edges.
+    '''
+    if not (isinstance(sample_interval, Number) and sample_interval > 0):
+        raise er.InvalidPositiveArgumentException('sample_interval', sample_interval)
+    if not (isinstance(chunk_traces, Integral) and chunk_traces > 0):
+        raise er.InvalidPositiveArgumentException('chunk_traces', chunk_traces, integer=True)
+    single = np.ndim(x) == 1
+    x = np.atleast_2d(x)
+    n = len(x)
+    per_trace = threshold is not None and np.ndim(threshold) == 1
+    results = [np.empty(n, dtype=np.int64 if field == 'edges' else np.float64) for field in EdgeMeasurement._fields]
+    for start in range(0, n, chunk_traces):
+        chunk = np.asarray(x[start:start + chunk_traces])
+        chunk_threshold = threshold[start:start + chunk_traces] if per_trace else threshold
+        for result, values in zip(results, _measure(chunk, sample_interval, chunk_threshold, hysteresis)):
+            result[start:start + len(chunk)] = values
+    for field in ('low', 'high'):
+        results[EdgeMeasurement._fields.index(field)] *= volts_per_adc
+    if single:
+        return EdgeMeasurement(*(result[0].item() for result in results))
+    return EdgeMeasurement(*results)
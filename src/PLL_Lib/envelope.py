@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class EnvelopeBuffer:
+    def __init__(self, size, volts_per_adc, time_per_window):
+        '''
+        A fixed size ring buffer holding the min/max envelope of both channels, one entry per aggregate window.
+        Once full, the oldest windows are overwritten so memory use does not grow however long a run lasts.
+        Normally created by Picoscope.stream_envelope rather than directly.
+        :param size: The number of windows kept.
+        :param volts_per_adc: The factor converting raw ADC counts to volts.
+        :param time_per_window: The duration of each window in seconds.
+        '''
+        self.size = size
+        self.volts_per_adc = volts_per_adc
+        self.time_per_window = time_per_window
+        # Rows are A max, A min, B max, B min, the same order as the driver's overview buffers
+        self._data = np.zeros((4, size), dtype=np.int16)
+        self._next = 0
+        self.count = 0
+
+    def append(self, max_a, min_a, max_b, min_b):
+        '''
+        Add windows to the buffer, overwriting the oldest ones once it is full.
+        :param max_a, min_a, max_b, min_b: Equal length int16 arrays of raw ADC counts.
+        '''
+        n = len(max_a)
+        start = 0
+        if n > self.size:
+            # Only the newest windows would survive anyway
+            start = n - self.size
+            self._next = (self._next + start) % self.size
+        for row, values in enumerate((max_a, min_a, max_b, min_b)):
+            values = values[start:]
+            first = min(len(values), self.size - self._next)
+            self._data[row, self._next:self._next + first] = values[:first]
+            self._data[row, :len(values) - first] = values[first:]
+        self._next = (self._next + n - start) % self.size
+        self.count += n
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def raw(self):
+        '''
+        :return: A (4, len) int16 array of the A max, A min, B max and B min ADC counts, oldest window first.
+        '''
+        if self.count < self.size:
+            return self._data[:, :self.count].copy()
+        return np.concatenate([self._data[:, self._next:], self._data[:, :self._next]], axis=1)
+
+    def envelope(self):
+        '''
+        :return: A tuple containing numpy arrays for the start time of each window, and the A max, A min, B max and
+        B min voltages, oldest window first. Times are measured from the start of streaming.
+        '''
+        times = (np.arange(len(self)) + self.count - len(self)) * self.time_per_window
+        max_a, min_a, max_b, min_b = self.raw() * self.volts_per_adc
+        return times, max_a, min_a, max_b, min_b
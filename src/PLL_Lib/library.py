@@ -44,13 +44,17 @@ def requires_device(error_message="This method requires a Device instance regist
 
 
 class Library(object):
-    def __init__(self, name, lib_path):
+    def __init__(self, name, lib_path, lazy=False):
+        """If lazy is True, the driver is not loaded until load() is called or one of its functions is first used.
+        Symbols registered with make_symbol before then are bound when it is loaded."""
         if lib_path is None:
             env_var_name = "PATH" if sys.platform == 'win32' else "LD_LIBRARY_PATH"
             raise CannotFindPicoSDKError('No path to lib given')
         self.name = name
         self.lib_path = lib_path
-        self._clib = self._load()
+        # Every symbol registered with make_symbol, so that another implementation of the driver can bind the same ones
+        self.symbols = []
+        self._clib = None if lazy else self._load()
         # ! some drivers will replace these dicts at import time, where they have different constants (notably ps2000).
         self.PICO_INFO = constants.PICO_INFO
         self.PICO_STATUS = constants.PICO_STATUS
@@ -79,11 +83,34 @@ class Library(object):
             raise CannotOpenPicoSDKError("PicoSDK (%s) not compatible (check 32 vs 64-bit): %s" % (self.name, e))
         return result
 
+    def load(self):
+        """Loads the driver and binds the symbols registered so far, if this has not already been done."""
+        if self._clib is None:
+            self._clib = self._load()
+            for symbol in self.symbols:
+                self._bind_symbol(*symbol)
+
+    @property
+    def loaded(self):
+        return self._clib is not None
+
+    def __getattr__(self, name):
+        # Only called for attributes which are not set, such as driver functions before the driver is loaded
+        if name.startswith('__') or self.__dict__.get('_clib', True) is not None:
+            raise AttributeError("%r object has no attribute %r" % (type(self).__name__, name))
+        self.load()
+        return getattr(self, name)
+
     def __str__(self):
         return "picosdk %s library" % self.name
 
     def make_symbol(self, python_name, c_name, return_type, argument_types, docstring=None):
         """Used by python wrappers for particular drivers to register C functions on the class."""
+        self.symbols.append((python_name, c_name, return_type, argument_types, docstring))
+        if self._clib is not None:
+            self._bind_symbol(python_name, c_name, return_type, argument_types, docstring)
+
+    def _bind_symbol(self, python_name, c_name, return_type, argument_types, docstring):
         c_function = getattr(self._clib, c_name)
         c_function.restype = return_type
         c_function.argtypes = argument_types
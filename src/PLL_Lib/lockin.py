@@ -0,0 +1,171 @@
+'''
+A digital lock-in amplifier, which measures the amplitude and phase of a signal at a known frequency, rejecting noise
+and every other frequency, by multiplying it by a reference and low pass filtering the result.
+
+The signal can be given in consecutive chunks, such as those from Picoscope.stream or successive traces from
+Picoscope.get_trace, and the filters carry on from one chunk to the next, so the measurement settles over many chunks
+just as a hardware lock-in's output settles over its time constant.
+'''
+import functools
+from numbers import Number
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib.analysis import crossings
+
+default_time_constant = 0.01
+default_order = 2
+# The filters are run over blocks of at most this many time constants, so the growing exponentials used stay accurate
+filter_block_time_constants = 40
+default_hysteresis = 0.1
+
+
+@functools.lru_cache(maxsize=32)
+def _reference_table(frequency, sample_interval, samples):
+    # 2 * exp(-i 2 pi frequency t) for samples samples from t = 0, which turns a cosine of amplitude A and phase phi at
+    # frequency into A * exp(i phi) plus a term at twice the frequency
+    table = 2 * np.exp(-2j * np.pi * frequency * sample_interval * np.arange(samples))
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=32)
+def _filter_powers(decay, samples):
+    # decay ** k and decay ** -k for k from 0 to samples - 1
+    powers = decay ** np.arange(samples, dtype=np.float64)
+    inverse = 1 / powers
+    powers.flags.writeable = inverse.flags.writeable = False
+    return powers, inverse
+
+
+class LockIn:
+    def __init__(self, sample_interval, frequency=None, time_constant=default_time_constant, order=default_order,
+                 harmonic=1, hysteresis=default_hysteresis):
+        '''
+        Measure the amplitude and phase of a signal at a reference frequency:
+        lock_in = LockIn(1e-5, frequency=1000, time_constant=0.1)
+        for times, volts_a, volts_b in scope.stream(1e-5, 10000):
+            lock_in.update(volts_b)
+            print(lock_in.amplitude, lock_in.phase)
+        :param sample_interval: (Non-optional) The time between samples in seconds.
+        :param frequency: The reference frequency in Hz. Default is None, in which case a reference signal, such as the
+        other channel, must be given to each update, and the frequency and phase are taken from its rising edges.
+        :param time_constant: The time constant of each low pass filter in seconds. Longer time constants reject more
+        noise and nearby frequencies, but take longer to settle. Default is 0.01.
+        :param order: The number of filters one after another. Each makes the rejection of other frequencies
+        fall 6 dB per octave faster. Default is 2.
+        :param harmonic: Measure at this multiple of the reference frequency. Default is 1.
+        :param hysteresis: When a reference signal is given, how far it must go past its middle to count as above or
+        below it, as a fraction of half its peak to peak. Default is 0.1.
+        '''
+        for name, value in (('sample_interval', sample_interval), ('time_constant', time_constant)):
+            if not (isinstance(value, Number) and value > 0):
+                raise er.InvalidPositiveArgumentException(name, value)
+        if not (type(order) is int and order > 0):
+            raise er.InvalidPositiveArgumentException('order', order, integer=True)
+        self.sample_interval, self.frequency, self.time_constant = sample_interval, frequency, time_constant
+        self.order, self.harmonic, self.hysteresis = order, harmonic, hysteresis
+        self._decay = np.exp(-sample_interval / time_constant)
+        self._block = max(1, int(filter_block_time_constants * time_constant / sample_interval))
+        self.reset()
+
+    def reset(self):
+        '''
+        Start again, forgetting every sample given so far.
+        '''
+        self._filters = np.zeros(self.order, dtype=np.complex128)
+        self.samples = 0
+        # For a reference signal, the sample number of its last rising edge, and its period in samples
+        self._last_edge, self._period = None, None
+
+    @property
+    def value(self):
+        '''The latest output as a complex number, whose magnitude is the amplitude and angle is the phase.'''
+        return complex(self._filters[-1])
+
+    @property
+    def amplitude(self):
+        '''The latest amplitude of the signal at the reference frequency, in the units of the signal.'''
+        return abs(self.value)
+
+    @property
+    def phase(self):
+        '''The latest phase in radians by which the signal leads the reference, between -pi and pi.'''
+        return float(np.angle(self.value))
+
+    @property
+    def settled(self):
+        '''Whether enough samples have been given for the output to be within 1% of its final value.'''
+        # The step response of order filters reaches 99% after about 4.6 + 2.3 * (order - 1) time constants
+        return self.samples * self.sample_interval > (4.6 + 2.3 * (self.order - 1)) * self.time_constant
+
+    def update(self, signal, reference=None, start_time=None):
+        '''
+        Add the next chunk of samples.
+        :param signal: (Non-optional) The voltages or raw ADC counts of the next samples of the signal.
+        :param reference: The samples of the reference signal at the same times, such as the other channel. Only used,
+        and then needed, if no frequency was given.
+        :param start_time: The time in seconds of the first sample, relative to a time at which the reference has
+        phase 0, such as trace.times[0] for a trace triggered on the reference. Default is None, following on from the
+        previous chunk. Only used with a frequency.
+        :return: The output after each sample of the chunk, as complex numbers whose magnitudes are the amplitude and
+        angles the phase.
+        '''
+        signal = np.asarray(signal)
+        n = len(signal)
+        if self.frequency is not None:
+            frequency = self.frequency * self.harmonic
+            if start_time is None:
+                start_time = self.samples * self.sample_interval
+            mixed = signal * _reference_table(frequency, self.sample_interval, n)
+            mixed *= np.exp(-2j * np.pi * frequency * start_time)
+        else:
+            if reference is None:
+                raise er.MissingReferenceException()
+            mixed = signal * (2 * np.exp(-1j * self.harmonic * self._reference_phase(np.asarray(reference))))
+        for stage in range(self.order):
+            mixed = self._filter(mixed, stage)
+        self.samples += n
+        return mixed
+
+    def _filter(self, x, stage):
+        # A first order low pass filter y[k] = decay * y[k - 1] + (1 - decay) * x[k], which for each block is
+        # y[k] = decay^k * (decay * y[-1] + (1 - decay) * cumsum(x / decay^k)[k])
+        out = np.empty_like(x)
+        previous = self._filters[stage]
+        for start in range(0, len(x), self._block):
+            block = x[start:start + self._block]
+            powers, inverse = _filter_powers(self._decay, len(block))
+            y = out[start:start + len(block)]
+            np.multiply(block, inverse, out=y)
+            np.cumsum(y, out=y)
+            y *= 1 - self._decay
+            y += self._decay * previous
+            y *= powers
+            previous = y[-1]
+        self._filters[stage] = previous
+        return out
+
+    def _reference_phase(self, reference):
+        # The phase in radians of the reference at each sample, from its rising edges. Phase 0 is at each rising edge,
+        # as for a sine wave. Between edges it is interpolated, and after the last it is extrapolated using the period.
+        n = len(reference)
+        middle = reference.mean()
+        band = self.hysteresis * (reference.max() - float(reference.min())) / 2
+        _, times = crossings(reference[None, :], middle, band)
+        # Cycles are counted from the last edge of the previous chunk, which only changes the phase by whole cycles
+        edges = times + self.samples
+        cycles = np.arange(1, len(edges) + 1, dtype=np.float64)
+        if self._last_edge is not None:
+            edges, cycles = np.concatenate([[self._last_edge], edges]), np.concatenate([[0.0], cycles])
+        if len(edges) >= 2:
+            self._period = (edges[-1] - edges[0]) / (len(edges) - 1)
+        if self._period is None:
+            raise er.TooFewReferenceEdgesException()
+        sample_numbers = np.arange(self.samples, self.samples + n, dtype=np.float64)
+        phase = np.interp(sample_numbers, edges, cycles)
+        # np.interp holds the end values constant outside the edges, so carry on from them at the period instead
+        before, after = sample_numbers < edges[0], sample_numbers > edges[-1]
+        phase[before] = cycles[0] - (edges[0] - sample_numbers[before]) / self._period
+        phase[after] = cycles[-1] + (sample_numbers[after] - edges[-1]) / self._period
+        self._last_edge = edges[-1]
+        return 2 * np.pi * phase - np.pi / 2
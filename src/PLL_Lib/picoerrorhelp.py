@@ -84,4 +84,216 @@ class InvalidSigGenVoltageException(Exception):
         super().__init__(
             f"\nThe arguments '{wrongmin}' and '{wrongmax} are not a valid set of bounding voltages."
             f"\nYou should give two numbers, -{maxfreq} ≤ min_voltage ≤ max_voltage ≤ {maxfreq}, "
-            f"\nrepresenting the range of voltages of the generated signal in V.")
\ No newline at end of file
+            f"\nrepresenting the range of voltages of the generated signal in V.")
+
+class InvalidSweepException(ValueError):
+    def __init__(self, start, stop, increment, dwell_time, maxfreq=None):
+        super().__init__(
+            f"\nThe arguments start_frequency='{start}', stop_frequency='{stop}', increment='{increment}' and "
+            f"dwell_time='{dwell_time}' are not a valid sweep."
+            f"\nYou should give frequencies in Hz with 0 ≤ start_frequency < stop_frequency"
+            + ("" if maxfreq is None else f" ≤ {maxfreq}") + ", "
+            f"\na positive increment in Hz no larger than their difference, and a positive dwell_time in seconds.")
+
+class InvalidSweepTypeException(ValueError):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid sweep_type. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1])
+
+class InvalidSweepCountException(ValueError):
+    def __init__(self, wrongarg):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid number of sweeps. You should give a non-negative integer, "
+            f"\nor 0 to sweep continuously.")
+
+class NoSweepException(Exception):
+    def __init__(self):
+        super().__init__(
+            f"\nThe signal generator is not sweeping. Call scope.set_signal_generator_sweep() first.")
+
+class RecordingNotFoundException(FileNotFoundError):
+    def __init__(self, path):
+        super().__init__(
+            f"\nNo recording was found at '{path}'. You should give the path given to Picoscope.record.")
+
+class MissingRecordingFileException(FileNotFoundError):
+    def __init__(self, data_path, missing_path):
+        super().__init__(
+            f"\nThe recording '{data_path}' cannot be opened without '{missing_path}'."
+            f"\nA recording is kept in three files, the traces (.npy), the index (.index.npy) and the settings (.json),"
+            f"\nwhich must be copied together.")
+
+class InvalidOutputArrayException(Exception):
+    def __init__(self, samples):
+        super().__init__(
+            f"\nThe 'out' argument should be a pair of float numpy arrays, each of shape ({samples},), "
+            f"\nfor example two rows of a preallocated 2D array: out=(voltages_array_a[i], voltages_array_b[i]).")
+
+class InvalidStreamingParametersException(Exception):
+    def __init__(self, sample_interval, chunk_size):
+        super().__init__(
+            f"\nThe arguments sample_interval={sample_interval} and chunk_size={chunk_size} are not valid for streaming."
+            f"\nYou should give a positive sample interval in seconds (eg 1e-5) and a positive integer number of samples per chunk.")
+
+stream_overrun_warning = "\nThe picoscope's streaming buffer overran, so some samples were lost between chunks. " \
+                         "\nProcess each chunk more quickly, use a larger chunk_size, or a longer sample_interval."
+
+class InvalidTraceCountException(Exception):
+    def __init__(self, wrongarg):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid number of traces. You should give a positive integer.")
+
+class InvalidDisplayEveryException(Exception):
+    def __init__(self, wrongarg):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not valid for display_every. You should give a non-negative integer, "
+            f"\nthe number of traces between display updates, or 0 to only display the last trace.")
+
+class InvalidWhenFullException(Exception):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid option for when_full. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1])
+
+class AcquisitionRunningException(Exception):
+    def __init__(self, function_name):
+        super().__init__(
+            f"\n{function_name} cannot be used whilst capturing in the background. "
+            f"\nCall scope.stop_acquisition() first, or use get_trace to take traces from the background capture.")
+
+acquisition_stop_warning = "\nThe background capture did not stop in time and has been left running. " \
+                           "\nReconnect to the picoscope if later captures fail."
+
+class InvalidWaitParameterException(Exception):
+    def __init__(self, name, wrongarg):
+        super().__init__(
+            f"\nThe argument {name}='{wrongarg}' is not valid. You should give a positive number of seconds"
+            + (", or None to wait forever." if name == 'capture_timeout' else "."))
+
+class InvalidAutoTriggerException(Exception):
+    def __init__(self, wrongarg, maxarg):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid auto trigger delay. "
+            f"\nYou should give an integer number of milliseconds between 1 and {maxarg}, or 0 to never trigger automatically.")
+
+class CaptureTimeoutException(Exception):
+    def __init__(self, timeout, triggered):
+        super().__init__(
+            f"\nThe picoscope did not finish capturing within the capture_timeout of {timeout}s."
+            + ("\nIt was probably waiting for a trigger event that never happened. To fix:"
+               "\n - Check the signal is connected to the trigger channel and crosses the trigger voltage"
+               "\n - Use auto_trigger_ms to trigger automatically when no event is seen"
+               if triggered else
+               "\nUse a shorter time_per_sample, or a longer capture_timeout."))
+
+class InvalidVerifyTimeAxisException(Exception):
+    def __init__(self, wrongarg):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not valid for verify_time_axis_every. You should give a non-negative integer, "
+            f"\nthe number of captures between checks of the sample times, or 0 to never check them again.")
+
+time_axis_warning = "\nThe sample times read from the picoscope have changed since the first capture. " \
+                    "\nThe new times will be used from now on."
+
+class InvalidDisplayFpsException(Exception):
+    def __init__(self, wrongarg):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not valid for display_fps. You should give a positive number of frames per second.")
+
+
+class InvalidBackendException(Exception):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid backend. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1] + "\nor a driver object such as a SimulatedPs2000.")
+
+class InvalidCodecException(ValueError):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid codec. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1])
+
+class NotAnArchiveException(ValueError):
+    def __init__(self, path):
+        super().__init__(f"\n'{path}' is not a PLL_Lib archive. You should give a file written by an ArchiveWriter.")
+
+class UnfinishedArchiveException(ValueError):
+    def __init__(self, path):
+        super().__init__(
+            f"\nThe archive '{path}' was not closed when it was written, so has no index and cannot be read."
+            f"\nUse the ArchiveWriter in a 'with' statement, or call close() on it, so that it is always finished.")
+
+class DamagedArchiveException(ValueError):
+    def __init__(self):
+        super().__init__("\nA chunk of the archive does not hold the expected number of samples. The archive may be damaged.")
+
+class ArchiveIndexException(IndexError):
+    def __init__(self, i, n):
+        super().__init__(f"\nTrace {i} is not in an archive of {n} traces.")
+
+class InvalidArchiveOutException(ValueError):
+    def __init__(self, shape):
+        super().__init__(f"\nThe 'out' argument should be a C contiguous int16 numpy array of shape {shape}.")
+
+class NoRecordingsException(FileNotFoundError):
+    def __init__(self, paths):
+        super().__init__(
+            f"\nNo recordings were found for '{paths}'. You should give the path given to Picoscope.record, "
+            f"\na list of them, or a pattern such as 'run*.npy'.")
+
+class MismatchedRecordingsException(ValueError):
+    def __init__(self, reason):
+        super().__init__(f"\nThe recordings cannot be combined: {reason}")
+
+class NoTracesException(ValueError):
+    def __init__(self):
+        super().__init__("\nThere are no traces to reduce. Check that the selection matches some traces.")
+
+class InvalidChannelException(ValueError):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid channel. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1])
+
+class InvalidAnalysisMethodException(ValueError):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid method. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1])
+
+class MismatchedChannelsException(ValueError):
+    def __init__(self, shape_a, shape_b):
+        super().__init__(
+            f"\nThe channel A and B arguments should have the same shape, not {shape_a} and {shape_b}."
+            f"\nYou should give the voltages of the same traces on both channels.")
+
+class InvalidWindowException(ValueError):
+    def __init__(self, wrongarg, rightargs):
+        super().__init__(
+            f"\nThe argument '{wrongarg}' is not a valid window. Valid arguments are: \n"
+            + str(list(rightargs))[1:-1])
+
+class InvalidTraceLengthException(ValueError):
+    def __init__(self, wrongarg, samples):
+        super().__init__(
+            f"\nThe traces have {wrongarg} samples, but should have {samples}."
+            f"\nUse a Spectrum made for traces of this length, such as from get_spectrum or scope.spectrum().")
+
+class InvalidPositiveArgumentException(ValueError):
+    def __init__(self, name, wrongarg, integer=False):
+        super().__init__(
+            f"\nThe argument {name}='{wrongarg}' is not valid. You should give a positive "
+            + ("integer." if integer else "number."))
+
+class MissingReferenceException(ValueError):
+    def __init__(self):
+        super().__init__(
+            "\nA LockIn made without a frequency needs a reference signal, such as the other channel, with every update:"
+            "\nlock_in.update(volts_b, reference=volts_a)")
+
+class TooFewReferenceEdgesException(ValueError):
+    def __init__(self):
+        super().__init__(
+            "\nThe reference signal needs at least two rising edges in its first chunk, so that its frequency is known."
+            "\nGive a longer first chunk, or a frequency to the LockIn.")
@@ -1,13 +1,21 @@
 import ctypes as ct
-from PLL_Lib.ps2000 import ps2000 as ps
 import PLL_Lib.picoerrorhelp as er
-from PLL_Lib.display import ScopeDisplay
+from PLL_Lib.envelope import EnvelopeBuffer
+from PLL_Lib.trace import Trace
+from PLL_Lib.stats import CaptureStats
+from PLL_Lib.recording import create_recording, load_recording
+from PLL_Lib.accumulator import TraceAccumulator
+from PLL_Lib.spectrum import get_spectrum
+from PLL_Lib.sweep import SweepSchedule, sweep_type_options
 import warnings
 import time
+import collections
+import os
+import threading
+import queue
 import numpy as np
 from numbers import Number
-from importlib.metadata import version
-version = version('PLL_Lib')
+from PLL_Lib import package_version
 
 voltage_range_strings = {
     '20mv': 1,
@@ -72,8 +80,32 @@ waveform_options = {
 max_adc = ct.c_int16(32767)
 warning_threshold = 5
 load_timeout = 7
+load_poll_interval = 0.01
+# While waiting for a capture, sleep through this fraction of the time the driver expects to be busy, then poll
+# starting at min_poll_interval and doubling up to the max_poll_interval given to Picoscope
+expected_wait_fraction = 0.9
+min_poll_interval = 5e-5
+MAX_AUTO_TRIGGER_MS = 32767
 MAX_FREQUENCY = 1e5
 MAX_SIGGEN_VOLTAGE = 2
+when_full_options = ('drop_oldest', 'block')
+acquisition_poll = 0.1
+# The longest time in seconds stop_acquisition waits for the acquisition thread to finish
+acquisition_stop_timeout = 5
+# Streaming samples are requested from the driver in ns, PS2000_NS = 2
+STREAMING_TIME_UNITS = 2
+min_overview_buffer_size = 15000
+max_streaming_poll = 0.05
+# The driver used when no backend is given to Picoscope can be chosen with this environment variable
+backend_environment_variable = 'PLL_LIB_BACKEND'
+backend_options = ('ps2000', 'simulator')
+# The stats overlay on the display is updated at most this often, in seconds
+stats_overlay_interval = 0.5
+
+
+"""TraceBatch: The result of Picoscope.get_traces.
+"""
+TraceBatch = collections.namedtuple('TraceBatch', ['times', 'voltages_a', 'voltages_b', 'timestamps', 'overflow'])
 
 
 def check_success(result, exceptiontype=er.LostConnectionException, errValue=0):
@@ -82,6 +114,25 @@ def check_success(result, exceptiontype=er.LostConnectionException, errValue=0):
     return result
 
 
+def get_backend(backend=None):
+    '''
+    :param backend: 'ps2000' for the real driver, 'simulator' for a SimulatedPs2000 with its default signals, a driver
+    object such as a SimulatedPs2000, or None to use the PLL_LIB_BACKEND environment variable, or 'ps2000' if it is not set.
+    :return: The driver object on which Picoscope calls the ps2000 functions.
+    '''
+    if backend is None:
+        backend = os.environ.get(backend_environment_variable, 'ps2000')
+    if not isinstance(backend, str):
+        return backend
+    if backend.lower() == 'ps2000':
+        from PLL_Lib.ps2000 import ps2000
+        return ps2000
+    if backend.lower() == 'simulator':
+        from PLL_Lib.simulator import SimulatedPs2000
+        return SimulatedPs2000()
+    raise er.InvalidBackendException(backend, backend_options)
+
+
 class Picoscope:
     def _check_with(f):
         def wrapper(self, *args, **kwargs):
@@ -92,7 +143,9 @@ class Picoscope:
         return wrapper
 
     def __init__(self, *, time_per_sample='5micro_s', voltage_range='1v', trigger_channel=None, trigger_voltage=None,
-                 rising_edge=True, trigger_offset=10, show_display=True, probe_10x=False):
+                 rising_edge=True, trigger_offset=10, show_display=True, probe_10x=False, max_poll_interval=1e-3,
+                 capture_timeout=None, auto_trigger_ms=0, verify_time_axis_every=0, display_fps=30,
+                 show_stats=False, backend=None):
         '''
         Should not be initialised directly but rather used as a context manager inside a 'with' statement.
         All arguments are optional.
@@ -110,11 +163,30 @@ class Picoscope:
         :param trigger_offset: The percentage of samples which are recorded before the trigger event.
         This should be an integer between 0 and 100. Default is 10.
         :param show_display: Whether to display the traces in a window. Default is True.
+        The window is drawn in its own thread, so capturing never waits for it.
         :param probe_10x: If True, apply a 10x multiplier to the ouput voltages in the display window and output arrays.
         Does not affect the input voltage range or trigger voltage, which should be set as if this is not enabled.
         Default is False.
+        :param max_poll_interval: The longest time in seconds between checks of whether a capture has finished.
+        Smaller values return traces sooner after the trigger, larger values use less CPU. Default is 1e-3.
+        :param capture_timeout: If a capture takes longer than this many seconds, for example because the trigger
+        never fires, a CaptureTimeoutException is raised. Default is None, waiting forever.
+        :param auto_trigger_ms: If not 0, the scope triggers by itself when no trigger event has been seen for this
+        many milliseconds. Only used when a trigger_channel is given. Default is 0.
+        :param verify_time_axis_every: The sample times are read from the scope on the first capture and reused after
+        that. If not 0, they are read again every this many captures and a warning given if they have changed. Default is 0.
+        :param display_fps: The maximum number of times per second the display is redrawn. Default is 30.
+        :param show_stats: If True, show the median and 99th percentile time of each phase of capturing a trace on the
+        display. The timings are always recorded, and can be read with scope.stats(). Default is False.
+        :param backend: The driver to use. 'ps2000' for a real picoscope, or 'simulator' to simulate one with the signals of
+        a phase locked loop, which needs no picoscope. A SimulatedPs2000 can also be given to choose the simulated signals.
+        Default is None, using the PLL_LIB_BACKEND environment variable if it is set and 'ps2000' otherwise.
         '''
         self._used_in_with = False
+        self._ps = get_backend(backend)
+        # Traces are timestamped with the backend's own clock if it has one, such as the simulated time of a
+        # SimulatedPs2000, so that the timestamps match the signals it generates
+        self._clock = self._ps.clock if hasattr(type(self._ps), 'clock') else time.time
         self._probe_comp = 10 if probe_10x else 1
         vr_lower = voltage_range.lower()
         if vr_lower not in voltage_range_strings:
@@ -141,99 +213,675 @@ class Picoscope:
                 raise er.InvalidTriggerVoltageException(self._trigger_voltage, self._voltage_range_volts, voltage_range)
             self._rising_edge = rising_edge
 
+        if not (isinstance(max_poll_interval, Number) and max_poll_interval > 0):
+            raise er.InvalidWaitParameterException('max_poll_interval', max_poll_interval)
+        if not (capture_timeout is None or isinstance(capture_timeout, Number) and capture_timeout > 0):
+            raise er.InvalidWaitParameterException('capture_timeout', capture_timeout)
+        if not (type(auto_trigger_ms) is int and 0 <= auto_trigger_ms <= MAX_AUTO_TRIGGER_MS):
+            raise er.InvalidAutoTriggerException(auto_trigger_ms, MAX_AUTO_TRIGGER_MS)
+        self._max_poll_interval = max_poll_interval
+        self._capture_timeout = capture_timeout
+        self._auto_trigger_ms = auto_trigger_ms
+        if not (type(verify_time_axis_every) is int and verify_time_axis_every >= 0):
+            raise er.InvalidVerifyTimeAxisException(verify_time_axis_every)
+        self._verify_time_axis_every = verify_time_axis_every
+
+        if not (isinstance(display_fps, Number) and display_fps > 0):
+            raise er.InvalidDisplayFpsException(display_fps)
+        self._display_fps = display_fps
         self._show_display = show_display
         self._last_cap_time = -1
+        self._acquisition = None
+        self._sweep = None
+        self._driver_lock = threading.Lock()
+        self._show_stats = show_stats
+        self._stats, self._last_overlay = CaptureStats(), 0
 
     def __enter__(self):
         self._used_in_with = True
-        print(f'PLL_Lib version {version}: Connecting to Picoscope...')
-        check_success(ps.ps2000_open_unit_async())
+        print(f'PLL_Lib version {package_version()}: Connecting to Picoscope...')
+        self._ps.load()
+        check_success(self._ps.ps2000_open_unit_async())
         self._chandle, progress = ct.c_int16(), ct.c_int16()
         start_time = time.time()
-        while ps.ps2000_open_unit_progress(ct.byref(self._chandle), ct.byref(progress)) == 0:
+        while self._ps.ps2000_open_unit_progress(ct.byref(self._chandle), ct.byref(progress)) == 0:
             if time.time() - start_time > load_timeout: raise er.CouldNotFindScopeException()
-        check_success(ps.ps2000PingUnit(self._chandle), er.CouldNotFindScopeException)
+            time.sleep(load_poll_interval)
+        check_success(self._ps.ps2000PingUnit(self._chandle), er.CouldNotFindScopeException)
         print('Connected to Picoscope!')
 
-        # self._chandle = check_success(ps.ps2000_open_unit(), er.CouldNotFindScopeException)
+        # self._chandle = check_success(self._ps.ps2000_open_unit(), er.CouldNotFindScopeException)
         # enabled = 1, coupling type = PS2000_DC = 1, analogue offset = 0 V, channel = PS2000_CHANNEL_A = 0
-        check_success(ps.ps2000_set_channel(self._chandle, 0, 1, 1, self._voltage_range))
+        check_success(self._ps.ps2000_set_channel(self._chandle, 0, 1, 1, self._voltage_range))
         # same except channel = PS2000_CHANNEL_B = 1
-        check_success(ps.ps2000_set_channel(self._chandle, 1, 1, 1, self._voltage_range))
+        check_success(self._ps.ps2000_set_channel(self._chandle, 1, 1, 1, self._voltage_range))
         if self._trigger_channel is not None:
             channel_index = {'A': 0, 'B': 1}[self._trigger_channel.upper()]
             # last two are offset (in percent) and auto delay (in ms)
             check_success(
-                ps.ps2000_set_trigger(self._chandle, channel_index, self._trigger_adc, int(not self._rising_edge),
-                                      self._trigger_offset, 0))
+                self._ps.ps2000_set_trigger(self._chandle, channel_index, self._trigger_adc, int(not self._rising_edge),
+                                      self._trigger_offset, self._auto_trigger_ms))
 
         self._timeInterval, self._timeUnits, self._oversample = ct.c_int32(), ct.c_int32(), ct.c_int16(1)
         maxSamplesReturn = ct.c_int32()
-        check_success(ps.ps2000_get_timebase(self._chandle, self._timebase, 8000, ct.byref(self._timeInterval),
+        check_success(self._ps.ps2000_get_timebase(self._chandle, self._timebase, 8000, ct.byref(self._timeInterval),
                                              ct.byref(self._timeUnits), self._oversample,
                                              ct.byref(maxSamplesReturn)))
         self._max_samples = maxSamplesReturn.value
 
+        # Capture buffers are allocated once here and written to directly by the driver on every capture
+        self._buffer_a = np.zeros(self._max_samples, dtype=np.int16)
+        self._buffer_b = np.zeros(self._max_samples, dtype=np.int16)
+        self._time_buffer = np.zeros(self._max_samples, dtype=np.int32)
+        # The sample times are the same for every capture with this configuration, so are only read from the driver
+        # on the first capture, and then every verify_time_axis_every captures if set
+        self._raw_times, self._time_axes, self._captures_since_time_check = None, {}, 0
+        self._overflow = ct.c_int16()
+        self._volts_per_adc = self._voltage_range_volts / max_adc.value * self._probe_comp
+
         # Set up display
         self._capture_time = self._max_samples * self._timeInterval.value * 1e-9  # Uses ns by default
         trigger_time = -self._capture_time * self._trigger_offset.value / 100
         if self._show_display:
+            # Only imported here so that pyglet is never loaded when there is no display
+            from PLL_Lib.display import ScopeDisplay
             self.display = ScopeDisplay(-self._voltage_range_volts * self._probe_comp,
                                         self._voltage_range_volts * self._probe_comp, -trigger_time,
                                         self._capture_time - trigger_time, self._time_text, self._max_samples,
                                         self._probe_comp,
                                         None if self._trigger_channel is None else self._trigger_voltage * self._probe_comp
-                                        , 0)
+                                        , 0, max_fps=self._display_fps)
+            # Scratch space for the voltages of each trace sent to the display by get_trace
+            self._display_buffers = np.empty((2, self._max_samples))
         return self
 
     @_check_with
-    def get_trace(self, status_text="Pass text using get_trace('status goes here')"):
+    def get_trace(self, status_text="Pass text using get_trace('status goes here')", out=None, dtype=np.float64,
+                  copy=True):
         '''
         Capture a single trace, either immediately or next time the set trigger triggers.
         :param status_text: A message to display in the bottom left.
-        :return: A tuple containing numpy arrays for the sample times, the A voltages, and the B voltages.
+        :param out: (Optional) A pair of float arrays, such as two rows of a preallocated 2D array, into which the
+        A and B voltages are written. This avoids allocating new arrays for every trace. Each must have one entry per sample.
+        The raw samples of the returned Trace are then overwritten by the next capture.
+        :param dtype: The float type of the voltages and times, np.float64 (Default) or np.float32, which uses half the memory.
+        :param copy: If True (Default), the raw samples are copied out of the scope's capture buffers, so each call
+        allocates two new int16 arrays and the Trace stays valid forever. If False, the raw samples of the returned Trace
+        are views into the preallocated capture buffers, so nothing but the Trace itself is allocated, but they are
+        overwritten by the next capture. Copy anything needed from it before capturing again.
+        :return: A Trace, which can be unpacked into a tuple containing numpy arrays for the sample times,
+        the A voltages, and the B voltages. It also holds the raw int16 samples as trace.raw_a and trace.raw_b, and only
+        calculates the voltages when they are first used. The sample times array is shared between traces and is read-only.
+        '''
+        if out is not None:
+            self._check_out(out)
+        if self._acquisition is not None:
+            (raw_a, raw_b), overflow, captime, timestamp = self._next_acquired()
+        else:
+            raw_a, raw_b = self._buffer_a, self._buffer_b
+            start = time.perf_counter_ns()
+            check_success(self._ps.ps2000PingUnit(self._chandle))
+            self._stats.record('ping', start)
+            overflow = self._capture(raw_a.ctypes.data, raw_b.ctypes.data)
+            timestamp, captime = self._clock(), None
+            if self._last_cap_time != -1:
+                captime = timestamp - self._last_cap_time
+            self._last_cap_time = timestamp
+
+        if overflow and not self._show_display:
+            warnings.warn('Overflow!')
+
+        start = time.perf_counter_ns()
+        if out is None and copy:
+            trace_a, trace_b = raw_a.copy(), raw_b.copy()
+        else:
+            if raw_a is not self._buffer_a:
+                np.copyto(self._buffer_a, raw_a), np.copyto(self._buffer_b, raw_b)
+            trace_a, trace_b = self._buffer_a, self._buffer_b
+        if self._acquisition is not None:
+            self._free_buffers.put((raw_a, raw_b))
+        dtype = dtype if out is None else out[0].dtype
+        trace = Trace(trace_a, trace_b, self._volts_per_adc, self._raw_times, time_units[self._timeUnits.value],
+                      overflow, timestamp, dtype=dtype, times=self._time_axis(dtype))
+        if out is not None:
+            trace.convert_into(out[0], out[1])
+        if self._show_display:
+            # The voltages are converted into the display's own buffers, so the trace still only converts them when
+            # they are used, and the conversion is timed separately from the display
+            display_a, display_b = out if out is not None else self._display_buffers
+            if out is None:
+                trace.convert_into(display_a, display_b, keep=False)
+            start = self._stats.record('convert', start)
+            self.display.set_status(status_text)
+            self.display.update(trace.times, display_a, display_b, captime, overflow)
+            self._stats.record('display', start)
+            self._update_stats_overlay()
+        else:
+            self._stats.record('convert', start)
+        return trace
+
+    @_check_with
+    def get_traces(self, n, raw=False, display_every=0, status_text="Capturing traces..."):
+        '''
+        Capture n traces one after another in a tight loop, much faster than calling get_trace n times.
+        All traces are stored together in 2D arrays with one row per trace.
+        :param n: (Non-optional) The number of traces to capture.
+        :param raw: If True, return the raw int16 ADC counts rather than float32 voltages. Multiply by
+        scope.volts_per_adc to convert them to volts. Default is False.
+        :param display_every: Update the display after every this many traces, or never during the loop if 0 (Default).
+        The last trace is always displayed.
+        :param status_text: A message to display in the bottom left.
+        :return: A TraceBatch named tuple containing the sample times (shared by all traces), the A and B voltages
+        as arrays of shape (n, samples), the time at which each trace was captured, and an array of booleans which
+        are True where a trace overflowed the voltage range. The times are from the backend's clock: time.time() for a
+        real picoscope, or the simulated time of a SimulatedPs2000.
+        '''
+        self._check_not_acquiring('get_traces')
+        if not (type(n) is int and n > 0):
+            raise er.InvalidTraceCountException(n)
+        if not (type(display_every) is int and display_every >= 0):
+            raise er.InvalidDisplayEveryException(display_every)
+        dtype = np.int16 if raw else np.float32
+        volts_A, volts_B = np.empty((n, self._max_samples), dtype=dtype), np.empty((n, self._max_samples), dtype=dtype)
+        timestamps, overflow = np.zeros(n), np.zeros(n, dtype=bool)
+        self._capture_rows(volts_A, volts_B, timestamps, overflow, raw, display_every, status_text)
+        return TraceBatch(self._time_axis(), volts_A, volts_B, timestamps, overflow)
+
+    @_check_with
+    def record(self, path, n_traces, display_every=1, status_text="Recording traces...", code=None):
+        '''
+        Capture n_traces traces straight to disk, so that recordings can be larger than memory and are not lost if the
+        program stops early. Each trace is written into its place in a memory-mapped file as it is captured.
+        The recording is kept in three files: path (which should end in .npy) holds the raw int16 ADC counts as an
+        array of shape (n_traces, 2, samples), path with .index.npy in place of .npy holds the time each trace
+        was captured on the backend's clock (time.time() for a real picoscope, the simulated time of a SimulatedPs2000),
+        NaN until it has been, whether it overflowed and the Arduino code, and path with .json in place of .npy holds the
+        sample times, voltage range, probe and trigger settings.
+        Existing files are overwritten.
+        :param path: (Non-optional) The file to save the traces to, eg 'run1.npy'.
+        :param n_traces: (Non-optional) The number of traces to capture.
+        :param display_every: Update the display after every this many traces, or never during the recording if 0.
+        Default is 1.
+        :param status_text: A message to display in the bottom left.
+        :param code: (Optional) The code sent to the Arduino for this recording, saved in the index so that traces can
+        be selected by it with PLL_Lib.Dataset.
+        :return: A Recording of the traces, as given by PLL_Lib.load_recording(path), which can be used at any time,
+        even while the recording is being made, to read the traces completed so far.
+        '''
+        self._check_not_acquiring('record')
+        if not (type(n_traces) is int and n_traces > 0):
+            raise er.InvalidTraceCountException(n_traces)
+        if not (type(display_every) is int and display_every >= 0):
+            raise er.InvalidDisplayEveryException(display_every)
+        data, index = create_recording(path, n_traces, self._max_samples, self._recording_metadata(), code)
+        try:
+            self._capture_rows(data[:, 0], data[:, 1], index['timestamp'], index['overflow'], True, display_every,
+                               status_text)
+        finally:
+            data.flush()
+            index.flush()
+            del data, index
+        return load_recording(path)
+
+    @_check_with
+    def archive_writer(self, path, chunk_traces=64, codec='zlib', level=None, workers=None):
+        '''
+        Create an ArchiveWriter to save traces to a compressed file, with the settings of the scope so that they can
+        be read back as Traces with ArchiveReader. Traces are compressed in other threads while capturing continues:
+        with scope.archive_writer('run1.pllarchive') as archive:
+            for i in range(1000):
+                archive.append_trace(scope.get_trace())
+        See ArchiveWriter for the arguments.
+        :return: An ArchiveWriter.
+        '''
+        # Only imported here, as the archive's compression modules take longer to import than the rest of the scope
+        from PLL_Lib.archive import ArchiveWriter
+        return ArchiveWriter(path, self._max_samples, 2, chunk_traces, codec, level, workers,
+                             self._recording_metadata())
+
+    @_check_with
+    def accumulate(self, n, accumulator=None, display_every=1, status_text="Averaging traces..."):
+        '''
+        Capture n traces, keeping only their pointwise mean, variance, minimum and maximum rather than the traces
+        themselves, so any number of traces can be averaged in the memory of one:
+        averages = scope.accumulate(100000)
+        plt.plot(averages.times, averages.mean('a'))
+        :param n: (Non-optional) The number of traces to capture.
+        :param accumulator: (Optional) A TraceAccumulator from an earlier call to add these traces to. Its results can be
+        read from another thread while traces are being added.
+        :param display_every: Update the display after every this many traces, or never during the loop if 0.
+        Default is 1.
+        :param status_text: A message to display in the bottom left.
+        :return: The TraceAccumulator, with methods mean, variance, std, min and max giving voltages at each sample time.
+        '''
+        self._check_not_acquiring('accumulate')
+        if not (type(n) is int and n > 0):
+            raise er.InvalidTraceCountException(n)
+        if not (type(display_every) is int and display_every >= 0):
+            raise er.InvalidDisplayEveryException(display_every)
+        if accumulator is None:
+            accumulator = TraceAccumulator(self._max_samples, self._volts_per_adc)
+        if self._show_display:
+            self.display.set_status(status_text)
+        check_success(self._ps.ps2000PingUnit(self._chandle))
+        raw_a, raw_b = self._buffer_a, self._buffer_b
+        last_display, last_display_index = self._clock(), -1
+        overflows = 0
+        for i in range(n):
+            overflow = self._capture(raw_a.ctypes.data, raw_b.ctypes.data)
+            start = time.perf_counter_ns()
+            accumulator.add(raw_a, raw_b, overflow=overflow)
+            self._stats.record('accumulate', start)
+            overflows += overflow
+            timestamp = self._clock()
+            if self._show_display and (i == n - 1 or display_every and (i + 1) % display_every == 0):
+                captime = (timestamp - last_display) / (i - last_display_index)
+                last_display, last_display_index = timestamp, i
+                start = time.perf_counter_ns()
+                self.display.update(self._time_axis(), raw_a * self._volts_per_adc, raw_b * self._volts_per_adc,
+                                    captime, overflow)
+                self._stats.record('display', start)
+                self._update_stats_overlay()
+        self._last_cap_time = timestamp
+        if accumulator.times is None:
+            accumulator.times = self._time_axis()
+        if overflows and not self._show_display:
+            warnings.warn(f'Overflow in {overflows} of {n} traces!')
+        return accumulator
+
+    @_check_with
+    def spectrum(self, window='hann'):
+        '''
+        A Spectrum for traces captured with this scope's settings, for example to find the VCO frequency:
+        spectrum = scope.spectrum()
+        trace = scope.get_trace()
+        vco_frequency = spectrum.peak_frequency(trace.volts_b)
+        amplitudes = spectrum.magnitude(trace.raw_b, scope.volts_per_adc)
+        The window and frequencies are calculated once and shared by every call with the same settings.
+        :param window: 'hann' (Default), 'hamming', 'blackman' or 'rectangular'. See Spectrum.
+        :return: A Spectrum, whose frequencies attribute holds the frequency of each entry of its results.
+        '''
+        return get_spectrum(self._max_samples, self._timeInterval.value * 1e-9, window)
+
+    def _recording_metadata(self):
+        # The settings saved with recordings and archives
+        if self._raw_times is None:
+            # The sample times are saved before any traces, so are read with one capture first
+            self._capture(self._buffer_a.ctypes.data, self._buffer_b.ctypes.data)
+        return {
+            'version': package_version(),
+            'created': time.time(),
+            'raw_times': self._raw_times.tolist(),
+            'time_unit': time_units[self._timeUnits.value],
+            'time_per_sample': self._time_text,
+            'volts_per_adc': self._volts_per_adc,
+            'voltage_range': self._voltage_range_volts,
+            'probe_comp': self._probe_comp,
+            'trigger_channel': self._trigger_channel,
+            'trigger_voltage': self._trigger_voltage if self._trigger_channel is not None else None,
+            'rising_edge': self._rising_edge if self._trigger_channel is not None else None,
+            'trigger_offset': -self._trigger_offset.value,
+            'auto_trigger_ms': self._auto_trigger_ms,
+        }
+
+    def _capture_rows(self, volts_A, volts_B, timestamps, overflow, raw, display_every, status_text):
+        # Captures one trace into each row of the given arrays, in order. Each timestamp is written last, once
+        # the rest of the row is complete.
+        n = len(timestamps)
+        if self._show_display:
+            self.display.set_status(status_text)
+        check_success(self._ps.ps2000PingUnit(self._chandle))
+        last_display, last_display_index = self._clock(), -1
+        for i in range(n):
+            if raw:
+                # Have the driver write straight into this trace's rows
+                overflow[i] = self._capture(volts_A[i].ctypes.data, volts_B[i].ctypes.data)
+            else:
+                overflow[i] = self._capture(self._buffer_a.ctypes.data, self._buffer_b.ctypes.data)
+                start = time.perf_counter_ns()
+                np.multiply(self._buffer_a, self._volts_per_adc, out=volts_A[i])
+                np.multiply(self._buffer_b, self._volts_per_adc, out=volts_B[i])
+                self._stats.record('convert', start)
+            timestamps[i] = self._clock()
+            if self._show_display and (i == n - 1 or display_every and (i + 1) % display_every == 0):
+                captime = (timestamps[i] - last_display) / (i - last_display_index)
+                last_display, last_display_index = timestamps[i], i
+                start = time.perf_counter_ns()
+                self.display.update(self._time_axis(), volts_A[i] * self._volts_per_adc if raw else volts_A[i],
+                                    volts_B[i] * self._volts_per_adc if raw else volts_B[i], captime, overflow[i])
+                self._stats.record('display', start)
+                self._update_stats_overlay()
+        self._last_cap_time = timestamps[-1]
+        if overflow.any() and not self._show_display:
+            warnings.warn(f'Overflow in {overflow.sum()} of {n} traces!')
+
+    @property
+    def volts_per_adc(self):
+        '''
+        The factor converting raw int16 ADC counts, such as those from get_traces(n, raw=True), to volts.
+        Includes the 10x probe compensation if enabled.
+        '''
+        return self._volts_per_adc
+
+    @property
+    def capture_duration(self):
+        '''
+        The time in seconds taken to capture each trace.
+        '''
+        return self._capture_time
+
+    def _time_axis(self, dtype=np.float64):
+        # Returns the shared, read-only sample times in seconds, calculated once per dtype
+        dtype = np.dtype(dtype)
+        if dtype not in self._time_axes:
+            axis = np.multiply(self._raw_times, dtype.type(time_units[self._timeUnits.value]), dtype=dtype)
+            axis.flags.writeable = False
+            self._time_axes[dtype] = axis
+        return self._time_axes[dtype]
+
+    @_check_with
+    def start_acquisition(self, queue_size=8, when_full='drop_oldest'):
         '''
-        oversample = ct.c_int16(1)
+        Start capturing continuously in a background thread. Each capture is started as soon as the previous one
+        has been transferred from the scope, so the scope keeps capturing while your code processes and displays traces.
+        Whilst running, get_trace and wait_for_key return the oldest trace waiting in the queue instead of capturing
+        one themselves. Stop with stop_acquisition, or by leaving the 'with' statement.
+        :param queue_size: The maximum number of captured traces waiting to be returned by get_trace. Default is 8.
+        :param when_full: What to do when the queue is full. 'drop_oldest' (Default) discards the oldest waiting
+        trace, so get_trace always returns recent data; the number discarded is counted in scope.dropped_traces.
+        'block' pauses capturing until get_trace takes a trace, so no traces are lost.
+        '''
+        if self._acquisition is not None:
+            return
+        if not (type(queue_size) is int and queue_size > 0):
+            raise er.InvalidTraceCountException(queue_size)
+        if when_full not in when_full_options:
+            raise er.InvalidWhenFullException(when_full, when_full_options)
+        # Raw buffers circulate between the acquisition thread and get_trace, so none are allocated per trace
+        self._free_buffers = queue.Queue()
+        for _ in range(queue_size + 2):
+            self._free_buffers.put((np.zeros(self._max_samples, dtype=np.int16),
+                                    np.zeros(self._max_samples, dtype=np.int16)))
+        self._acquired = queue.Queue(queue_size)
+        self._when_full = when_full
+        self._stop_acquiring = threading.Event()
+        self._acquisition_error = None
+        self.dropped_traces = 0
+        check_success(self._ps.ps2000PingUnit(self._chandle))
+        self._acquisition = threading.Thread(target=self._acquire, daemon=True)
+        self._acquisition.start()
+
+    def stop_acquisition(self):
+        '''
+        Stop capturing in the background, discarding any traces that have not been returned by get_trace.
+        A capture still waiting for the trigger is abandoned.
+        '''
+        if self._acquisition is None:
+            return
+        self._stop_acquiring.set()
+        # Abort any capture in progress, so that the acquisition thread is not left waiting for a trigger
+        self._ps.ps2000_stop(self._chandle)
+        self._acquisition.join(acquisition_stop_timeout)
+        if self._acquisition.is_alive():
+            warnings.warn(er.acquisition_stop_warning)
+        self._acquisition = None
+
+    def _acquire(self):
+        # Runs in the acquisition thread
+        last_time = self._clock()
+        try:
+            while not self._stop_acquiring.is_set():
+                try:
+                    buffers = self._free_buffers.get(timeout=acquisition_poll)
+                except queue.Empty:
+                    continue
+                overflow = self._capture(buffers[0].ctypes.data, buffers[1].ctypes.data, self._stop_acquiring)
+                if overflow is None:
+                    break
+                now = self._clock()
+                item, last_time = (buffers, overflow, now - last_time, now), now
+                if self._when_full == 'block':
+                    while not self._stop_acquiring.is_set():
+                        try:
+                            self._acquired.put(item, timeout=acquisition_poll)
+                            break
+                        except queue.Full:
+                            pass
+                    continue
+                while True:
+                    try:
+                        self._acquired.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            oldest = self._acquired.get_nowait()
+                        except queue.Empty:
+                            continue
+                        self._free_buffers.put(oldest[0])
+                        self.dropped_traces += 1
+        except Exception as e:
+            self._acquisition_error = e
+
+    def _next_acquired(self):
+        while True:
+            try:
+                return self._acquired.get(timeout=acquisition_poll)
+            except queue.Empty:
+                if self._acquisition_error is not None:
+                    error, self._acquisition_error = self._acquisition_error, None
+                    self.stop_acquisition()
+                    raise error
+
+    def _check_not_acquiring(self, function_name):
+        if self._acquisition is not None:
+            raise er.AcquisitionRunningException(function_name)
+
+    def _capture(self, address_a, address_b, stop=None):
+        # Runs a single block capture, with the driver writing the A and B samples to the given addresses.
+        # Returns whether either channel overflowed, or None if the stop event was set before the capture finished.
+        with self._driver_lock:
+            return self._capture_locked(address_a, address_b, stop)
+
+    def _capture_locked(self, address_a, address_b, stop=None):
         cmaxSamples = ct.c_int32(self._max_samples)
-        check_success(ps.ps2000PingUnit(self._chandle))
         timeIndisposedms = ct.c_int32()
-        check_success(
-            ps.ps2000_run_block(self._chandle, cmaxSamples, self._timebase, oversample, ct.byref(timeIndisposedms)))
-
-        # Check for data collection to finish using ps5000aIsReady
-        warned, start_time = False, time.time()
+        start = time.perf_counter_ns()
+        check_success(self._ps.ps2000_run_block(self._chandle, cmaxSamples, self._timebase, self._oversample,
+                                          ct.byref(timeIndisposedms)))
+        start = self._stats.record('run_block', start)
+
+        if not self._wait_until_ready(timeIndisposedms.value, stop):
+            self._ps.ps2000_stop(self._chandle)
+            return None
+        start = self._stats.record('wait', start)
+
+        self._captures_since_time_check += 1
+        if self._raw_times is None or 0 < self._verify_time_axis_every <= self._captures_since_time_check:
+            check_success(self._ps.ps2000_get_times_and_values(self._chandle, self._time_buffer.ctypes.data, address_a,
+                                                         address_b, None, None, ct.byref(self._overflow),
+                                                         self._timeUnits.value, cmaxSamples))
+            self._check_time_axis()
+        else:
+            check_success(self._ps.ps2000_get_values(self._chandle, address_a, address_b, None, None,
+                                               ct.byref(self._overflow), cmaxSamples))
+        self._stats.record('transfer', start)
+        self._stats.capture_done(self._overflow.value)
+        return self._overflow.value != 0
+
+    def stats(self):
+        '''
+        Timings of each phase of capturing traces so far, to find where the time goes when captures are slow.
+        The phases are ping, run_block, wait (for the trigger and the capture to finish), transfer (of the samples
+        from the scope), convert (to volts), display, and interval (between the end of one capture and the next).
+        :return: A dictionary containing the number of captures and overflows, the recent and overall captures per
+        second, and for each phase under 'phases' the count, and mean, median (p50), p99 and max times in microseconds.
+        '''
+        return self._stats.summary()
 
-        while ps.ps2000_ready(self._chandle) == 0:
-            if time.time() - start_time > warning_threshold and not warned:
+    def stats_json(self, path=None):
+        '''
+        :param path: (Optional) A file to save the stats to.
+        :return: scope.stats() as a JSON string, including a histogram of every time ever recorded for each phase,
+        where entry i counts the times between 2^i and 2^(i+1) ns.
+        '''
+        return self._stats.to_json(path)
+
+    def _update_stats_overlay(self):
+        if self._show_stats and time.time() - self._last_overlay > stats_overlay_interval:
+            self._last_overlay = time.time()
+            self.display.set_overlay(self._stats.overlay_text())
+
+    def _check_time_axis(self):
+        # Compares the times just read from the driver against the cached ones, replacing them if they differ
+        self._captures_since_time_check = 0
+        if self._raw_times is not None and np.array_equal(self._raw_times, self._time_buffer):
+            return
+        if self._raw_times is not None:
+            warnings.warn(er.time_axis_warning)
+        self._raw_times = self._time_buffer.copy()
+        self._raw_times.flags.writeable = False
+        self._time_axes = {}
+
+    def _check_out(self, out):
+        if len(out) != 2:
+            raise er.InvalidOutputArrayException(self._max_samples)
+        for arr in out:
+            if not (isinstance(arr, np.ndarray) and arr.shape == (self._max_samples,)
+                    and np.issubdtype(arr.dtype, np.floating)):
+                raise er.InvalidOutputArrayException(self._max_samples)
+
+    def _wait_until_ready(self, time_indisposed_ms, stop=None):
+        # Sleep through most of the time the driver expects the capture to take, then poll ps2000_ready with a
+        # growing interval, rather than spinning a whole core. Returns False if the stop event is set first.
+        # Waiting on the stop event, when there is one, sleeps the same but wakes as soon as it is set.
+        sleep = time.sleep if stop is None else stop.wait
+        start_time = time.perf_counter()
+        sleep(time_indisposed_ms * 1e-3 * expected_wait_fraction)
+        interval, warned = min_poll_interval, False
+        while self._ps.ps2000_ready(self._chandle) == 0:
+            if stop is not None and stop.is_set():
+                return False
+            waited = time.perf_counter() - start_time
+            if self._capture_timeout is not None and waited > self._capture_timeout:
+                self._ps.ps2000_stop(self._chandle)
+                raise er.CaptureTimeoutException(self._capture_timeout, self._trigger_channel is not None)
+            if waited > warning_threshold and not warned:
                 if self._trigger_channel is not None:
                     warnings.warn(er.trigger_warning(self._rising_edge, self._trigger_channel.upper()))
                 else:
                     warnings.warn(er.wait_warning)
                 warned = True
-        time_buffer = (ct.c_int32 * self._max_samples)()
-        bufferA = (ct.c_int16 * self._max_samples)()
-        bufferB = (ct.c_int16 * self._max_samples)()
-        overflow = ct.c_int16()
-
-        check_success(ps.ps2000_get_times_and_values(self._chandle, ct.byref(time_buffer), ct.byref(bufferA),
-                                                     ct.byref(bufferB), None, None,
-                                                     ct.byref(overflow), self._timeUnits.value, cmaxSamples))
-        captime = None
-        if self._last_cap_time != -1:
-            captime = time.time() - self._last_cap_time
-        self._last_cap_time = time.time()
-
-        if overflow.value != 0 and not self._show_display:
-            warnings.warn('Overflow!')
+            sleep(interval)
+            interval = min(2 * interval, self._max_poll_interval)
+        return True
 
-        arr_A, arr_B = np.array(bufferA, dtype=int), np.array(bufferB, dtype=int)
-        volts_A = arr_A * self._voltage_range_volts / max_adc.value * self._probe_comp
-        volts_B = arr_B * self._voltage_range_volts / max_adc.value * self._probe_comp
-        times = np.array(time_buffer) * time_units[self._timeUnits.value]
-        if self._show_display:
-            self.display.set_status(status_text)
-            self.display.update(times, volts_A, volts_B, captime, overflow.value != 0)
-        return times, volts_A, volts_B
+    @_check_with
+    def stream(self, sample_interval=1e-5, chunk_size=10000):
+        '''
+        Stream samples continuously from both channels, without the gaps between captures that get_trace has.
+        Use in a for loop, and break out of it to stop streaming:
+        for times, volts_A, volts_B in scope.stream(1e-5, 10000): ...
+        The trigger is not used while streaming, and the display is not updated.
+        If chunks are not consumed quickly enough the scope's buffer overruns and samples are lost. This is reported
+        with a warning and counted in scope.stream_overruns.
+        :param sample_interval: The time between samples in seconds. Default is 1e-5.
+        :param chunk_size: The number of samples in each chunk. Default is 10000.
+        :return: A generator of tuples containing numpy arrays for the sample times, the A voltages, and the B voltages.
+        The sample times carry on from one chunk to the next.
+        '''
+        self._check_not_acquiring('stream')
+        if not (isinstance(sample_interval, Number) and sample_interval > 0 and type(chunk_size) is int and chunk_size > 0):
+            raise er.InvalidStreamingParametersException(sample_interval, chunk_size)
+        interval_ns = max(1, int(round(sample_interval * 1e9)))
+        overview_buffer_size = max(chunk_size, min_overview_buffer_size)
+        # Samples are collected here by the driver callback until there are enough for a chunk
+        pending_a = np.zeros(chunk_size + 2 * overview_buffer_size, dtype=np.int16)
+        pending_b = np.zeros_like(pending_a)
+        filled, total = 0, 0
+
+        def on_values(buffers, n_values):
+            nonlocal filled
+            if filled + n_values > len(pending_a):
+                self._report_overrun()
+                return
+            pending_a[filled:filled + n_values] = np.ctypeslib.as_array(buffers[0], shape=(n_values,))
+            pending_b[filled:filled + n_values] = np.ctypeslib.as_array(buffers[2], shape=(n_values,))
+            filled += n_values
+
+        for _ in self._run_streaming(interval_ns, 1, overview_buffer_size, on_values):
+            while filled >= chunk_size:
+                times = (np.arange(chunk_size) + total) * (interval_ns * 1e-9)
+                volts_A = pending_a[:chunk_size] * self._volts_per_adc
+                volts_B = pending_b[:chunk_size] * self._volts_per_adc
+                pending_a[:filled - chunk_size] = pending_a[chunk_size:filled]
+                pending_b[:filled - chunk_size] = pending_b[chunk_size:filled]
+                filled -= chunk_size
+                total += chunk_size
+                yield times, volts_A, volts_B
+
+    @_check_with
+    def stream_envelope(self, sample_interval=1e-5, samples_per_aggregate=1000, buffer_size=1000):
+        '''
+        Stream continuously, keeping only the minimum and maximum voltage of each channel over every window of
+        samples_per_aggregate samples. The driver does the aggregation, and the result is kept in a fixed size
+        ring buffer, so memory use stays the same however long this runs. Use in a for loop:
+        for envelope in scope.stream_envelope(1e-5, 1000, 1000): ...
+        The same EnvelopeBuffer is yielded each time new windows arrive. Call envelope.envelope() to get arrays of
+        the window times and the A max, A min, B max and B min voltages, oldest first.
+        If show_display is enabled the envelope is drawn in place of the traces.
+        :param sample_interval: The time between samples in seconds. Default is 1e-5.
+        :param samples_per_aggregate: The number of samples in each min/max window. Default is 1000.
+        :param buffer_size: The number of windows kept. Older windows are overwritten. Default is 1000.
+        :return: A generator which repeatedly yields the EnvelopeBuffer.
+        '''
+        self._check_not_acquiring('stream_envelope')
+        if not (type(samples_per_aggregate) is int and samples_per_aggregate > 0):
+            raise er.InvalidStreamingParametersException(sample_interval, samples_per_aggregate)
+        if not (isinstance(sample_interval, Number) and sample_interval > 0 and type(buffer_size) is int and buffer_size > 0):
+            raise er.InvalidStreamingParametersException(sample_interval, buffer_size)
+        interval_ns = max(1, int(round(sample_interval * 1e9)))
+        envelope = EnvelopeBuffer(buffer_size, self._volts_per_adc, interval_ns * 1e-9 * samples_per_aggregate)
+
+        def on_values(buffers, n_values):
+            envelope.append(*(np.ctypeslib.as_array(buffers[i], shape=(n_values,)) for i in range(4)))
+
+        last_count = 0
+        for _ in self._run_streaming(interval_ns, samples_per_aggregate, min_overview_buffer_size, on_values):
+            if envelope.count == last_count:
+                continue
+            last_count = envelope.count
+            if self._show_display:
+                self.display.update_envelope(envelope)
+            yield envelope
+
+    def _run_streaming(self, interval_ns, samples_per_aggregate, overview_buffer_size, on_values):
+        # Starts streaming, then yields after each poll of the driver. on_values(buffers, n_values) is called with
+        # the driver's A max, A min, B max, B min buffers as they fill. Streaming stops when the generator is closed.
+        def callback(buffers, overflow, triggered_at, triggered, auto_stop, n_values):
+            on_values(buffers, n_values)
+
+        # The callback object must be kept alive while the driver may call it
+        c_callback = self._ps.GetOverviewBuffersMaxMin(callback)
+        check_success(self._ps.ps2000_run_streaming_ns(self._chandle, interval_ns, STREAMING_TIME_UNITS,
+                                                 4 * overview_buffer_size * samples_per_aggregate, 0,
+                                                 samples_per_aggregate, overview_buffer_size))
+        poll_time = min(overview_buffer_size * samples_per_aggregate * interval_ns * 1e-9 / 4, max_streaming_poll)
+        overrun = ct.c_int16()
+        self.stream_overruns = 0
+        try:
+            while True:
+                check_success(self._ps.ps2000_get_streaming_last_values(self._chandle, c_callback))
+                check_success(self._ps.ps2000_overview_buffer_status(self._chandle, ct.byref(overrun)), errValue=1)
+                if overrun.value != 0:
+                    self._report_overrun()
+                yield
+                time.sleep(poll_time)
+        finally:
+            self._ps.ps2000_stop(self._chandle)
+
+    def _report_overrun(self):
+        self.stream_overruns += 1
+        warnings.warn(er.stream_overrun_warning)
 
     @_check_with
     def wait_for_key(self,key, status = "Provide message using wait_for_key('KEY', 'status goes here')"):
@@ -241,17 +889,17 @@ class Picoscope:
         Run the picoscope continuously until the given key is pressed.
         :param key: (Non-optional) A string containing a single letter of the alphabet other than q.
         :param status: A message to display whilst waiting.
-        :return: The first set of sample data after the key is pressed.
+        :return: The first Trace captured after the key is pressed, which unpacks like get_trace's.
         '''
         if not self._show_display:
             raise er.NoGUIException('wait_for_key')
         if not (type(key) is str and len(key) == 1 and ord('a') <= ord(key.lower()) <= ord('z') and key.lower() != 'q'):
             raise er.InvalidKeyExeption(key)
         self.display.wait_for_keycode(ord(key.lower()))
-        times, va, vb = self.get_trace(f"Waiting for key '{key.lower()}'. {status}")
+        trace = self.get_trace(f"Waiting for key '{key.lower()}'. {status}")
         while not self.display.done_waiting:
-            times, va, vb = self.get_trace(f"Waiting for key '{key.lower()}'. {status}")
-        return times, va, vb
+            trace = self.get_trace(f"Waiting for key '{key.lower()}'. {status}")
+        return trace
 
 
     @_check_with
@@ -271,6 +919,49 @@ class Picoscope:
         if not (isinstance(frequency,Number) and 0 <= frequency <= MAX_FREQUENCY):
             raise er.InvalidFrequencyException(frequency, MAX_FREQUENCY)
 
+        self._set_sig_gen(wavetype, min_voltage, max_voltage, frequency, frequency, 0, 0, 0, 0)
+        self._sweep = None
+
+    @_check_with
+    def set_signal_generator_sweep(self, start_frequency, stop_frequency, increment, dwell_time, sweep_type='UP',
+                                   sweeps=0, wavetype='SQUARE', min_voltage=-2, max_voltage=2):
+        '''
+        Activate the signal generator, sweeping its frequency by itself in steps of increment Hz, each lasting
+        dwell_time seconds, so that a response can be measured at every frequency in one run of captures:
+        sweep = scope.set_signal_generator_sweep(100, 10000, 100, 0.5)
+        batch = scope.get_traces(500)
+        frequencies = scope.sweep_frequencies(batch.timestamps)
+        :param start_frequency: (Non-optional) The lowest frequency in Hz, between 0 and 100,000.
+        :param stop_frequency: (Non-optional) The highest frequency in Hz, between start_frequency and 100,000.
+        :param increment: (Non-optional) The step between frequencies in Hz.
+        :param dwell_time: (Non-optional) The time spent at each frequency in seconds.
+        :param sweep_type: 'UP' (Default), from start_frequency to stop_frequency, 'DOWN', from stop_frequency to
+        start_frequency, 'UPDOWN', up then back down, or 'DOWNUP', down then back up.
+        :param sweeps: The number of sweeps. Default is 0, sweeping continuously.
+        :param wavetype, min_voltage, max_voltage: As for set_signal_generator.
+        :return: A SweepSchedule, which gives the frequency the generator was producing at any time since, such as
+        when each trace was captured. It is also used by sweep_frequencies.
+        '''
+        if not (all(isinstance(arg, Number) for arg in (start_frequency, stop_frequency, increment, dwell_time))
+                and 0 <= start_frequency < stop_frequency <= MAX_FREQUENCY
+                and 0 < increment <= stop_frequency - start_frequency and dwell_time > 0):
+            raise er.InvalidSweepException(start_frequency, stop_frequency, increment, dwell_time, MAX_FREQUENCY)
+
+        if not sweep_type in sweep_type_options:
+            raise er.InvalidSweepTypeException(sweep_type, sweep_type_options.keys())
+
+        if not (type(sweeps) is int and sweeps >= 0):
+            raise er.InvalidSweepCountException(sweeps)
+
+        self._set_sig_gen(wavetype, min_voltage, max_voltage, start_frequency, stop_frequency, increment, dwell_time,
+                          sweep_type_options[sweep_type], sweeps)
+        # The sweep starts as the driver returns
+        self._sweep = SweepSchedule(start_frequency, stop_frequency, increment, dwell_time, sweep_type, sweeps,
+                                    start_time=self._clock())
+        return self._sweep
+
+    def _set_sig_gen(self, wavetype, min_voltage, max_voltage, start_frequency, stop_frequency, increment, dwell_time,
+                     sweep_type, sweeps):
         if not wavetype in waveform_options:
             raise er.InvalidWavetypeException(wavetype,waveform_options.keys())
 
@@ -281,15 +972,30 @@ class Picoscope:
 
         offset_microvolts = ct.c_int32(int(1e6 * (min_voltage + max_voltage)/2))
         pk_to_pk_microvolts = ct.c_uint32(int(1e6 * (max_voltage - min_voltage)))
-        frequency = ct.c_float(frequency)
-        check_success(ps.ps2000_set_sig_gen_built_in(self._chandle,offset_microvolts,pk_to_pk_microvolts,wave_index,
-                                                     frequency,frequency,
-                                                     ct.c_float(0),ct.c_float(0),
-                                                     ct.c_int32(0),ct.c_uint32(0)))
+        with self._driver_lock:
+            check_success(self._ps.ps2000_set_sig_gen_built_in(self._chandle,offset_microvolts,pk_to_pk_microvolts,wave_index,
+                                                         ct.c_float(start_frequency),ct.c_float(stop_frequency),
+                                                         ct.c_float(increment),ct.c_float(dwell_time),
+                                                         ct.c_int32(sweep_type),ct.c_uint32(sweeps)))
+
+    def sweep_frequencies(self, timestamps, margin=0.0):
+        '''
+        The frequency of the signal generator's sweep during each trace, from their timestamps.
+        :param timestamps: (Non-optional) The timestamp of each trace, such as Trace.timestamp, TraceBatch.timestamps or
+        Dataset.timestamps.
+        :param margin: Extra time in seconds before each trace which must also be at the same frequency, to allow for the
+        time taken to transfer it. Default is 0.
+        :return: The frequency in Hz of each trace, or NaN for traces captured before the sweep started or while the
+        generator changed frequency.
+        '''
+        if self._sweep is None:
+            raise er.NoSweepException()
+        return self._sweep.block_frequencies(timestamps, self._capture_time, margin)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        stopStatus = ps.ps2000_stop(self._chandle)
-        closeStatus = ps.ps2000_close_unit(self._chandle)
+        self.stop_acquisition()
+        stopStatus = self._ps.ps2000_stop(self._chandle)
+        closeStatus = self._ps.ps2000_close_unit(self._chandle)
         if stopStatus == 0 or closeStatus == 0:
             warnings.warn(er.close_warning)
         if self._show_display:
@@ -16,7 +16,8 @@ path = os.path.join(dir, "ps2000.dll")
 
 class Ps2000lib(Library):
     def __init__(self):
-        super(Ps2000lib, self).__init__("ps2000",path)
+        # The dll is only loaded when a scope is first connected, so importing PLL_Lib does not need it
+        super(Ps2000lib, self).__init__("ps2000", path, lazy=True)
 
 
 ps2000 = Ps2000lib()
@@ -246,6 +247,22 @@ doc = """ int16_t ps2000_get_streaming_last_values
     ); """
 ps2000.make_symbol("_get_streaming_last_values", "ps2000_get_streaming_last_values", c_int16, [c_int16, c_void_p], doc)
 
+doc = """ void my_get_overview_buffers
+    (
+        int16_t  **overviewBuffers,
+        int16_t    overflow,
+        uint32_t   triggeredAt,
+        int16_t    triggered,
+        int16_t    auto_stop,
+        uint32_t   nValues
+    );
+    overviewBuffers holds the max and min buffers for each channel in the order A max, A min, B max, B min.
+    Define a python function accepting these arguments and pass it to the constructor of this type. """
+_callback_factory = WINFUNCTYPE if sys.platform == 'win32' else CFUNCTYPE
+ps2000.GetOverviewBuffersMaxMin = _callback_factory(None, POINTER(POINTER(c_int16)), c_int16, c_uint32, c_int16,
+                                                    c_int16, c_uint32)
+ps2000.GetOverviewBuffersMaxMin.__doc__ = doc
+
 doc = """ int16_t ps2000_overview_buffer_status
     (
         int16_t  handle,
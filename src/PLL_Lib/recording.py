@@ -0,0 +1,103 @@
+import json
+import os
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib.trace import Trace
+
+# Each trace has an entry in the index, whose timestamp stays NaN until the trace has been written, along with the
+# Arduino code it was recorded with, or no_code
+index_dtype = np.dtype([('timestamp', np.float64), ('overflow', np.bool_), ('code', np.int64)])
+no_code = np.iinfo(np.int64).min
+
+
+def recording_paths(path):
+    '''
+    A recording is kept in three files next to each other: the traces, the index of when each was captured, and the
+    metadata. For path 'run.npy' or 'run' these are 'run.npy', 'run.index.npy' and 'run.json'. The metadata is kept
+    in its own file rather than in the header of the .npy, since np.load refuses .npy headers with any other entries,
+    so the three files must be kept together.
+    :return: A tuple of the three paths.
+    '''
+    base = path[:-len('.npy')] if path.endswith('.npy') else path
+    return base + '.npy', base + '.index.npy', base + '.json'
+
+
+def create_recording(path, n_traces, samples, metadata, code=None):
+    '''
+    Create the files of a recording, with space for n_traces traces. Used by Picoscope.record.
+    :param metadata: A dictionary of the settings of the scope, which must include raw_times, time_unit and volts_per_adc.
+    :param code: (Optional) The Arduino code every trace is recorded with.
+    :return: Memory-mapped arrays of the traces, of shape (n_traces, 2, samples), and of the index.
+    '''
+    data_path, index_path, metadata_path = recording_paths(path)
+    data = np.lib.format.open_memmap(data_path, mode='w+', dtype=np.int16, shape=(n_traces, 2, samples))
+    index = np.lib.format.open_memmap(index_path, mode='w+', dtype=index_dtype, shape=(n_traces,))
+    index['timestamp'] = np.nan
+    index['code'] = no_code if code is None else code
+    index.flush()
+    with open(metadata_path, 'w') as f:
+        json.dump(dict(metadata, n_traces=n_traces, samples=samples), f)
+    return data, index
+
+
+class Recording:
+    def __init__(self, path):
+        '''
+        Open a recording made by Picoscope.record, which can be used while it is still being made or if it was never
+        finished. Only the traces which were completely written are included.
+        The traces are read from disk as they are used, so recordings larger than memory can be opened.
+        :param path: The path given to Picoscope.record.
+        '''
+        data_path, index_path, metadata_path = recording_paths(path)
+        if not os.path.exists(data_path):
+            raise er.RecordingNotFoundException(path)
+        for needed in (index_path, metadata_path):
+            if not os.path.exists(needed):
+                raise er.MissingRecordingFileException(data_path, needed)
+        with open(metadata_path) as f:
+            self.metadata = json.load(f)
+        index = np.load(index_path, mmap_mode='r')
+        # Traces are written in order, so the completed ones are those before the first without a timestamp
+        incomplete = np.flatnonzero(np.isnan(index['timestamp']))
+        n = incomplete[0] if len(incomplete) else len(index)
+        self.timestamps, self.overflow = np.array(index['timestamp'][:n]), np.array(index['overflow'][:n])
+        self.codes = np.array(index['code'][:n]) if 'code' in index.dtype.names else np.full(n, no_code)
+        self.raw = np.load(data_path, mmap_mode='r')[:n]
+        self.volts_per_adc = self.metadata['volts_per_adc']
+        self.raw_times = np.array(self.metadata['raw_times'], dtype=np.int32)
+        self.time_unit = self.metadata['time_unit']
+        self.times = self.raw_times * self.time_unit
+        self.times.flags.writeable = False
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, i):
+        '''
+        :return: The i-th trace as a Trace.
+        '''
+        raw = self.raw[i]
+        return Trace(raw[0], raw[1], self.volts_per_adc, self.raw_times, self.time_unit, bool(self.overflow[i]),
+                     float(self.timestamps[i]), times=self.times)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def voltages_a(self):
+        '''All the channel A voltages, as an array of shape (traces, samples). Reads the whole recording into memory.'''
+        return self.raw[:, 0] * self.volts_per_adc
+
+    @property
+    def voltages_b(self):
+        '''All the channel B voltages, as an array of shape (traces, samples). Reads the whole recording into memory.'''
+        return self.raw[:, 1] * self.volts_per_adc
+
+
+def load_recording(path):
+    '''
+    :param path: The path given to Picoscope.record.
+    :return: A Recording of the traces which were completely written.
+    '''
+    return Recording(path)
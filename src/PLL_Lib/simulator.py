@@ -0,0 +1,412 @@
+"""
+A simulated PicoScope 2000 series driver, written in Python with numpy, for using and benchmarking PLL_Lib without a
+picoscope or the Windows driver. Use it with Picoscope(backend='simulator'), or pass a SimulatedPs2000 to choose the
+signals, e.g. Picoscope(backend=SimulatedPs2000(vco_free_frequency=1200, lock_time=0.2)).
+
+Channel A shows the signal generator output, the reference of the phase locked loop, and channel B the output of a
+voltage controlled oscillator (VCO) locking onto it. The same functions as the real driver are provided, taking the same
+arguments, and follow its timebase, voltage range, trigger and streaming behaviour.
+"""
+
+import ctypes as ct
+import functools
+import time
+import types
+import numpy as np
+from PLL_Lib.library import Library
+from PLL_Lib.ps2000 import ps2000
+from PLL_Lib.sweep import SweepSchedule, sweep_type_options
+
+# The real driver gives a sample interval of 5ns * 2^timebase
+base_interval_ns = 5
+max_timebase = 21
+memory = 8000
+max_adc = 32767
+# PS2000_NONE, the trigger source for no trigger
+no_trigger = 5
+# Give up looking for a trigger event after this many capture lengths of signal, so a trigger which never fires
+# leaves the capture waiting as the real scope would
+trigger_search_captures = 200
+handle = 1
+# The same random timing errors are used for each cycle every time it is generated, so that a cycle looks the same
+# when searching for the trigger as when it is captured
+jitter_table_size = 4096
+unit_info = {
+    0: 'Simulated',
+    1: 'Simulated',
+    2: '1',
+    3: '2204A',
+    4: 'SIM00/000',
+    5: '01Jan00',
+    6: '0',
+    7: 'Simulated',
+}
+
+waveforms = {
+    0: lambda x: np.sin(2 * np.pi * x),  # SINE
+    1: lambda x: np.where(x < 0.5, 1.0, -1.0),  # SQUARE
+    2: lambda x: 1 - 4 * np.abs(x - 0.5),  # TRIANGLE
+    3: lambda x: 2 * x - 1,  # RAMP_UP
+    4: lambda x: 1 - 2 * x,  # RAMP_DOWN
+    5: lambda x: np.zeros_like(x),  # CONSTANT_VOLTAGE, only the offset
+    6: lambda x: 2 * np.exp(-0.5 * ((x - 0.5) / 0.1) ** 2) - 1,  # GAUSSIAN
+    7: lambda x: np.sinc(16 * (x - 0.5)),  # SINC
+    8: lambda x: 2 * np.abs(np.sin(np.pi * x)) - 1,  # HALF_SINE
+}
+
+
+class SimulatedPs2000(Library):
+    def __init__(self, reference_frequency=1e3, reference_amplitude=0.8, vco_free_frequency=None, multiplier=1,
+                 vco_amplitude=0.8, vco_offset=0, phase_offset=0, lock_time=0.05, jitter=1e-6, noise=5e-3,
+                 latency=5e-3, transfer_rate=2e6, realtime=True, seed=None):
+        '''
+        A drop in replacement for the ps2000 driver. All arguments are optional.
+        :param reference_frequency: The frequency in Hz of the reference on channel A until the signal generator is set.
+        Default is 1e3.
+        :param reference_amplitude: The amplitude in volts of the reference until the signal generator is set. Default is 0.8.
+        :param vco_free_frequency: The frequency in Hz of the VCO when first connected, before it has locked. Default is None,
+        starting locked.
+        :param multiplier: The ratio of the VCO frequency to the reference frequency when locked. Default is 1.
+        :param vco_amplitude: The amplitude in volts of the VCO square wave. Default is 0.8.
+        :param vco_offset: The voltage the VCO square wave is centred on. Default is 0.
+        :param phase_offset: The phase in radians by which the VCO leads the reference when locked. Default is 0.
+        :param lock_time: The time constant in seconds of the VCO locking onto a new reference frequency, which it does as
+        a critically damped loop. 0 locks instantly. Default is 0.05.
+        :param jitter: The standard deviation in seconds of the timing of each VCO cycle. Default is 1e-6.
+        :param noise: The standard deviation in volts of the noise added to every sample. Default is 5e-3.
+        :param latency: The time in seconds the scope takes to be ready after each capture. Default is 5e-3.
+        :param transfer_rate: The number of samples per second transferred from the scope by ps2000_get_values.
+        Default is 2e6.
+        :param realtime: If True (Default), captures take as long as they would on the real scope, and the signals change
+        in real time. If False, every call returns immediately and the signals are generated for a simulated clock
+        which advances by the length of each capture, for benchmarking the rest of PLL_Lib.
+        :param seed: (Optional) The seed for the random jitter and noise.
+        '''
+        super(SimulatedPs2000, self).__init__("ps2000 simulator", "simulated", lazy=True)
+        self.settings = dict(reference_frequency=reference_frequency, reference_amplitude=reference_amplitude,
+                             vco_free_frequency=vco_free_frequency, multiplier=multiplier, vco_amplitude=vco_amplitude,
+                             vco_offset=vco_offset, phase_offset=phase_offset, lock_time=lock_time, jitter=jitter,
+                             noise=noise, latency=latency, transfer_rate=transfer_rate, realtime=realtime, seed=seed)
+        # The same constants, callback type and functions as the real driver
+        for name, value in vars(ps2000).items():
+            if name.isupper() or name == 'GetOverviewBuffersMaxMin':
+                setattr(self, name, value)
+        # Only the functions which are simulated are bound, so using any other gives an AttributeError naming it
+        self.symbols = [symbol for symbol in ps2000.symbols if hasattr(_SimulatedScope, symbol[1])]
+        self.scope = None
+
+    def _load(self):
+        # Stands in for the loaded dll: the C functions of the driver which a _SimulatedScope implements
+        self.scope = _SimulatedScope(self.PICO_VOLTAGE_RANGE, **self.settings)
+        functions = {}
+        for _, c_name, _, _, _ in self.symbols:
+            # partial objects can be given the restype and argtypes that make_symbol sets, unlike methods
+            functions[c_name] = functools.partial(getattr(self.scope, c_name))
+        return types.SimpleNamespace(**functions)
+
+    def clock(self):
+        '''
+        The current time on the simulated clock, as a time.time(). Picoscope timestamps its traces with this, so that
+        they give the times at which the simulated signals were captured even when realtime is False and the simulated
+        clock runs ahead of the real one.
+        '''
+        if self.scope is None:
+            return time.time()
+        return self.scope._epoch + self.scope._now()
+
+
+def _value(arg):
+    # The python value of an argument, which may be a ctypes object
+    return arg.value if hasattr(arg, 'value') and not isinstance(arg, np.ndarray) else arg
+
+
+def _set(reference, value):
+    # Set the value pointed to by a byref() or pointer() argument
+    if reference is None:
+        return
+    target = reference._obj if hasattr(reference, '_obj') else reference.contents
+    target.value = value
+
+
+def _array(address, n, dtype=np.int16):
+    # A numpy view of memory passed to the driver, or None for a NULL pointer
+    if address is None:
+        return None
+    if isinstance(address, np.ndarray):
+        return address[:n]
+    if hasattr(address, '_obj'):
+        address = ct.addressof(address._obj)
+    elif isinstance(address, ct.c_void_p):
+        address = address.value
+    elif not isinstance(address, int):
+        address = ct.addressof(address)
+    if not address:
+        return None
+    return np.frombuffer((ct.c_byte * (n * np.dtype(dtype).itemsize)).from_address(address), dtype=dtype)
+
+
+class _SimulatedScope:
+    # The state of the simulated scope, with a method for each C function of the driver that is simulated.
+    # Arguments arrive exactly as they are passed to the driver, without conversion by ctypes.
+    def __init__(self, voltage_ranges, reference_frequency, reference_amplitude, vco_free_frequency, multiplier,
+                 vco_amplitude, vco_offset, phase_offset, lock_time, jitter, noise, latency, transfer_rate, realtime,
+                 seed):
+        self._voltage_ranges = voltage_ranges
+        self._multiplier, self._vco_amplitude, self._vco_offset = multiplier, vco_amplitude, vco_offset
+        self._phase_offset, self._lock_time, self._jitter, self._noise = phase_offset, lock_time, jitter, noise
+        self._latency, self._transfer_rate, self._realtime = latency, transfer_rate, realtime
+        self._rng = np.random.default_rng(seed)
+        self._jitter_table = self._rng.standard_normal(jitter_table_size)
+        self._start, self._clock = time.perf_counter(), 0.0
+        # The time.time() at which the simulated clock started, so that it can give times in the same form
+        self._epoch = time.time()
+        self._open = False
+        self._channels = {0: (True, 6), 1: (True, 6)}
+        self._trigger = (no_trigger, 0, 0, 0, 0)
+        self._capture, self._streaming = None, None
+        # The signal generator: offset, amplitude, waveform and frequency, from time _reference_start with phase
+        # _reference_phase
+        self._wave, self._offset, self._amplitude = 1, 0.0, reference_amplitude
+        self._frequency, self._reference_start, self._reference_phase = reference_frequency, 0.0, 0.0
+        # While sweeping, the SweepSchedule of the generator, timed by the simulated clock from _reference_start
+        self._sweep = None
+        # The VCO phase is the locked phase plus an error (a + b * t) * exp(-t / lock_time), t being the time since
+        # _lock_start, which starts it at its free running frequency and decays as it locks
+        self._lock_start, self._lock_a, self._lock_b = 0.0, 0.0, 0.0
+        if vco_free_frequency is not None and lock_time > 0:
+            self._lock_b = 2 * np.pi * (vco_free_frequency - multiplier * reference_frequency)
+
+    def _now(self):
+        return time.perf_counter() - self._start if self._realtime else self._clock
+
+    # --- Signals ---
+
+    def _reference_phase_at(self, t):
+        if self._sweep is not None:
+            return self._reference_phase + 2 * np.pi * self._sweep.cycles_at(t)
+        return self._reference_phase + 2 * np.pi * self._frequency * (t - self._reference_start)
+
+    def _reference_frequency_at(self, t):
+        return self._frequency if self._sweep is None else float(self._sweep.frequency_at(t))
+
+    def _lock_error(self, t):
+        if self._lock_time <= 0:
+            return 0.0 * t, 0.0 * t
+        s = np.maximum(t - self._lock_start, 0)
+        decay = np.exp(-s / self._lock_time)
+        error = (self._lock_a + self._lock_b * s) * decay
+        rate = (self._lock_b - (self._lock_a + self._lock_b * s) / self._lock_time) * decay
+        return error, rate
+
+    def _vco_phase_at(self, t):
+        return self._multiplier * self._reference_phase_at(t) + self._phase_offset + self._lock_error(t)[0]
+
+    def _signals(self, t):
+        # The voltages of channels A and B at the times t
+        x = np.mod(self._reference_phase_at(t) / (2 * np.pi), 1)
+        a = self._offset + self._amplitude * waveforms.get(self._wave, waveforms[0])(x)
+        vco_cycles = self._vco_phase_at(t) / (2 * np.pi)
+        if self._jitter > 0:
+            cycle = np.floor(vco_cycles).astype(np.int64) % jitter_table_size
+            vco_cycles = vco_cycles + self._jitter_table[cycle] * self._jitter * self._multiplier * self._frequency
+        b = self._vco_offset + self._vco_amplitude * np.where(np.mod(vco_cycles, 1) < 0.5, 1.0, -1.0)
+        if self._noise > 0:
+            a = a + self._rng.normal(0, self._noise, len(t))
+            b = b + self._rng.normal(0, self._noise, len(t))
+        return a, b
+
+    def _to_adc(self, channel, volts):
+        # The ADC counts of a channel, and whether it went outside the voltage range
+        enabled, voltage_range = self._channels[channel]
+        if not enabled:
+            return np.zeros(len(volts), dtype=np.int16), False
+        full_scale = self._voltage_ranges[voltage_range]
+        counts = np.rint(volts * (max_adc / full_scale))
+        overflow = bool(np.abs(volts).max(initial=0) > full_scale)
+        return np.clip(counts, -max_adc, max_adc).astype(np.int16), overflow
+
+    def _sample(self, t):
+        a, b = self._signals(t)
+        (a, overflow_a), (b, overflow_b) = self._to_adc(0, a), self._to_adc(1, b)
+        return a, b, overflow_a | overflow_b << 1
+
+    def _find_trigger(self, start, n, dt):
+        # The time of the first trigger event after start, or None if there is none
+        source, threshold, direction, _, auto_trigger_ms = self._trigger
+        if source == no_trigger:
+            return start
+        t = start
+        for _ in range(trigger_search_captures):
+            samples = self._sample(t + np.arange(n) * dt)[source]
+            below = samples < threshold if direction == 0 else samples > threshold
+            crossings = np.flatnonzero(below[:-1] & ~below[1:])
+            if len(crossings):
+                return t + (crossings[0] + 1) * dt
+            if auto_trigger_ms and t + n * dt - start >= auto_trigger_ms * 1e-3:
+                return start + auto_trigger_ms * 1e-3
+            t += (n - 1) * dt
+        return start + auto_trigger_ms * 1e-3 if auto_trigger_ms else None
+
+    # --- Driver functions ---
+
+    def ps2000_open_unit(self):
+        self._open = True
+        return handle
+
+    def ps2000_open_unit_async(self):
+        self._open = True
+        return 1
+
+    def ps2000_open_unit_progress(self, handle_ref, progress_ref):
+        _set(handle_ref, handle)
+        _set(progress_ref, 100)
+        return 1
+
+    def ps2000_close_unit(self, handle_arg):
+        self._open = False
+        return 1
+
+    def ps2000PingUnit(self, handle_arg):
+        return int(self._open)
+
+    def ps2000_flash_led(self, handle_arg):
+        return int(self._open)
+
+    def ps2000_get_unit_info(self, handle_arg, string, string_length, line):
+        text = unit_info.get(_value(line), '').encode()[:_value(string_length) - 1]
+        ct.memmove(string, text + b'\0', len(text) + 1)
+        return len(text)
+
+    def ps2000_set_channel(self, handle_arg, channel, enabled, dc, voltage_range):
+        if _value(channel) not in self._channels or _value(voltage_range) not in self._voltage_ranges:
+            return 0
+        self._channels[_value(channel)] = (bool(_value(enabled)), _value(voltage_range))
+        return 1
+
+    def ps2000_set_trigger(self, handle_arg, source, threshold, direction, delay, auto_trigger_ms):
+        self._trigger = tuple(_value(arg) for arg in (source, threshold, direction, delay, auto_trigger_ms))
+        return 1
+
+    def ps2000_get_timebase(self, handle_arg, timebase, no_of_samples, time_interval, time_units, oversample,
+                            max_samples):
+        if not 0 <= _value(timebase) <= max_timebase:
+            return 0
+        _set(time_interval, base_interval_ns * 2 ** _value(timebase))
+        _set(time_units, 2)  # PS2000_NS
+        _set(max_samples, memory)
+        return 1
+
+    def ps2000_run_block(self, handle_arg, no_of_values, timebase, oversample, time_indisposed_ms):
+        n, dt = min(_value(no_of_values), memory), base_interval_ns * 2 ** _value(timebase) * 1e-9
+        pre_trigger = int(round(-self._trigger[3] / 100 * n)) if self._trigger[0] != no_trigger else 0
+        start = self._now()
+        if self._capture is not None:
+            start = max(start, self._capture['end'])
+        trigger = self._find_trigger(start + pre_trigger * dt, n, dt)
+        self._capture = {'n': n, 'dt': dt, 'pre_trigger': pre_trigger, 'trigger': trigger,
+                         'end': None if trigger is None else trigger + (n - pre_trigger) * dt}
+        # Without realtime the capture is ready at once, so Picoscope should not sleep waiting for it
+        _set(time_indisposed_ms, int(n * dt * 1e3) if self._realtime else 0)
+        return 1
+
+    def ps2000_ready(self, handle_arg):
+        if self._capture is None or self._capture['end'] is None:
+            return 0
+        if self._realtime:
+            return int(self._now() >= self._capture['end'] + self._latency)
+        self._clock = max(self._clock, self._capture['end'])
+        return 1
+
+    def ps2000_stop(self, handle_arg):
+        if self._capture is not None and self._capture['end'] is None:
+            self._capture = None
+        self._streaming = None
+        return 1
+
+    def _transfer(self, buffer_a, buffer_b, overflow_ref, no_of_values, time_units=None, times=None):
+        if not self.ps2000_ready(handle):
+            return 0
+        capture = self._capture
+        n = min(_value(no_of_values), capture['n'])
+        offsets = (np.arange(n) - capture['pre_trigger']) * capture['dt']
+        a, b, overflow = self._sample(capture['trigger'] + offsets)
+        for address, samples in ((buffer_a, a), (buffer_b, b)):
+            out = _array(address, n)
+            if out is not None:
+                out[:] = samples
+        if times is not None:
+            # PS2000_FS = 0 up to PS2000_S = 5
+            unit = 10.0 ** (3 * _value(time_units) - 15)
+            _array(times, n, np.int32)[:] = np.rint(offsets / unit)
+        _set(overflow_ref, overflow)
+        if self._realtime and self._transfer_rate:
+            time.sleep(n * ((buffer_a is not None) + (buffer_b is not None)) / self._transfer_rate)
+        return n
+
+    def ps2000_get_values(self, handle_arg, buffer_a, buffer_b, buffer_c, buffer_d, overflow, no_of_values):
+        return self._transfer(buffer_a, buffer_b, overflow, no_of_values)
+
+    def ps2000_get_times_and_values(self, handle_arg, times, buffer_a, buffer_b, buffer_c, buffer_d, overflow,
+                                    time_units, no_of_values):
+        return self._transfer(buffer_a, buffer_b, overflow, no_of_values, time_units, times)
+
+    def ps2000_set_sig_gen_built_in(self, handle_arg, offset_voltage, pk_to_pk, wave_type, start_frequency,
+                                    stop_frequency, increment, dwell_time, sweep_type, sweeps):
+        now = self._now()
+        # Both phases carry on from where they are, and the VCO starts locking to the new frequency from its current one
+        vco_phase, vco_rate = self._vco_phase_at(now), self._lock_error(now)[1]
+        vco_frequency = self._multiplier * self._reference_frequency_at(now) + vco_rate / (2 * np.pi)
+        self._reference_phase, self._reference_start = self._reference_phase_at(now), now
+        self._offset, self._amplitude = _value(offset_voltage) * 1e-6, _value(pk_to_pk) * 1e-6 / 2
+        self._wave, self._frequency = _value(wave_type), _value(start_frequency)
+        self._sweep = None
+        if _value(stop_frequency) != self._frequency:
+            sweep_type = {value: name for name, value in sweep_type_options.items()}[_value(sweep_type)]
+            self._sweep = SweepSchedule(self._frequency, _value(stop_frequency), _value(increment), _value(dwell_time),
+                                        sweep_type, _value(sweeps), start_time=now)
+            self._frequency = self._sweep.frequencies[0]
+        self._lock_start = now
+        error = vco_phase - self._multiplier * self._reference_phase - self._phase_offset
+        self._lock_a = np.mod(error + np.pi, 2 * np.pi) - np.pi
+        self._lock_b = 2 * np.pi * (vco_frequency - self._multiplier * self._frequency) + self._lock_a / self._lock_time \
+            if self._lock_time > 0 else 0.0
+        return 1
+
+    def ps2000_run_streaming_ns(self, handle_arg, sample_interval, time_units, max_samples, auto_stop,
+                                no_of_samples_per_aggregate, overview_buffer_size):
+        unit = 10.0 ** (3 * _value(time_units) - 15)
+        self._streaming = {'dt': _value(sample_interval) * unit, 'aggregate': _value(no_of_samples_per_aggregate),
+                           'size': _value(overview_buffer_size), 'next': self._now(), 'overrun': False}
+        return 1
+
+    def ps2000_get_streaming_last_values(self, handle_arg, callback):
+        streaming = self._streaming
+        if streaming is None:
+            return 0
+        window = streaming['dt'] * streaming['aggregate']
+        if self._realtime:
+            available = int((self._now() - streaming['next']) / window)
+        else:
+            available = streaming['size']
+            self._clock = streaming['next'] + available * window
+        if available > streaming['size']:
+            # Samples the driver had no room for are lost
+            streaming['next'] += (available - streaming['size']) * window
+            streaming['overrun'], available = True, streaming['size']
+        if available == 0:
+            return 1
+        t = streaming['next'] + np.arange(available * streaming['aggregate']) * streaming['dt']
+        streaming['next'] += available * window
+        a, b, overflow = self._sample(t)
+        a, b = a.reshape(available, -1), b.reshape(available, -1)
+        buffers = [np.ascontiguousarray(x) for x in (a.max(axis=1), a.min(axis=1), b.max(axis=1), b.min(axis=1))]
+        pointers = (ct.POINTER(ct.c_int16) * 4)(*(x.ctypes.data_as(ct.POINTER(ct.c_int16)) for x in buffers))
+        callback(pointers, overflow, 0, 0, 0, available)
+        return 1
+
+    def ps2000_overview_buffer_status(self, handle_arg, previous_buffer_overrun):
+        overrun = self._streaming is not None and self._streaming['overrun']
+        if overrun:
+            self._streaming['overrun'] = False
+        _set(previous_buffer_overrun, int(overrun))
+        return 0
@@ -0,0 +1,164 @@
+'''
+Spectra of whole batches of traces. Everything which depends only on the number of samples, the time between them and
+the window, namely the window itself, the frequency of each bin and the normalisation, is calculated once and shared by
+every Spectrum with the same settings, so a spectrum of each trace costs little more than its FFT.
+'''
+import functools
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+
+default_chunk_traces = 256
+windows = {
+    'rectangular': np.ones,
+    'hann': np.hanning,
+    'hamming': np.hamming,
+    'blackman': np.blackman,
+}
+
+
+class Spectrum:
+    def __init__(self, samples, sample_interval, window='hann'):
+        '''
+        The amplitude and phase spectra of traces of samples samples sample_interval seconds apart. Use get_spectrum or
+        Picoscope.spectrum to share one between calls rather than creating it directly.
+        Each method takes one trace of shape (samples,) or many of shape (traces, samples), as voltages or as raw int16
+        ADC counts along with volts_per_adc, and returns one row per trace with an entry for each frequency.
+        :param samples: (Non-optional) The number of samples in each trace.
+        :param sample_interval: (Non-optional) The time between samples in seconds.
+        :param window: The window applied before the FFT: 'hann' (Default), which keeps the peaks of nearby frequencies
+        apart, 'hamming', 'blackman', which spreads each peak wider but lower leakage far from it, or 'rectangular'.
+        '''
+        if window not in windows:
+            raise er.InvalidWindowException(window, windows)
+        self.samples, self.sample_interval, self.window_name = samples, sample_interval, window
+        self.window = windows[window](samples)
+        self.frequencies = np.fft.rfftfreq(samples, sample_interval)
+        # Scales each bin so that a sine wave's peak has the height of its amplitude. The zero frequency, and the
+        # Nyquist frequency for an even number of samples, have no negative frequency to share with, so are halved.
+        self._normalisation = np.full(len(self.frequencies), 2 / self.window.sum())
+        self._normalisation[0] /= 2
+        if samples % 2 == 0:
+            self._normalisation[-1] /= 2
+        for array in (self.window, self.frequencies, self._normalisation):
+            array.flags.writeable = False
+        self.resolution = 1 / (samples * sample_interval)
+
+    def _batches(self, x, chunk_traces):
+        # The normalised complex spectrum of chunk_traces traces at a time, with the index of the first
+        windowed = np.empty((min(len(x), chunk_traces), self.samples))
+        for start in range(0, len(x), chunk_traces):
+            chunk = x[start:start + chunk_traces]
+            out = windowed[:len(chunk)]
+            np.multiply(chunk, self.window, out=out)
+            spectrum = np.fft.rfft(out, axis=-1)
+            spectrum *= self._normalisation
+            yield start, spectrum
+
+    def _as_traces(self, x):
+        # Whether x is a single trace, and x as an array of shape (traces, samples), checking the length of its traces
+        single = np.ndim(x) == 1
+        x = np.atleast_2d(x)
+        if x.shape[-1] != self.samples:
+            raise er.InvalidTraceLengthException(x.shape[-1], self.samples)
+        return single, x
+
+    def _run(self, x, outputs, chunk_traces):
+        # Applies each function in outputs to the spectra of x, chunk by chunk, filling an array for each
+        single, x = self._as_traces(x)
+        results = [np.empty((len(x), len(self.frequencies)), dtype=dtype) for _, dtype in outputs]
+        for start, spectrum in self._batches(x, chunk_traces):
+            for result, (function, _) in zip(results, outputs):
+                result[start:start + len(spectrum)] = function(spectrum)
+        return [result[0] for result in results] if single else results
+
+    def transform(self, x, volts_per_adc=1.0, chunk_traces=default_chunk_traces):
+        '''
+        :return: The complex spectrum, whose magnitude is the amplitude in volts at each frequency and whose angle is
+        the phase, relative to a cosine starting at the first sample.
+        '''
+        return self._run(x, [(lambda s: s * volts_per_adc, np.complex128)], chunk_traces)[0]
+
+    def magnitude(self, x, volts_per_adc=1.0, chunk_traces=default_chunk_traces):
+        '''
+        :return: The amplitude in volts at each frequency.
+        '''
+        return self._run(x, [(lambda s: _magnitude(s) * volts_per_adc, np.float64)], chunk_traces)[0]
+
+    def phase(self, x, chunk_traces=default_chunk_traces):
+        '''
+        :return: The phase in radians at each frequency, relative to a cosine starting at the first sample.
+        '''
+        return self._run(x, [(_phase, np.float64)], chunk_traces)[0]
+
+    def magnitude_and_phase(self, x, volts_per_adc=1.0, chunk_traces=default_chunk_traces):
+        '''
+        :return: A tuple of the amplitude in volts and the phase in radians at each frequency, from a single FFT.
+        '''
+        return tuple(self._run(x, [(lambda s: _magnitude(s) * volts_per_adc, np.float64), (_phase, np.float64)],
+                               chunk_traces))
+
+    def peak_frequency(self, x, min_frequency=0.0, chunk_traces=default_chunk_traces):
+        '''
+        :param min_frequency: Only frequencies above this are searched, to skip a DC offset or slow drift. Default is 0,
+        though the zero frequency itself is always skipped.
+        :return: The frequency in Hz of the highest peak of each trace, found to a fraction of a bin by fitting a
+        parabola to the logarithm of the peak and the bins either side.
+        '''
+        first = max(1, int(np.searchsorted(self.frequencies, min_frequency, side='right')))
+        single, x = self._as_traces(x)
+        peaks = np.empty(len(x))
+        for start, spectrum in self._batches(x, chunk_traces):
+            magnitude = _magnitude(spectrum[:, first:])
+            rows = np.arange(len(magnitude))
+            i = np.clip(np.argmax(magnitude, axis=-1), 1, magnitude.shape[-1] - 2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                left, centre, right = (np.log(magnitude[rows, i + k]) for k in (-1, 0, 1))
+                offset = 0.5 * (left - right) / (left - 2 * centre + right)
+            offset = np.where(np.isfinite(offset), np.clip(offset, -0.5, 0.5), 0)
+            peaks[start:start + len(magnitude)] = (first + i + offset) * self.resolution
+        return peaks[0] if single else peaks
+
+    def chunks(self, source, volts_per_adc=1.0, chunk_traces=default_chunk_traces):
+        '''
+        The amplitude spectra of many traces, chunk_traces at a time, so that a memory-mapped recording larger than
+        memory can be processed:
+        recording = load_recording('run1.npy')
+        for start, magnitudes in spectrum.chunks(recording.raw[:, 1], recording.volts_per_adc):
+            ...
+        :param source: (Non-optional) An array of shape (traces, samples), such as Recording.raw[:, 0].
+        :return: A generator of tuples of the index of the first trace in each chunk, and their amplitude spectra.
+        '''
+        for start in range(0, len(source), chunk_traces):
+            # Only this chunk of source is read from disk
+            chunk = np.asarray(source[start:start + chunk_traces])
+            yield start, self.magnitude(chunk, volts_per_adc, chunk_traces)
+
+    def average_magnitude(self, source, volts_per_adc=1.0, chunk_traces=default_chunk_traces):
+        '''
+        The root mean square amplitude at each frequency over many traces, read chunk_traces at a time. Unlike averaging
+        the traces first, this keeps signals whose phase differs between traces, such as noise and spurs.
+        :param source: (Non-optional) An array of shape (traces, samples), such as Recording.raw[:, 0].
+        :return: The amplitude in volts at each frequency.
+        '''
+        total, n = np.zeros(len(self.frequencies)), 0
+        for _, magnitudes in self.chunks(source, volts_per_adc, chunk_traces):
+            total += np.einsum('ij,ij->j', magnitudes, magnitudes)
+            n += len(magnitudes)
+        return np.sqrt(total / n)
+
+
+def _magnitude(spectrum):
+    # Much faster than np.abs, which takes care to avoid overflow that cannot happen here
+    return np.sqrt(spectrum.real ** 2 + spectrum.imag ** 2)
+
+
+def _phase(spectrum):
+    return np.arctan2(spectrum.imag, spectrum.real)
+
+
+@functools.lru_cache(maxsize=32)
+def get_spectrum(samples, sample_interval, window='hann'):
+    '''
+    :return: A Spectrum for these settings, shared with every other call with the same ones.
+    '''
+    return Spectrum(samples, sample_interval, window)
@@ -0,0 +1,128 @@
+import time
+import numpy as np
+
+default_window = 1000
+# Bucket i of a RollingHistogram counts durations between 2^i and 2^(i+1) ns
+histogram_buckets = 40
+
+
+class RollingHistogram:
+    def __init__(self, window=default_window):
+        '''
+        Durations in nanoseconds, using a fixed amount of memory however many are added. The most recent window
+        are kept for percentiles, and every duration ever added is counted in power-of-two buckets.
+        :param window: The number of recent durations used for percentiles. Default is 1000.
+        '''
+        self._recent = np.zeros(window, dtype=np.int64)
+        self._next = 0
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = np.zeros(histogram_buckets, dtype=np.int64)
+
+    def add(self, ns):
+        self._recent[self._next] = ns
+        self._next = (self._next + 1) % len(self._recent)
+        self.count += 1
+        self.total_ns += ns
+        self.max_ns = max(self.max_ns, ns)
+        self.buckets[min(max(int(ns).bit_length() - 1, 0), histogram_buckets - 1)] += 1
+
+    def recent(self):
+        '''
+        :return: The most recent durations, in no particular order.
+        '''
+        return self._recent[:min(self.count, len(self._recent))]
+
+    def percentile(self, q):
+        '''
+        :param q: A percentile between 0 and 100.
+        :return: The q-th percentile of the recent durations in ns, or nan if there are none.
+        '''
+        if self.count == 0:
+            return float('nan')
+        return float(np.percentile(self.recent(), q))
+
+    def summary(self):
+        '''
+        :return: A dictionary of the count, and the mean, median (p50), p99 and max durations in microseconds.
+        '''
+        recent = self.recent()
+        p50, p99 = np.percentile(recent, [50, 99]) if len(recent) else (float('nan'), float('nan'))
+        return {
+            'count': self.count,
+            'mean_us': self.total_ns / self.count / 1e3 if self.count else float('nan'),
+            'p50_us': float(p50) / 1e3,
+            'p99_us': float(p99) / 1e3,
+            'max_us': self.max_ns / 1e3,
+        }
+
+
+class CaptureStats:
+    def __init__(self, window=default_window):
+        '''
+        Timings of each phase of capturing traces, kept by Picoscope and returned by scope.stats().
+        :param window: The number of recent timings used for percentiles. Default is 1000.
+        '''
+        self._window = window
+        self.phases = {}
+        self.captures = 0
+        self.overflows = 0
+        self._start_ns = time.perf_counter_ns()
+        self._last_capture_ns = None
+
+    def record(self, phase, start_ns):
+        '''
+        Add the time since start_ns to the given phase.
+        :return: The current time.perf_counter_ns(), to use as the start of the next phase.
+        '''
+        now = time.perf_counter_ns()
+        if phase not in self.phases:
+            self.phases[phase] = RollingHistogram(self._window)
+        self.phases[phase].add(now - start_ns)
+        return now
+
+    def capture_done(self, overflow):
+        now = time.perf_counter_ns()
+        if self._last_capture_ns is not None:
+            self.record('interval', self._last_capture_ns)
+        self._last_capture_ns = now
+        self.captures += 1
+        self.overflows += bool(overflow)
+
+    def summary(self):
+        '''
+        :return: A dictionary with the number of captures and overflows, the capture rate over the recent captures and
+        over the whole run, and a summary of each phase (see RollingHistogram.summary).
+        '''
+        interval = self.phases.get('interval')
+        elapsed = (time.perf_counter_ns() - self._start_ns) / 1e9
+        return {
+            'captures': self.captures,
+            'overflows': self.overflows,
+            'captures_per_second': float(1e9 / np.mean(interval.recent())) if interval is not None else float('nan'),
+            'overall_captures_per_second': self.captures / elapsed if elapsed > 0 else float('nan'),
+            'phases': {name: histogram.summary() for name, histogram in list(self.phases.items())},
+        }
+
+    def to_json(self, path=None):
+        '''
+        :param path: (Optional) A file to write the JSON to.
+        :return: The summary, along with the power-of-two histogram of every phase, as a JSON string.
+        '''
+        import json
+        summary = self.summary()
+        for name, histogram in self.phases.items():
+            summary['phases'][name]['histogram_ns_log2'] = histogram.buckets.tolist()
+        text = json.dumps(summary, indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def overlay_text(self):
+        '''
+        :return: A short multi-line description of the median and p99 time of each phase.
+        '''
+        return '\n'.join(f"{name}: p50 {s['p50_us']:.0f}μs, p99 {s['p99_us']:.0f}μs"
+                         for name, s in self.summary()['phases'].items())
@@ -0,0 +1,126 @@
+'''
+The timing of a frequency sweep run by the signal generator, so that traces captured during the sweep can be matched to
+the frequency the generator was producing when they were captured.
+
+The generator steps through its frequencies by itself, spending dwell_time seconds on each, so a whole swept response
+can be measured by capturing continuously through one sweep and sorting the traces by frequency afterwards, rather than
+setting the signal generator again for every frequency.
+'''
+import time
+from numbers import Number
+import numpy as np
+import PLL_Lib.picoerrorhelp as er
+
+# The sweep types of ps2000_set_sig_gen_built_in
+sweep_type_options = {
+    'UP': 0,
+    'DOWN': 1,
+    'UPDOWN': 2,
+    'DOWNUP': 3,
+}
+
+
+class SweepSchedule:
+    def __init__(self, start_frequency, stop_frequency, increment, dwell_time, sweep_type='UP', sweeps=0,
+                 start_time=None):
+        '''
+        The frequencies of a sweep from start_frequency to stop_frequency in steps of increment Hz, each lasting
+        dwell_time seconds. Returned by Picoscope.set_signal_generator_sweep rather than created directly.
+        :param start_frequency, stop_frequency: (Non-optional) The lowest and highest frequencies in Hz.
+        :param increment: (Non-optional) The step between frequencies in Hz. The highest frequency is the last step
+        which is not above stop_frequency.
+        :param dwell_time: (Non-optional) The time spent at each frequency in seconds.
+        :param sweep_type: 'UP' (Default), from start_frequency to stop_frequency, 'DOWN', from stop_frequency to
+        start_frequency, 'UPDOWN', up then back down, or 'DOWNUP', down then back up.
+        :param sweeps: The number of sweeps, after which the generator stays at the frequency it started at. Default is
+        0, sweeping continuously.
+        :param start_time: The time.time() at which the sweep started. Default is None, now.
+        '''
+        if not (all(isinstance(arg, Number) for arg in (start_frequency, stop_frequency, increment, dwell_time))
+                and 0 <= start_frequency < stop_frequency and 0 < increment <= stop_frequency - start_frequency
+                and dwell_time > 0):
+            raise er.InvalidSweepException(start_frequency, stop_frequency, increment, dwell_time)
+        if sweep_type not in sweep_type_options:
+            raise er.InvalidSweepTypeException(sweep_type, sweep_type_options.keys())
+        if not (type(sweeps) is int and sweeps >= 0):
+            raise er.InvalidSweepCountException(sweeps)
+        self.start_frequency, self.stop_frequency, self.increment = start_frequency, stop_frequency, increment
+        self.dwell_time, self.sweep_type, self.sweeps = dwell_time, sweep_type, sweeps
+        self.start_time = time.time() if start_time is None else start_time
+
+        # A little is added before rounding down so that a stop_frequency a whole number of increments away is included
+        # despite rounding errors
+        steps = int((stop_frequency - start_frequency) / increment + 1e-9) + 1
+        up = start_frequency + increment * np.arange(steps, dtype=np.float64)
+        self.frequencies = {
+            'UP': up,
+            'DOWN': up[::-1],
+            'UPDOWN': np.concatenate([up, up[-2:0:-1]]),
+            'DOWNUP': np.concatenate([up[::-1], up[1:-1]]),
+        }[sweep_type]
+        self.frequencies.flags.writeable = False
+        self.sweep_time = len(self.frequencies) * dwell_time
+        self.end_time = self.start_time + sweeps * self.sweep_time if sweeps else np.inf
+        # The number of cycles generated before each step of a sweep, and in the whole sweep
+        self._cycles = np.concatenate([[0.0], np.cumsum(self.frequencies * dwell_time)])
+
+    def _position(self, t):
+        # The time since the start of the sweep, the number of steps taken since then, and which sweep and which step of
+        # it each time is in. Before the start the first step is used, and after the last sweep the start of the next.
+        elapsed = np.asarray(t, dtype=np.float64) - self.start_time
+        taken = np.floor(elapsed / self.dwell_time)
+        if self.sweeps:
+            taken = np.minimum(taken, self.sweeps * len(self.frequencies))
+        taken = np.maximum(taken, 0).astype(np.int64)
+        sweep, step = np.divmod(taken, len(self.frequencies))
+        return elapsed, taken, sweep, step
+
+    def step_at(self, t):
+        '''
+        :param t: (Non-optional) A time.time(), or an array of them.
+        :return: The index in frequencies of the step the generator was on at each time, or -1 before the sweep.
+        '''
+        elapsed, _, _, step = self._position(t)
+        return np.where(elapsed >= 0, step, -1)
+
+    def frequency_at(self, t):
+        '''
+        :param t: (Non-optional) A time.time(), or an array of them.
+        :return: The frequency in Hz the generator was producing at each time, or NaN before the sweep.
+        '''
+        elapsed, _, _, step = self._position(t)
+        return np.where(elapsed >= 0, self.frequencies[step], np.nan)
+
+    def cycles_at(self, t):
+        '''
+        :param t: (Non-optional) A time.time(), or an array of them.
+        :return: The number of cycles the generator has produced since the start of the sweep at each time.
+        '''
+        elapsed, taken, sweep, step = self._position(t)
+        return sweep * self._cycles[-1] + self._cycles[step] + self.frequencies[step] * (elapsed - taken * self.dwell_time)
+
+    def block_steps(self, timestamps, duration, margin=0.0):
+        '''
+        Which step each captured block was in, for example to average the traces taken at each frequency:
+        steps = sweep.block_steps(batch.timestamps, scope.capture_duration)
+        :param timestamps: (Non-optional) The time.time() at the end of each block, such as Trace.timestamp,
+        TraceBatch.timestamps or Dataset.timestamps.
+        :param duration: (Non-optional) The time in seconds taken to capture each block.
+        :param margin: Extra time in seconds before each block which must also be in the same step, to allow for the
+        time taken to transfer the block before its timestamp was taken. Default is 0.
+        :return: The index in frequencies of the step each block was captured in, or -1 for blocks captured before the
+        sweep started or while the generator changed frequency.
+        '''
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        first, taken_first, _, step = self._position(timestamps - duration - margin)
+        _, taken_last, _, _ = self._position(timestamps)
+        return np.where((first >= 0) & (taken_first == taken_last), step, -1)
+
+    def block_frequencies(self, timestamps, duration, margin=0.0):
+        '''
+        The frequency the generator was producing throughout each captured block. See block_steps.
+        :return: The frequency in Hz of each block, or NaN for blocks captured before the sweep started or while the
+        generator changed frequency.
+        '''
+        steps = self.block_steps(timestamps, duration, margin)
+        return np.where(steps >= 0, self.frequencies[steps], np.nan)
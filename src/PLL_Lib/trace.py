@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class Trace:
+    '''
+    A single capture from the Picoscope, as returned by get_trace. The raw int16 samples are kept, and the
+    voltages and times are only calculated the first time they are used.
+    It can be unpacked like a tuple: times, voltages_A, voltages_B = scope.get_trace()
+    '''
+    __slots__ = ('raw_a', 'raw_b', 'volts_per_adc', 'offset', 'raw_times', 'time_unit', 'overflow', 'timestamp',
+                 'dtype', '_volts_a', '_volts_b', '_times')
+
+    def __init__(self, raw_a, raw_b, volts_per_adc, raw_times, time_unit, overflow=False, timestamp=None,
+                 offset=0.0, dtype=np.float64, times=None):
+        '''
+        :param raw_a, raw_b: int16 arrays of the ADC counts on each channel.
+        :param volts_per_adc: The factor converting ADC counts to volts.
+        :param raw_times: An integer array of the sample times, in units of time_unit seconds.
+        :param time_unit: The length of one unit of raw_times in seconds.
+        :param overflow: Whether either channel went outside the voltage range.
+        :param timestamp: The time.time() at which the trace was captured.
+        :param offset: A voltage added to every sample after scaling. Default is 0.
+        :param dtype: The float type of the voltages and times, np.float64 (Default) or np.float32.
+        :param times: (Optional) The sample times in seconds, if already calculated. Shared between traces,
+        so should be read-only.
+        '''
+        self.raw_a, self.raw_b = raw_a, raw_b
+        self.volts_per_adc, self.offset = volts_per_adc, offset
+        self.raw_times, self.time_unit = raw_times, time_unit
+        self.overflow, self.timestamp = overflow, timestamp
+        self.dtype = np.dtype(dtype)
+        self._volts_a = self._volts_b = None
+        self._times = times if times is None or times.dtype == self.dtype else None
+
+    def _to_volts(self, raw):
+        volts = np.multiply(raw, self.dtype.type(self.volts_per_adc), dtype=self.dtype)
+        if self.offset:
+            volts += self.dtype.type(self.offset)
+        return volts
+
+    @property
+    def volts_a(self):
+        '''The channel A voltages.'''
+        if self._volts_a is None:
+            self._volts_a = self._to_volts(self.raw_a)
+        return self._volts_a
+
+    @property
+    def volts_b(self):
+        '''The channel B voltages.'''
+        if self._volts_b is None:
+            self._volts_b = self._to_volts(self.raw_b)
+        return self._volts_b
+
+    @property
+    def times(self):
+        '''The sample times in seconds.'''
+        if self._times is None:
+            self._times = np.multiply(self.raw_times, self.dtype.type(self.time_unit), dtype=self.dtype)
+        return self._times
+
+    def convert_into(self, out_a, out_b, keep=True):
+        '''
+        Write the voltages into the given float arrays, which then become this trace's voltages.
+        :param out_a, out_b: float arrays with one entry per sample.
+        :param keep: If False, the arrays are only written to, for example to reuse them as scratch space, and this
+        trace's voltages are still calculated when they are first used. Default is True.
+        '''
+        for raw, out in ((self.raw_a, out_a), (self.raw_b, out_b)):
+            np.multiply(raw, self.volts_per_adc, out=out)
+            if self.offset:
+                out += self.offset
+        if keep:
+            self._volts_a, self._volts_b = out_a, out_b
+
+    def astype(self, dtype):
+        '''
+        :return: A Trace sharing the same raw samples whose voltages and times are of the given float type.
+        '''
+        return Trace(self.raw_a, self.raw_b, self.volts_per_adc, self.raw_times, self.time_unit, self.overflow,
+                     self.timestamp, self.offset, dtype)
+
+    def __iter__(self):
+        return iter((self.times, self.volts_a, self.volts_b))
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.times, self.volts_a, self.volts_b)[index]
+
+    def __repr__(self):
+        return f'Trace({len(self.raw_a)} samples, overflow={self.overflow}, timestamp={self.timestamp})'
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from PLL_Lib import TraceAccumulator
+
+samples = 64
+
+
+def random_traces(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(-32768, 32768, (n, 2, samples)).astype(np.int16)
+
+
+def test_add_matches_numpy():
+    raw = random_traces(40)
+    accumulator = TraceAccumulator(samples, 1e-3)
+    for trace in raw:
+        accumulator.add(*trace)
+    volts = raw[:, 1] * 1e-3
+    assert accumulator.count == 40
+    np.testing.assert_allclose(accumulator.mean('b'), volts.mean(axis=0))
+    np.testing.assert_allclose(accumulator.std('b'), volts.std(axis=0, ddof=1))
+    np.testing.assert_allclose(accumulator.min('b'), volts.min(axis=0))
+    np.testing.assert_allclose(accumulator.max('b'), volts.max(axis=0))
+
+
+def test_add_batch_matches_sequential_add():
+    raw = random_traces(50)
+    overflow = np.arange(50) % 7 == 0
+    sequential, batched = TraceAccumulator(samples, 1e-3), TraceAccumulator(samples, 1e-3)
+    for trace, over in zip(raw, overflow):
+        sequential.add(*trace, overflow=over)
+    # Batches of different sizes, added after single traces, so each is merged into existing results
+    batched.add(*raw[0], overflow=overflow[0])
+    for start, stop in ((1, 2), (2, 19), (19, 50)):
+        batched.add_batch(raw[start:stop, 0], raw[start:stop, 1], overflow=overflow[start:stop])
+    assert batched.count == sequential.count and batched.overflow_count == sequential.overflow_count == 8
+    for channel in ('a', 'b'):
+        np.testing.assert_allclose(batched.mean(channel), sequential.mean(channel))
+        np.testing.assert_allclose(batched.variance(channel), sequential.variance(channel))
+        np.testing.assert_array_equal(batched.min(channel), sequential.min(channel))
+        np.testing.assert_array_equal(batched.max(channel), sequential.max(channel))
+
+
+def test_fewer_than_two_traces():
+    accumulator = TraceAccumulator(samples, 1e-3)
+    accumulator.add(*random_traces(1)[0])
+    assert np.isnan(accumulator.variance('a')).all() and np.isnan(accumulator.std('a')).all()
+    accumulator.reset()
+    assert accumulator.count == 0
+    assert accumulator.mean('a') == pytest.approx(np.zeros(samples))
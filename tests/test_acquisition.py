@@ -0,0 +1,25 @@
+import time
+import warnings
+from PLL_Lib import Picoscope, SimulatedPs2000
+
+
+def test_stop_while_waiting_for_trigger():
+    # The simulated signals never reach the trigger voltage, so the acquisition thread waits for a trigger forever
+    backend = SimulatedPs2000(seed=0)
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        with Picoscope(show_display=False, trigger_channel='a', trigger_voltage=0.99, backend=backend) as scope:
+            scope.start_acquisition()
+            time.sleep(0.2)
+            scope.stop_acquisition()
+    assert time.perf_counter() - start < 3
+
+
+def test_traces_after_stopping_and_restarting():
+    with Picoscope(show_display=False, backend=SimulatedPs2000(seed=0)) as scope:
+        scope.start_acquisition()
+        scope.get_trace()
+        scope.stop_acquisition()
+        scope.start_acquisition()
+        assert scope.get_trace().timestamp is not None
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import Picoscope, SimulatedPs2000, analyse_lock
+
+sample_interval = 1e-5
+times = np.arange(8192) * sample_interval
+
+
+def square(frequency, phase):
+    return np.where(np.sin(2 * np.pi * frequency * times + phase) >= 0, 1.0, -1.0)
+
+
+@pytest.mark.parametrize('method', ['crossings', 'analytic'])
+def test_known_phase_and_frequency(method):
+    # 80 samples per period, with B a whole number of them behind, so the edges of both fall on the same samples
+    phase = 2 * np.pi * 8 / 80
+    a, b = square(1250, 0), square(1250, -phase)
+    lock = analyse_lock(np.stack([a, a]), np.stack([b, b]), sample_interval, method)
+    np.testing.assert_allclose(lock.phase_difference, phase, atol=0.01)
+    np.testing.assert_allclose(lock.frequency_a, 1250, rtol=1e-3)
+    np.testing.assert_allclose(lock.frequency_b, 1250, rtol=1e-3)
+    np.testing.assert_allclose(lock.lock_quality, 1, atol=1e-3)
+
+
+@pytest.mark.parametrize('method', ['crossings', 'analytic'])
+def test_unlocked_has_low_quality(method):
+    lock = analyse_lock(square(1250, 0), square(1610, 0), sample_interval, method)
+    assert lock.frequency_b == pytest.approx(1610, rel=2e-3)
+    assert lock.lock_quality < 0.2
+
+
+def test_noisy_sine_analytic():
+    rng = np.random.default_rng(0)
+    a = np.sin(2 * np.pi * 1000 * times) + 0.3 * rng.standard_normal(len(times))
+    b = np.sin(2 * np.pi * 1000 * times - 1.2) + 0.3 * rng.standard_normal(len(times))
+    lock = analyse_lock(a, b, sample_interval, 'analytic')
+    assert lock.phase_difference == pytest.approx(1.2, abs=0.02)
+    assert lock.frequency_a == pytest.approx(1000, rel=1e-3)
+
+
+def test_simulator_phase_offset():
+    # The simulated VCO on channel B leads the reference on channel A by phase_offset
+    backend = SimulatedPs2000(realtime=False, seed=0, phase_offset=0.5, lock_time=0, reference_frequency=2000)
+    with Picoscope(show_display=False, voltage_range='2v', backend=backend) as scope:
+        batch = scope.get_traces(300, raw=True)
+    # More traces than chunk_traces, so the chunks are joined up too
+    lock = analyse_lock(batch.voltages_a, batch.voltages_b, batch.times[1] - batch.times[0], chunk_traces=128)
+    np.testing.assert_allclose(lock.phase_difference, -0.5, atol=0.02)
+    np.testing.assert_allclose(lock.frequency_a, 2000, rtol=1e-3)
+
+
+def test_bad_arguments():
+    with pytest.raises(er.InvalidAnalysisMethodException):
+        analyse_lock(times, times, sample_interval, 'fourier')
+    with pytest.raises(er.MismatchedChannelsException):
+        analyse_lock(times, times[:-1], sample_interval)
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        analyse_lock(times, times, 0)
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        analyse_lock(times, times, -sample_interval)
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        analyse_lock(times, times, sample_interval, chunk_traces=0)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import ArchiveReader, ArchiveWriter
+from PLL_Lib.archive import decode_chunk, encode_chunk
+
+samples = 200
+metadata = {'raw_times': list(range(samples)), 'time_unit': 1e-6, 'volts_per_adc': 2e-3}
+
+
+def random_traces(n, seed=0):
+    # Full range samples, so that the differences between them wrap around in int16
+    rng = np.random.default_rng(seed)
+    return rng.integers(-32768, 32768, (n, 2, samples)).astype(np.int16)
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma'])
+def test_chunk_round_trip(codec):
+    raw = random_traces(5)
+    out = np.empty_like(raw)
+    decode_chunk(encode_chunk(raw, codec, 1), codec, out)
+    np.testing.assert_array_equal(out, raw)
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma'])
+def test_archive_round_trip(tmp_path, codec):
+    path = str(tmp_path / 'run.pllarchive')
+    raw = random_traces(23)
+    timestamps = 100 + np.arange(23.0)
+    with ArchiveWriter(path, samples, chunk_traces=8, codec=codec, workers=2, metadata=metadata) as writer:
+        # Both single traces and batches, the batch starting part way through a chunk
+        for i in range(3):
+            writer.append(raw[i, 0], raw[i, 1], timestamp=timestamps[i], overflow=i == 1)
+        writer.append_batch(raw[3:, 0], raw[3:, 1], timestamps=timestamps[3:])
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 23 and reader.codec == codec
+        np.testing.assert_array_equal(reader.read_range(), raw)
+        # Ranges starting and ending part way through chunks, and through the last, partly filled, chunk
+        np.testing.assert_array_equal(reader.read_range(5, 19), raw[5:19])
+        np.testing.assert_array_equal(reader.read_range(20, 100), raw[20:])
+        np.testing.assert_array_equal(reader.read(-1), raw[-1])
+        np.testing.assert_array_equal(reader.timestamps, timestamps)
+        np.testing.assert_array_equal(np.flatnonzero(reader.overflow), [1])
+        trace = reader[17]
+        np.testing.assert_array_equal(trace.raw_a, raw[17, 0])
+        np.testing.assert_allclose(trace.volts_b, raw[17, 1] * 2e-3)
+        np.testing.assert_allclose(trace.times, np.arange(samples) * 1e-6)
+        assert trace.timestamp == 117
+        with pytest.raises(er.ArchiveIndexException):
+            reader.read(23)
+
+
+def test_bad_archives(tmp_path):
+    with pytest.raises(er.InvalidCodecException):
+        ArchiveWriter(str(tmp_path / 'bad.pllarchive'), samples, codec='gzip')
+    # An archive cut short, as if the program stopped before the writer was closed
+    path = tmp_path / 'unfinished.pllarchive'
+    with ArchiveWriter(str(path), samples) as writer:
+        writer.append(*random_traces(1)[0])
+    path.write_bytes(path.read_bytes()[:-20])
+    with pytest.raises(er.UnfinishedArchiveException):
+        ArchiveReader(str(path))
+    (tmp_path / 'other.npy').write_bytes(b'\x93NUMPY' + bytes(100))
+    with pytest.raises(er.NotAnArchiveException):
+        ArchiveReader(str(tmp_path / 'other.npy'))
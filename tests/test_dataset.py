@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import Dataset
+from PLL_Lib.recording import create_recording
+
+samples = 50
+metadata = {'raw_times': list(range(samples)), 'time_unit': 1e-6, 'volts_per_adc': 1e-3}
+
+
+def make_recording(path, raw, code, first_timestamp, **settings):
+    data, index = create_recording(str(path), len(raw), samples, dict(metadata, **settings), code)
+    data[:] = raw
+    index['timestamp'] = first_timestamp + np.arange(len(raw))
+    data.flush(), index.flush()
+    del data, index
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    rng = np.random.default_rng(0)
+    first = rng.integers(-30000, 30000, (30, 2, samples)).astype(np.int16)
+    second = rng.integers(-30000, 30000, (20, 2, samples)).astype(np.int16)
+    make_recording(tmp_path / 'run1.npy', first, 100, 0, trigger_channel='a')
+    make_recording(tmp_path / 'run2.npy', second, 200, 30, trigger_channel='b')
+    return str(tmp_path / 'run*.npy'), np.concatenate([first, second])
+
+
+def test_select(recordings):
+    pattern, raw = recordings
+    dataset = Dataset(pattern)
+    assert len(dataset) == 50
+    np.testing.assert_array_equal(dataset.code_values, [100, 200])
+    assert len(dataset.select(code=200)) == 20
+    assert len(dataset.select(code=[100, 200])) == 50
+    assert len(dataset.select(trigger_channel='a')) == 30
+    selected = dataset.select(code=100, start_time=10, end_time=14)
+    np.testing.assert_array_equal(selected.timestamps, [10, 11, 12, 13, 14])
+    np.testing.assert_allclose(selected.volts('b'), raw[10:15, 1] * 1e-3)
+    np.testing.assert_array_equal(dataset[35].raw_a, raw[35, 0])
+
+
+@pytest.mark.parametrize('chunk_traces', [7, 256])
+def test_reductions_match_numpy(recordings, chunk_traces):
+    pattern, raw = recordings
+    dataset = Dataset(pattern)
+    volts = raw[:, 0] * 1e-3
+    np.testing.assert_allclose(dataset.mean('a', chunk_traces), volts.mean(axis=0))
+    np.testing.assert_allclose(dataset.std('a', chunk_traces), volts.std(axis=0, ddof=1))
+    lowest, highest = dataset.envelope('a', chunk_traces)
+    np.testing.assert_allclose(lowest, volts.min(axis=0))
+    np.testing.assert_allclose(highest, volts.max(axis=0))
+    # A selection spanning both recordings, out of order
+    chosen = [45, 3, 31, 8]
+    np.testing.assert_allclose(dataset[chosen].mean('b', chunk_traces), raw[chosen, 1].mean(axis=0) * 1e-3)
+
+
+def test_std_of_one_trace_is_nan(recordings):
+    pattern, _ = recordings
+    assert np.isnan(Dataset(pattern)[[0]].std('a')).all()
+
+
+def test_bad_datasets(recordings, tmp_path):
+    pattern, _ = recordings
+    with pytest.raises(er.NoRecordingsException):
+        Dataset(str(tmp_path / 'none*.npy'))
+    with pytest.raises(er.NoTracesException):
+        Dataset(pattern).select(code=300).mean('a')
+    with pytest.raises(er.InvalidChannelException):
+        Dataset(pattern).mean('c')
+    data, index = create_recording(str(tmp_path / 'other.npy'), 1, samples - 1,
+                                   dict(metadata, raw_times=list(range(samples - 1))))
+    del data, index
+    with pytest.raises(er.MismatchedRecordingsException):
+        Dataset([str(tmp_path / 'run1.npy'), str(tmp_path / 'other.npy')])
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import Picoscope, SimulatedPs2000, measure_edges
+
+sample_interval = 1e-6
+
+
+def square(samples, period, high, low=-1.0, top=1.0):
+    # A square wave of period samples, high for high samples of each
+    return np.where(np.arange(samples) % period < high, top, low)
+
+
+def test_period_and_duty_cycle():
+    edges = measure_edges(square(4000, 100, 30, low=0.2, top=3.1), sample_interval)
+    assert edges.period == pytest.approx(100e-6)
+    assert edges.frequency == pytest.approx(1e4)
+    assert edges.duty_cycle == pytest.approx(0.3)
+    assert edges.low == pytest.approx(0.2) and edges.high == pytest.approx(3.1)
+    assert edges.edges == 39
+    assert edges.period_jitter == pytest.approx(0, abs=1e-12)
+
+
+def test_per_trace_threshold_across_chunks():
+    # More traces than chunk_traces, with a threshold for each trace
+    x = np.stack([square(2000, 50 + i % 7, 20) for i in range(300)])
+    edges = measure_edges(x, sample_interval, threshold=np.zeros(300), chunk_traces=256)
+    np.testing.assert_allclose(edges.period, (50 + np.arange(300) % 7) * sample_interval)
+    np.testing.assert_allclose(edges.duty_cycle, 20 / (50 + np.arange(300) % 7))
+    # The same results a chunk at a time and all at once
+    whole = measure_edges(x, sample_interval, threshold=np.zeros(300), chunk_traces=300)
+    np.testing.assert_array_equal(edges.period, whole.period)
+
+
+def test_too_few_edges():
+    edges = measure_edges(square(1000, 800, 400), sample_interval)
+    assert edges.edges == 1
+    assert np.isnan(edges.period) and np.isnan(edges.period_jitter)
+
+
+def test_simulator_vco():
+    backend = SimulatedPs2000(realtime=False, seed=0, jitter=0, reference_frequency=2500)
+    with Picoscope(show_display=False, time_per_sample='1micro_s', voltage_range='2v', backend=backend) as scope:
+        batch = scope.get_traces(20, raw=True)
+        volts_per_adc = scope.volts_per_adc
+    edges = measure_edges(batch.voltages_b, batch.times[1] - batch.times[0], volts_per_adc)
+    np.testing.assert_allclose(edges.frequency, 2500, rtol=1e-3)
+    np.testing.assert_allclose(edges.duty_cycle, 0.5, atol=0.01)
+    np.testing.assert_allclose(edges.high, 0.8, atol=0.01)
+
+
+def test_bad_arguments():
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        measure_edges(square(100, 10, 5), 0)
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        measure_edges(square(100, 10, 5), sample_interval, chunk_traces=0)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import LockIn
+
+sample_interval = 1e-5
+frequency = 1000
+rng = np.random.default_rng(0)
+
+
+def chunks(signal, size=5000):
+    return [signal[start:start + size] for start in range(0, len(signal), size)]
+
+
+def test_known_frequency():
+    times = np.arange(200000) * sample_interval
+    # A small sine buried in noise and a larger signal at another frequency
+    signal = 0.05 * np.cos(2 * np.pi * frequency * times + 0.6) + 0.5 * np.cos(2 * np.pi * 1700 * times) \
+        + 0.2 * rng.standard_normal(len(times))
+    lock_in = LockIn(sample_interval, frequency=frequency, time_constant=0.2)
+    for chunk in chunks(signal):
+        lock_in.update(chunk)
+    assert lock_in.settled
+    assert lock_in.amplitude == pytest.approx(0.05, rel=0.05)
+    assert lock_in.phase == pytest.approx(0.6, abs=0.05)
+
+
+def test_reference_signal():
+    # Unknown frequency, with a square wave reference whose rising edges are phase 0 of a sine
+    times = np.arange(100000) * sample_interval
+    phase = 2 * np.pi * 1234 * times
+    reference = np.where(np.sin(phase) >= 0, 1.0, -1.0)
+    signal = 0.3 * np.sin(phase - 1.1) + 0.05 * rng.standard_normal(len(times))
+    lock_in = LockIn(sample_interval, time_constant=0.05)
+    for signal_chunk, reference_chunk in zip(chunks(signal), chunks(reference)):
+        output = lock_in.update(signal_chunk, reference=reference_chunk)
+    assert len(output) == 5000
+    assert lock_in.amplitude == pytest.approx(0.3, rel=0.02)
+    assert lock_in.phase == pytest.approx(-1.1, abs=0.03)
+
+
+def test_harmonic():
+    times = np.arange(100000) * sample_interval
+    signal = 0.2 * np.cos(2 * np.pi * 3 * frequency * times)
+    lock_in = LockIn(sample_interval, frequency=frequency, time_constant=0.05, harmonic=3)
+    lock_in.update(signal)
+    assert lock_in.amplitude == pytest.approx(0.2, rel=1e-3)
+
+
+def test_bad_arguments():
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        LockIn(0)
+    with pytest.raises(er.InvalidPositiveArgumentException):
+        LockIn(sample_interval, order=0)
+    with pytest.raises(er.MissingReferenceException):
+        LockIn(sample_interval).update(np.zeros(100))
+    with pytest.raises(er.TooFewReferenceEdgesException):
+        LockIn(sample_interval).update(np.zeros(100), reference=np.zeros(100))
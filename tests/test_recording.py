@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import Picoscope, SimulatedPs2000, load_recording
+from PLL_Lib.recording import create_recording, recording_paths
+
+samples = 100
+metadata = {'raw_times': list(range(0, 10 * samples, 10)), 'time_unit': 1e-9, 'volts_per_adc': 1e-3}
+
+
+def partial_recording(path, n_traces, written):
+    # A recording with space for n_traces traces of which only the first written have been captured, as if the
+    # program stopped part way through
+    data, index = create_recording(path, n_traces, samples, metadata, code=7)
+    raw = np.arange(n_traces * 2 * samples, dtype=np.int16).reshape(n_traces, 2, samples)
+    data[:written] = raw[:written]
+    index['timestamp'][:written] = 1000 + np.arange(written)
+    index['overflow'][1] = True
+    data.flush(), index.flush()
+    del data, index
+    return raw
+
+
+def test_partial_recording_has_only_written_traces(tmp_path):
+    path = str(tmp_path / 'run.npy')
+    raw = partial_recording(path, 10, 4)
+    recording = load_recording(path)
+    assert len(recording) == 4
+    np.testing.assert_array_equal(recording.raw, raw[:4])
+    np.testing.assert_array_equal(recording.timestamps, [1000, 1001, 1002, 1003])
+    np.testing.assert_array_equal(recording.overflow, [False, True, False, False])
+    np.testing.assert_array_equal(recording.codes, 7)
+    trace = recording[2]
+    np.testing.assert_allclose(trace.volts_b, raw[2, 1] * 1e-3)
+    np.testing.assert_allclose(trace.times, np.arange(samples) * 1e-8)
+    assert trace.timestamp == 1002
+    np.testing.assert_allclose(recording.voltages_a, raw[:4, 0] * 1e-3)
+
+
+def test_missing_files(tmp_path):
+    path = str(tmp_path / 'run.npy')
+    with pytest.raises(er.RecordingNotFoundException):
+        load_recording(path)
+    partial_recording(path, 3, 3)
+    os.remove(recording_paths(path)[2])
+    with pytest.raises(er.MissingRecordingFileException):
+        load_recording(path)
+
+
+def test_record_from_simulator(tmp_path):
+    path = str(tmp_path / 'run.npy')
+    with Picoscope(show_display=False, backend=SimulatedPs2000(seed=0)) as scope:
+        recording = scope.record(path, 5, display_every=0)
+        volts_per_adc = scope.volts_per_adc
+    assert len(recording) == 5
+    assert np.all(np.diff(recording.timestamps) > 0)
+    assert recording.metadata['volts_per_adc'] == volts_per_adc
+    np.testing.assert_allclose(recording[4].volts_a, recording.raw[4, 0] * volts_per_adc)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import Spectrum, get_spectrum
+
+samples, sample_interval = 4096, 1e-5
+
+
+def sine(frequency, amplitude, phase=0.0, offset=0.0):
+    times = np.arange(samples) * sample_interval
+    return offset + amplitude * np.cos(2 * np.pi * frequency * times + phase)
+
+
+def test_peak_bin_and_amplitude():
+    spectrum = Spectrum(samples, sample_interval, 'rectangular')
+    # Exactly on bin 100, so all the sine is in that bin
+    frequency = 100 * spectrum.resolution
+    magnitude, phase = spectrum.magnitude_and_phase(sine(frequency, 0.6, 0.4, offset=0.25))
+    assert np.argmax(magnitude[1:]) + 1 == 100
+    assert magnitude[100] == pytest.approx(0.6)
+    assert phase[100] == pytest.approx(0.4)
+    assert magnitude[0] == pytest.approx(0.25)
+
+
+@pytest.mark.parametrize('window', ['hann', 'hamming', 'blackman'])
+def test_windowed_amplitude(window):
+    spectrum = get_spectrum(samples, sample_interval, window)
+    assert spectrum.magnitude(sine(50 * spectrum.resolution, 1.5)).max() == pytest.approx(1.5)
+
+
+def test_peak_frequency_between_bins():
+    spectrum = get_spectrum(samples, sample_interval)
+    frequency = 123.4 * spectrum.resolution
+    peaks = spectrum.peak_frequency(np.stack([sine(frequency, 1), sine(2 * frequency, 1)]))
+    np.testing.assert_allclose(peaks, [frequency, 2 * frequency], rtol=2e-3)
+
+
+def test_raw_counts_and_chunks():
+    spectrum = get_spectrum(samples, sample_interval)
+    raw = np.rint(sine(40 * spectrum.resolution, 10000)).astype(np.int16)
+    traces = np.tile(raw, (10, 1))
+    magnitudes = spectrum.magnitude(traces, volts_per_adc=1e-4, chunk_traces=3)
+    np.testing.assert_allclose(magnitudes[:, 40], 1, rtol=1e-3)
+    assert spectrum.average_magnitude(traces, 1e-4, chunk_traces=4)[40] == pytest.approx(1, rel=1e-3)
+
+
+def test_bad_arguments():
+    with pytest.raises(er.InvalidWindowException):
+        Spectrum(samples, sample_interval, 'triangle')
+    with pytest.raises(er.InvalidTraceLengthException):
+        get_spectrum(samples, sample_interval).magnitude(np.zeros(samples + 1))
+    with pytest.raises(er.InvalidTraceLengthException):
+        get_spectrum(samples, sample_interval).peak_frequency(np.zeros((2, samples - 1)))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import PLL_Lib.picoerrorhelp as er
+from PLL_Lib import Picoscope, SimulatedPs2000, SweepSchedule, measure_edges
+
+
+def test_schedule_steps():
+    sweep = SweepSchedule(100, 500, 100, 0.1, 'UPDOWN', sweeps=2, start_time=0)
+    np.testing.assert_array_equal(sweep.frequencies, [100, 200, 300, 400, 500, 400, 300, 200])
+    assert sweep.sweep_time == pytest.approx(0.8)
+    times = [-0.05, 0.05, 0.45, 0.75, 2.0]
+    np.testing.assert_array_equal(sweep.step_at(times), [-1, 0, 4, 7, 0])
+    np.testing.assert_array_equal(sweep.frequency_at(times), [np.nan, 100, 500, 200, 100])
+    # A block which runs over a change of frequency has none
+    np.testing.assert_array_equal(sweep.block_frequencies([0.09, 0.11, 0.19], 0.02), [100, np.nan, 200])
+
+
+def test_cycles_carry_on_between_steps():
+    sweep = SweepSchedule(100, 200, 100, 0.1, start_time=0)
+    assert sweep.cycles_at([0.1, 0.2, 0.25]) == pytest.approx([10, 30, 35])
+
+
+@pytest.mark.parametrize('realtime', [False, True])
+def test_sweep_frequencies_match_simulator(realtime):
+    backend = SimulatedPs2000(realtime=realtime, seed=0, noise=0, jitter=0)
+    with Picoscope(show_display=False, time_per_sample='1micro_s', voltage_range='2v', backend=backend) as scope:
+        sweep = scope.set_signal_generator_sweep(1000, 4000, 1000, 0.05, sweeps=1)
+        batch = scope.get_traces(int(sweep.sweep_time / scope.capture_duration) + 5)
+        frequencies = scope.sweep_frequencies(batch.timestamps)
+    measured = measure_edges(batch.voltages_a, batch.times[1] - batch.times[0]).frequency
+    during = np.isfinite(frequencies) & (batch.timestamps < sweep.end_time)
+    # Traces from every step, each at the frequency the generator was producing
+    assert set(frequencies[during]) == {1000, 2000, 3000, 4000}
+    np.testing.assert_allclose(measured[during], frequencies[during], rtol=0.01)
+
+
+def test_bad_arguments():
+    with pytest.raises(er.InvalidSweepException):
+        SweepSchedule(500, 100, 100, 0.1)
+    with pytest.raises(er.InvalidSweepTypeException):
+        SweepSchedule(100, 500, 100, 0.1, 'SIDEWAYS')
+    with pytest.raises(er.InvalidSweepCountException):
+        SweepSchedule(100, 500, 100, 0.1, sweeps=-1)
+    with Picoscope(show_display=False, backend=SimulatedPs2000(realtime=False, seed=0)) as scope:
+        with pytest.raises(er.NoSweepException):
+            scope.sweep_frequencies([0.0])
+        with pytest.raises(er.InvalidSweepException):
+            scope.set_signal_generator_sweep(100, 2e5, 100, 0.1)